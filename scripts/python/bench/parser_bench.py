@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+parser_bench.py
+Benchmark offline de los parsers de los scripts, sin red.
+
+Cada caso pasa una página guardada en bench/fixtures/ por el parser real del
+script y mide tiempo por parseo (mediana y mínimo, de reloj y de CPU),
+memoria máxima (tracemalloc) y throughput. Los resultados se comparan con
+baseline.json:
+- falla (exit 1) si la salida de un parser cambia (hash del resultado
+  normalizado) o si un caso no tiene baseline;
+- el tiempo solo avisa. Cada caso se mide en varias rondas intercaladas y
+  se toma el mínimo de CPU, dividido por el de un bucle de calibración fijo
+  medido en el mismo proceso y en las mismas rondas: así la comparación con
+  la baseline no depende de lo rápida o cargada que esté la máquina. Aun
+  así es una señal para revisar, no un criterio de aceptación.
+
+Uso:
+    python scripts/python/bench/parser_bench.py               # comparar con la baseline
+    python scripts/python/bench/parser_bench.py --update      # regrabar la baseline (solo fixtures grabados)
+    python scripts/python/bench/parser_bench.py --only tabla,metro
+    python scripts/python/bench/parser_bench.py --record      # volver a bajar los fixtures (requiere red)
+
+Después de --record o de un cambio intencional en la salida de un parser hay
+que correr --update y commitear fixtures, manifest y baseline juntos.
+
+fixtures/manifest.json dice de dónde salió cada fixture: 'recorded' (bajado
+con --record, con URL y fecha) o 'synthetic' (armado a mano con el marcado
+que espera el parser). Los tiempos sobre un fixture sintético sirven para
+detectar regresiones del parser, pero no representan la página real: el
+reporte los marca y no deben citarse como mediciones de producción.
+--update se niega a grabar la baseline de un fixture sintético salvo con
+--allow-synthetic.
+"""
+import argparse
+import gc
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import types
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+SCRIPTS_DIR = BENCH_DIR.parent
+FIXTURES_DIR = BENCH_DIR / 'fixtures'
+MANIFEST_FILE = FIXTURES_DIR / 'manifest.json'
+BASELINE_FILE = BENCH_DIR / 'baseline.json'
+
+# Un aviso de tiempo tiene que superar ambos umbrales
+TOLERANCE = float(os.getenv('PARSER_BENCH_TOLERANCE', '0.25'))
+MIN_DELTA_MS = 0.5
+DEFAULT_ROUNDS = 3
+CALIBRATION_REPEAT = 15
+
+# Trabajo fijo de Python puro para la calibración (regex, JSON, strings),
+# parecido en tipo al de los parsers pero sin depender de bs4 ni de lxml
+_CALIBRATION_DOC = ''.join(
+    f'<tr class="fila-{i % 7}"><td>{i}</td><td>Equipo {i * 37 % 101}</td><td>{i * 3 % 90}</td></tr>'
+    for i in range(400)
+)
+
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+
+def _as_response(data):
+    """parsear_signos recibe un requests.Response; solo usa .content."""
+    return types.SimpleNamespace(content=data)
+
+
+def _sin_rutas_locales(value):
+    """Quita las rutas absolutas de imágenes, que dependen de la máquina."""
+    if isinstance(value, dict):
+        return {k: _sin_rutas_locales(v) for k, v in value.items() if k != 'imagen'}
+    if isinstance(value, list):
+        return [_sin_rutas_locales(v) for v in value]
+    return value
+
+
+# nombre -> script, función, fixture, cómo pasar el fixture, cómo regrabarlo
+CASES = {
+    'tabla': {
+        'script': 'tabla.py', 'func': 'parsear_tabla',
+        'fixture': 'tabla_as_clasificacion.html', 'input': 'text',
+        'record': ('browser', 'https://chile.as.com/resultados/futbol/chile/clasificacion/?omnil=mpal', 'table.a_tb'),
+    },
+    'proxpar': {
+        'script': 'proxpar.py', 'func': 'parsear_jornada',
+        'fixture': 'proxpar_jornada.html', 'input': 'text',
+        'record': ('browser', 'https://chile.as.com/resultados/futbol/chile/2026/jornada/regular_a_3/', '.a_sd'),
+    },
+    'cliga': {
+        'script': 'cliga.py', 'func': 'parsear_grupos',
+        'fixture': 'cliga_grupos.html', 'input': 'text',
+        'record': ('http', 'https://www.campeonatochileno.cl/ligas/copa-de-la-liga/', None),
+    },
+    'horoscopo': {
+        'script': 'horoscopo.py', 'func': 'parsear_signos',
+        'fixture': 'horoscopo_pudahuel.html', 'input': 'response',
+        'normalize': _sin_rutas_locales,
+        'record': ('http', 'https://www.pudahuel.cl/horoscopo/', None),
+    },
+    'metro': {
+        'script': 'metro.py', 'func': 'parse_metro_cl_status',
+        'fixture': 'metro_estado_red.html', 'input': 'bytes',
+        'record': ('http', 'https://www.metro.cl/el-viaje/estado-red', None),
+    },
+    'partidos': {
+        'script': 'partidos.py', 'func': 'parsear_scoreboard',
+        'fixture': 'espn_scoreboard_chi1.json', 'input': 'json',
+        'record': ('http', 'https://site.api.espn.com/apis/site/v2/sports/soccer/chi.1/scoreboard', None),
+    },
+}
+
+
+def load_script(script):
+    """
+    Importa un script sin ejecutar su main. Los scripts reemplazan sys.stdout
+    al importarse, así que se les entrega uno de mentira.
+    """
+    real_stdout = sys.stdout
+    sys.stdout = types.SimpleNamespace(buffer=io.BytesIO(), encoding='bench')
+    try:
+        name = 'bench_' + script[:-3]
+        spec = importlib.util.spec_from_file_location(name, SCRIPTS_DIR / script)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.stdout = real_stdout
+    return module
+
+
+def load_manifest():
+    """{fixture: {'source': 'recorded'|'synthetic', ...}}; sin entrada = sintético."""
+    try:
+        return json.loads(MANIFEST_FILE.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def fixture_source(manifest, case):
+    return manifest.get(case['fixture'], {}).get('source', 'synthetic')
+
+
+def load_input(case):
+    raw = (FIXTURES_DIR / case['fixture']).read_bytes()
+    kind = case['input']
+    if kind == 'text':
+        return raw, raw.decode('utf-8')
+    if kind == 'response':
+        return raw, _as_response(raw)
+    if kind == 'json':
+        return raw, json.loads(raw)
+    return raw, raw
+
+
+def output_hash(result, normalize=None):
+    if normalize:
+        result = normalize(result)
+    payload = json.dumps(result, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _calibration_work():
+    import re
+
+    rows = re.findall(r'<tr class="([^"]+)"><td>(\d+)</td><td>([^<]+)</td><td>(\d+)</td></tr>', _CALIBRATION_DOC)
+    data = [{'clase': c, 'n': int(n), 'equipo': e.strip().lower(), 'pts': int(p)} for c, n, e, p in rows]
+    return len(json.loads(json.dumps(sorted(data, key=lambda d: (d['pts'], d['equipo'])))))
+
+
+def calibrate():
+    """Mínimo de CPU (ms) del trabajo fijo de calibración en este proceso."""
+    _calibration_work()
+    cpu_times = []
+    for _ in range(CALIBRATION_REPEAT):
+        gc.collect()
+        gc.disable()
+        try:
+            c0 = time.process_time()
+            _calibration_work()
+            cpu_times.append(time.process_time() - c0)
+        finally:
+            gc.enable()
+    return min(cpu_times) * 1000
+
+
+def run_case(name, case, repeat, min_seconds):
+    parse = getattr(load_script(case['script']), case['func'])
+    raw, parser_input = load_input(case)
+
+    # Calentamiento (imports perezosos, cachés de regex)
+    result = parse(parser_input)
+
+    # Sin el GC dentro de la medición: los árboles de bs4 tienen ciclos y el
+    # momento en que corre el recolector agrega mucho ruido
+    times = []
+    cpu_times = []
+    started = time.perf_counter()
+    while len(times) < repeat or time.perf_counter() - started < min_seconds:
+        gc.collect()
+        gc.disable()
+        try:
+            t0, c0 = time.perf_counter(), time.process_time()
+            parse(parser_input)
+            times.append(time.perf_counter() - t0)
+            cpu_times.append(time.process_time() - c0)
+        finally:
+            gc.enable()
+
+    tracemalloc.start()
+    try:
+        parse(parser_input)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(times)
+    return {
+        'fixture': case['fixture'],
+        'bytes': len(raw),
+        'runs': len(times),
+        'median_ms': round(median * 1000, 3),
+        'min_ms': round(min(times) * 1000, 3),
+        'cpu_min_ms': round(min(cpu_times) * 1000, 3),
+        'peak_kb': round(peak / 1024, 1),
+        'mb_per_s': round(len(raw) / median / 1e6, 2),
+        'parses_per_s': round(1 / median, 1),
+        'output_sha256': output_hash(result, case.get('normalize')),
+    }
+
+
+def merge_rounds(rounds):
+    """Una ronda por medición del mismo caso -> un resultado con los mínimos de todas."""
+    best = dict(min(rounds, key=lambda r: r['cpu_min_ms']))
+    best['runs'] = sum(r['runs'] for r in rounds)
+    best['rounds'] = len(rounds)
+    best['min_ms'] = min(r['min_ms'] for r in rounds)
+    return best
+
+
+def compare(name, result, baseline):
+    """
+    (problemas, avisos) de `result` frente a su baseline. Solo la salida del
+    parser (o la falta de baseline) es un problema; el tiempo es un aviso.
+    """
+    if baseline is None:
+        return [f'{name}: sin baseline (correr con --update)'], []
+    problems = []
+    warnings = []
+    if result['output_sha256'] != baseline['output_sha256']:
+        problems.append(f'{name}: la salida del parser cambió')
+    if 'relative' not in baseline:
+        warnings.append(f'{name}: baseline sin calibración; el tiempo no se compara (regrabar con --update)')
+        return problems, warnings
+    # Tiempo de CPU relativo a la calibración; el umbral en ms se escala a esta máquina
+    ratio = result['relative'] / baseline['relative']
+    delta_ms = (result['relative'] - baseline['relative']) * result['calibration_ms']
+    if ratio > 1 + TOLERANCE and delta_ms > MIN_DELTA_MS:
+        warnings.append(
+            f"{name}: {result['relative']:.2f}x calibración vs {baseline['relative']:.2f}x de baseline "
+            f"(+{ratio - 1:.0%}, tolerancia {TOLERANCE:.0%})"
+        )
+    return problems, warnings
+
+
+def _download(case):
+    import http_client
+
+    mode, url, selector = case['record']
+    if mode == 'browser':
+        from browser_pool import lease_page
+
+        with lease_page(user_agent=http_client.USER_AGENT) as page:
+            page.goto(url, wait_until='domcontentloaded', timeout=30000)
+            page.wait_for_selector(selector, state='attached', timeout=20000)
+            return page.content().encode('utf-8')
+    response = http_client.get(url)
+    response.raise_for_status()
+    return response.content
+
+
+def record_fixtures(names):
+    """
+    Vuelve a bajar los fixtures desde las fuentes reales y los marca como
+    'recorded' en el manifest. Devuelve los casos que no se pudieron bajar
+    (esos conservan su fixture y su origen anterior).
+    """
+    manifest = load_manifest()
+    failed = []
+    for name in names:
+        case = CASES[name]
+        try:
+            data = _download(case)
+        except Exception as e:
+            failed.append(name)
+            print(f'{name}: no se pudo bajar ({type(e).__name__}: {str(e)[:120]})', file=sys.stderr)
+            continue
+        (FIXTURES_DIR / case['fixture']).write_bytes(data)
+        manifest[case['fixture']] = {
+            'source': 'recorded',
+            'url': case['record'][1],
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'bytes': len(data),
+        }
+        print(f'{name}: {len(data)} bytes -> fixtures/{case["fixture"]}')
+    MANIFEST_FILE.write_text(json.dumps(manifest, indent=2, ensure_ascii=False, sort_keys=True) + '\n',
+                             encoding='utf-8')
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark offline de los parsers')
+    parser.add_argument('--only', help='Casos separados por coma (por defecto todos)')
+    parser.add_argument('--repeat', type=int, default=20, help='Parseos mínimos por caso')
+    parser.add_argument('--min-seconds', type=float, default=0.5, help='Tiempo mínimo por caso y ronda')
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS, help='Rondas intercaladas por caso')
+    parser.add_argument('--update', action='store_true', help='Regrabar baseline.json')
+    parser.add_argument('--allow-synthetic', action='store_true',
+                        help='Con --update, grabar también la baseline de fixtures sintéticos')
+    parser.add_argument('--record', action='store_true', help='Bajar de nuevo los fixtures (red)')
+    parser.add_argument('--json', action='store_true', help='Salida en JSON')
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        parser.error(f"casos desconocidos: {', '.join(unknown)}")
+
+    if args.record:
+        failed = record_fixtures(names)
+        if failed:
+            print(f"Sin grabar: {', '.join(failed)} (siguen con el fixture anterior).", file=sys.stderr)
+            return 1
+        print('Fixtures actualizados: revisar la salida y correr --update.')
+        return 0
+
+    manifest = load_manifest()
+    synthetic = [name for name in names if fixture_source(manifest, CASES[name]) != 'recorded']
+    if args.update and synthetic and not args.allow_synthetic:
+        print(f"No se graba la baseline: fixtures sintéticos en {', '.join(synthetic)}. "
+              f"Grabarlos con --record (o usar --allow-synthetic).", file=sys.stderr)
+        return 1
+
+    # Rondas intercaladas: una racha de carga de la máquina no cae entera sobre un caso
+    rounds = {name: [] for name in names}
+    calibrations = []
+    for _ in range(max(1, args.rounds)):
+        calibrations.append(calibrate())
+        for name in names:
+            rounds[name].append(run_case(name, CASES[name], args.repeat, args.min_seconds))
+    calibration_ms = min(calibrations)
+
+    results = {}
+    for name in names:
+        result = merge_rounds(rounds[name])
+        result['calibration_ms'] = round(calibration_ms, 3)
+        result['relative'] = round(result['cpu_min_ms'] / calibration_ms, 3)
+        result['fixture_source'] = fixture_source(manifest, CASES[name])
+        results[name] = result
+
+    baseline = {}
+    if BASELINE_FILE.exists():
+        baseline = json.loads(BASELINE_FILE.read_text(encoding='utf-8'))
+
+    if args.update:
+        cases = dict(baseline.get('cases', {}))
+        cases.update(results)
+        baseline = {
+            'python': platform.python_version(),
+            'machine': f'{platform.system()} {platform.machine()}',
+            'cases': cases,
+        }
+        BASELINE_FILE.write_text(json.dumps(baseline, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+
+    problems = []
+    warnings = []
+    if not args.update:
+        for name, result in results.items():
+            case_problems, case_warnings = compare(name, result, baseline.get('cases', {}).get(name))
+            problems.extend(case_problems)
+            warnings.extend(case_warnings)
+
+    if args.json:
+        print(json.dumps({'results': results, 'synthetic': synthetic, 'problems': problems,
+                          'warnings': warnings}, indent=2, ensure_ascii=False))
+    else:
+        print(f"{'caso':<10} {'mediana':>9} {'mínimo':>9} {'CPU mín':>9} {'memoria':>10} {'MB/s':>7} {'parseos/s':>10}  fixture")
+        for name, r in results.items():
+            print(f"{name:<10} {r['median_ms']:>7.2f}ms {r['min_ms']:>7.2f}ms {r['cpu_min_ms']:>7.2f}ms "
+                  f"{r['peak_kb']:>8.0f}KB {r['mb_per_s']:>7.2f} {r['parses_per_s']:>10.1f}  {r['fixture_source']}")
+        if synthetic:
+            print(f"\nAviso: fixtures sintéticos en {', '.join(synthetic)}: los tiempos no representan "
+                  f"la página real (grabar con --record y luego --update).")
+        if baseline and not args.update and baseline.get('python') != platform.python_version():
+            print(f"\nAviso: la baseline es de Python {baseline.get('python')}; los tiempos pueden no ser comparables.")
+        for warning in warnings:
+            print(f'AVISO {warning}')
+        for problem in problems:
+            print(f'FALLA {problem}')
+        if args.update:
+            print(f'\nBaseline actualizada: {BASELINE_FILE.relative_to(SCRIPTS_DIR.parent.parent)}')
+
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+browser_pool.py
+Navegador Chromium headless compartido para los scrapers que necesitan JS
+(tabla.py, feriados.py, proxpar.py y la cartelera de random_info.py).
+
+En vez de lanzar un Chromium por comando, el proceso mantiene uno caliente
+con contextos reutilizables y presta páginas con un límite de concurrencia.
+El navegador se recicla tras BROWSER_MAX_PAGES páginas o si su memoria supera
+BROWSER_MAX_RSS_MB. Dentro de worker.py el navegador sobrevive entre peticiones.
+
+Uso:
+    from browser_pool import lease_page
+    with lease_page(user_agent=UA) as page:
+        page.goto(url)
+"""
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+
+import timing
+
+# psutil es opcional: sin él solo se recicla por cantidad de páginas
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+LAUNCH_ARGS = ['--no-sandbox', '--disable-dev-shm-usage']
+
+MAX_PAGES = int(os.getenv('BROWSER_MAX_PAGES', '50'))
+MAX_RSS_MB = int(os.getenv('BROWSER_MAX_RSS_MB', '800'))
+MAX_CONCURRENT_PAGES = int(os.getenv('BROWSER_MAX_CONCURRENT_PAGES', '3'))
+
+# Límite global de páginas abiertas a la vez en este proceso
+_page_slots = threading.BoundedSemaphore(MAX_CONCURRENT_PAGES)
+
+# La API síncrona de Playwright queda atada al hilo que la inicia,
+# así que cada hilo tiene su propio pool.
+_local = threading.local()
+_all_pools = []
+_all_pools_lock = threading.Lock()
+
+
+class BrowserPool:
+    """Un Chromium caliente con contextos reutilizables por (user_agent, viewport)."""
+
+    def __init__(self):
+        self._playwright = None
+        self._browser = None
+        self._contexts = {}
+        self._pages_served = 0
+        self._active = 0
+        self._broken = False
+
+    def _start(self):
+        from playwright.sync_api import sync_playwright
+
+        with timing.span('browser.launch'):
+            if self._playwright is None:
+                self._playwright = sync_playwright().start()
+            self._browser = self._playwright.chromium.launch(headless=True, args=LAUNCH_ARGS)
+        self._contexts = {}
+        self._pages_served = 0
+        self._broken = False
+
+    def _memory_mb(self):
+        """RSS de los procesos hijos (driver de Playwright + Chromium) en MB."""
+        if not PSUTIL_AVAILABLE:
+            return 0
+        try:
+            children = psutil.Process().children(recursive=True)
+            return sum(c.memory_info().rss for c in children) / (1024 * 1024)
+        except psutil.Error:
+            return 0
+
+    def _needs_recycle(self):
+        if self._browser is None:
+            return False
+        if self._broken or not self._browser.is_connected():
+            return True
+        if MAX_PAGES and self._pages_served >= MAX_PAGES:
+            return True
+        return bool(MAX_RSS_MB) and self._memory_mb() > MAX_RSS_MB
+
+    def _close_browser(self):
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+        self._browser = None
+        self._contexts = {}
+
+    def _get_context(self, user_agent, viewport):
+        key = (user_agent, tuple(sorted(viewport.items())) if viewport else None)
+        context = self._contexts.get(key)
+        if context is None:
+            options = {}
+            if user_agent:
+                options['user_agent'] = user_agent
+            if viewport:
+                options['viewport'] = viewport
+            context = self._browser.new_context(**options)
+            self._contexts[key] = context
+        return context
+
+    @contextmanager
+    def lease(self, user_agent=None, viewport=None):
+        # Solo se recicla cuando nadie más tiene una página prestada
+        if self._active == 0 and self._needs_recycle():
+            self._close_browser()
+        if self._browser is None:
+            self._start()
+
+        page = self._get_context(user_agent, viewport).new_page()
+        self._active += 1
+        self._pages_served += 1
+        try:
+            yield page
+        finally:
+            self._active -= 1
+            try:
+                page.close()
+            except Exception:
+                # Página o navegador caído: se reinicia en el próximo préstamo
+                self._broken = True
+
+    def close(self):
+        self._close_browser()
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+
+def _get_pool():
+    pool = getattr(_local, 'pool', None)
+    if pool is None:
+        pool = BrowserPool()
+        _local.pool = pool
+        with _all_pools_lock:
+            _all_pools.append(pool)
+    return pool
+
+
+def close_thread_pool():
+    """
+    Cierra el navegador del hilo actual, si lanzó uno. Para hilos que no son el
+    principal (p. ej. el refresco en segundo plano de result_cache): su pool
+    no se vuelve a usar y dejaría un Chromium abierto por hilo.
+    """
+    pool = getattr(_local, 'pool', None)
+    if pool is None:
+        return
+    _local.pool = None
+    with _all_pools_lock:
+        if pool in _all_pools:
+            _all_pools.remove(pool)
+    pool.close()
+
+
+@contextmanager
+def lease_page(user_agent=None, viewport=None):
+    """Presta una página del navegador compartido; se cierra al salir del bloque."""
+    with timing.span('browser.page'), _page_slots:
+        with _get_pool().lease(user_agent=user_agent, viewport=viewport) as page:
+            yield page
+
+
+@atexit.register
+def shutdown():
+    """Cierra los navegadores abiertos al terminar el proceso."""
+    with _all_pools_lock:
+        pools = list(_all_pools)
+        _all_pools.clear()
+    for pool in pools:
+        pool.close()
@@ -1,21 +1,21 @@
-import requests
+import http_client
+import script_output
+import timing
 from bs4 import BeautifulSoup
 import sys
 import io
 
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
-def main():
-    url = "https://www.campeonatochileno.cl/ligas/copa-de-la-liga/"
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    try:
-        r = requests.get(url, headers=headers, timeout=15)
-        r.raise_for_status()
-    except Exception as e:
-        print("Error al obtener datos:", e)
-        sys.exit(1)
+SCHEMA_VERSION = 1
 
-    soup = BeautifulSoup(r.text, 'html.parser')
+URL = "https://www.campeonatochileno.cl/ligas/copa-de-la-liga/"
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+
+def parsear_grupos(html):
+    """Devuelve [{'name': 'Grupo A', 'teams': [{'pos', 'club', 'pts'}, ...]}, ...]."""
+    soup = BeautifulSoup(html, 'html.parser')
     grupos = []
     
     # Cada grupo empieza con un h4 "Grupo A", etc.
@@ -92,24 +92,43 @@ def main():
                         break
                 table_container = table_container.find_next_sibling()
 
+    return grupos
+
+
+def formatear_grupos(grupos):
+    """Texto para WhatsApp a partir de parsear_grupos()."""
     if not grupos:
-        print("No se encontraron los grupos.")
-        return
+        return "No se encontraron los grupos."
 
     SEPARADOR = "➖➖➖➖➖➖➖➖➖➖"
-    print("🏆 *Grupos Copa de la Liga* 🏆")
+    lineas = ["🏆 *Grupos Copa de la Liga* 🏆"]
     
     for g in grupos:
-        print(f"\n*{g['name']}*")
+        lineas.append(f"\n*{g['name']}*")
         # Ajustamos los espacios del encabezado para que cuadre con los nombres más largos
-        print("`Pos Equipo                    Pts`")
+        lineas.append("`Pos Equipo                    Pts`")
         for i, t in enumerate(g['teams'][:4]):
             # Aumentamos el límite a 24 letras, suficiente para casi todos los clubes chilenos
             nom = (t['club'][:22] + "..") if len(t['club']) > 24 else t['club']
             emoji = "🟢" if i < 2 else "⚪"
             
             # Ampliamos el espaciado de 'nom' a 24 (nom:<24)
-            print(f"{emoji} `{str(t['pos'])+'.':<3} {nom:<24} {str(t['pts']):>3}pts`")
+            lineas.append(f"{emoji} `{str(t['pos'])+'.':<3} {nom:<24} {str(t['pts']):>3}pts`")
+
+    return "\n".join(lineas)
+
+
+def main():
+    json_mode, _ = script_output.parse_argv()
+    try:
+        r = http_client.get(URL, headers=HEADERS, cache=True)
+        r.raise_for_status()
+    except Exception as e:
+        script_output.fail('cliga', SCHEMA_VERSION, f"Error al obtener datos: {e}", json_mode)
+
+    with timing.span('parse'):
+        grupos = parsear_grupos(r.text)
+    script_output.emit('cliga', SCHEMA_VERSION, grupos, formatear_grupos, json_mode)
 
 if __name__ == "__main__":
     main()
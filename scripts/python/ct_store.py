@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+ct_store.py
+Subdominios vistos en los logs de certificate transparency (crt.sh), guardados
+en SQLite para que net_analyzer no tenga que bajar todo de nuevo cada vez.
+
+Por dominio se guarda:
+- los nombres vistos, con el id del primer certificado que los trajo;
+- last_cert_id: el id de certificado más alto que ya se procesó. Solo avanza
+  cuando la lectura de crt.sh llegó al final o alcanzó ese mismo límite, así
+  que todo lo anterior a él ya está en la base;
+- resume_low/resume_high: ids ya procesados por una lectura cortada antes de
+  tiempo (límite de nombres o de tiempo); la siguiente se los salta y sigue
+  con los más viejos. Se borran cuando una lectura termina;
+- checked_at: cuándo se consultó crt.sh por última vez, y complete: si esa
+  consulta alcanzó a leer todo lo nuevo.
+
+Varios procesos (worker.py y ejecuciones sueltas) pueden usar la base a la
+vez: modo WAL y una espera corta si está bloqueada. Los errores de disco no
+se propagan; sin base se consulta crt.sh como antes.
+
+Uso:
+    import ct_store
+
+    estado = ct_store.state('example.com')    # None o {'last_cert_id', 'resume', 'checked_at', 'complete'}
+    ct_store.record('example.com', {'www.example.com': 123}, last_cert_id=123, complete=True)
+    nombres = ct_store.subdomains('example.com')
+"""
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent.parent
+DB_PATH = Path(os.getenv('CT_STORE_PATH', str(REPO_DIR / 'temp' / 'ct_subdomains.db')))
+BUSY_TIMEOUT = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS domains (
+    domain TEXT PRIMARY KEY,
+    last_cert_id INTEGER,
+    checked_at REAL,
+    complete INTEGER NOT NULL DEFAULT 0,
+    resume_low INTEGER,
+    resume_high INTEGER
+);
+CREATE TABLE IF NOT EXISTS subdomains (
+    domain TEXT NOT NULL,
+    name TEXT NOT NULL,
+    first_cert_id INTEGER,
+    first_seen REAL NOT NULL,
+    PRIMARY KEY (domain, name)
+) WITHOUT ROWID;
+"""
+
+
+def _connect():
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(DB_PATH), timeout=BUSY_TIMEOUT)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(_SCHEMA)
+    # Bases creadas antes de resume_low/resume_high
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(domains)')}
+    for column in ('resume_low', 'resume_high'):
+        if column not in columns:
+            conn.execute(f'ALTER TABLE domains ADD COLUMN {column} INTEGER')
+    return conn
+
+
+def state(domain):
+    """
+    {'last_cert_id', 'resume', 'checked_at', 'complete'} del dominio, o None si
+    nunca se consultó. `resume` es (id_bajo, id_alto) o None.
+    """
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                'SELECT last_cert_id, checked_at, complete, resume_low, resume_high FROM domains WHERE domain = ?',
+                (domain,)
+            ).fetchone()
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError):
+        return None
+    if row is None:
+        return None
+    resume = (row[3], row[4]) if row[3] is not None and row[4] is not None else None
+    return {'last_cert_id': row[0], 'resume': resume, 'checked_at': row[1], 'complete': bool(row[2])}
+
+
+def subdomains(domain):
+    """Nombres guardados para el dominio, ordenados."""
+    try:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                'SELECT name FROM subdomains WHERE domain = ? ORDER BY name', (domain,)
+            ).fetchall()
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError):
+        return []
+    return [row[0] for row in rows]
+
+
+def record(domain, names, last_cert_id=None, complete=False, resume=None):
+    """
+    Agrega `names` ({nombre: id del certificado}) y marca la consulta.
+    `last_cert_id` solo se guarda si es mayor que el actual; sin él (lectura
+    cortada antes de tiempo) el límite queda donde estaba. `resume`
+    ((id_bajo, id_alto) o None) reemplaza el rango ya procesado.
+    Devuelve False si no se pudo escribir.
+    """
+    resume_low, resume_high = resume or (None, None)
+    now = time.time()
+    try:
+        conn = _connect()
+        try:
+            with conn:
+                conn.executemany(
+                    'INSERT OR IGNORE INTO subdomains (domain, name, first_cert_id, first_seen) VALUES (?, ?, ?, ?)',
+                    ((domain, name, cert_id, now) for name, cert_id in names.items())
+                )
+                conn.execute(
+                    'INSERT INTO domains (domain, last_cert_id, checked_at, complete, resume_low, resume_high) '
+                    'VALUES (?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT(domain) DO UPDATE SET '
+                    'last_cert_id = MAX(COALESCE(last_cert_id, 0), COALESCE(excluded.last_cert_id, 0)), '
+                    'checked_at = excluded.checked_at, '
+                    'complete = excluded.complete, '
+                    'resume_low = excluded.resume_low, '
+                    'resume_high = excluded.resume_high',
+                    (domain, last_cert_id, now, int(complete), resume_low, resume_high)
+                )
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError):
+        return False
+    return True
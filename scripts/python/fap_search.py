@@ -1,6 +1,6 @@
 import sys
 import json
-import requests
+import http_client
 import re
 import io
 from bs4 import BeautifulSoup
@@ -21,7 +21,7 @@ def search_fap(search_term):
     }
 
     try:
-        r = requests.get(url, headers=headers, timeout=10, allow_redirects=True)
+        r = http_client.get(url, headers=headers, allow_redirects=True)
         r.raise_for_status()
 
         soup = BeautifulSoup(r.text, 'html.parser')
@@ -8,7 +8,7 @@ Uso: python farmacias.py <comuna>
 
 import sys
 import json
-import requests
+import http_client
 import io
 from unidecode import unidecode
 
@@ -20,7 +20,7 @@ API_URL = 'https://midas.minsal.cl/farmacia_v2/WS/getLocalesTurnos.php'
 def buscar_farmacias(comuna_busqueda):
     try:
         # 1. Obtener datos de la API oficial (mucho más rápido que scraping)
-        response = requests.get(API_URL, timeout=10)
+        response = http_client.get(API_URL, cache=True)
         response.raise_for_status()
         farmacias = response.json()
         
@@ -1,7 +1,9 @@
 # feriados.py - Obtiene los 5 próximos feriados desde feriados.cl
 import sys
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
+from browser_pool import lease_page
+import script_output
+import timing
+from html_parser import parse_subtree
 from datetime import datetime
 import io
 import locale
@@ -20,6 +22,8 @@ except locale.Error:
 
 URL = "https://www.feriados.cl"
 
+SCHEMA_VERSION = 1
+
 # Mapeo de meses en español a números
 MESES_MAP = {
     'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4,
@@ -64,87 +68,104 @@ def parse_fecha(fecha_texto):
     except (ValueError, IndexError):
         return None
 
+class SinTabla(Exception):
+    """feriados.cl cargó pero sin la tabla de feriados."""
+
+
 def obtener_proximos_feriados():
     """
     Navega a feriados.cl y extrae los próximos 5 feriados desde la tabla.
+    Devuelve [{'fecha': 'YYYY-MM-DD', 'nombre', 'dia_semana', 'fecha_text',
+    'dias_restantes', 'marcador'}, ...] ordenados por fecha.
     """
-    try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            
-            # Establecer un timeout más generoso
+    with lease_page() as page:
+        # Establecer un timeout más generoso
+        with timing.span('browser.goto'):
             page.goto(URL, wait_until='domcontentloaded', timeout=30000)
-            
-            # Esperamos a que aparezca la tabla
+        
+        # Esperamos a que aparezca la tabla
+        with timing.span('browser.wait'):
             page.wait_for_selector('tbody tr', timeout=25000)
-            content = page.content()
-            browser.close()
+        content = page.content()
 
-        soup = BeautifulSoup(content, 'html.parser')
-        
-        # Seleccionamos el cuerpo de la tabla
-        tabla_body = soup.find('tbody')
-        if not tabla_body:
-            print("⚠️ No se encontró la tabla de feriados. Intenta más tarde.")
-            return
+    soup = parse_subtree(content, 'tbody')
+    
+    # Seleccionamos el cuerpo de la tabla
+    tabla_body = soup.find('tbody')
+    if not tabla_body:
+        raise SinTabla("⚠️ No se encontró la tabla de feriados. Intenta más tarde.")
 
-        proximos_feriados = []
-        today = datetime.now()
+    proximos_feriados = []
+    today = datetime.now()
+    
+    # Iteramos por cada fila (<tr>) de la tabla
+    for fila in tabla_body.find_all('tr'):
+        celdas = fila.find_all('td')
+        if len(celdas) < 2:
+            continue
+
+        # La fecha está en la primera celda, el nombre en la segunda
+        fecha_texto = celdas[0].text.strip()
+        nombre = celdas[1].text.strip()
         
-        # Iteramos por cada fila (<tr>) de la tabla
-        for fila in tabla_body.find_all('tr'):
-            celdas = fila.find_all('td')
-            if len(celdas) < 2:
-                continue
-
-            # La fecha está en la primera celda, el nombre en la segunda
-            fecha_texto = celdas[0].text.strip()
-            nombre = celdas[1].text.strip()
+        # Parsear la fecha
+        feriado_date = parse_fecha(fecha_texto)
+        
+        if feriado_date and feriado_date.date() >= today.date():
+            # Formateamos la fecha de manera legible
+            fecha_formateada = feriado_date.strftime('%d de %B').lower()
+            dia_semana = feriado_date.strftime('%A').capitalize()
             
-            # Parsear la fecha
-            feriado_date = parse_fecha(fecha_texto)
+            # Calcular días restantes
+            dias_restantes = (feriado_date.date() - today.date()).days
             
-            if feriado_date and feriado_date.date() >= today.date():
-                # Formateamos la fecha de manera legible
-                fecha_formateada = feriado_date.strftime('%d de %B').lower()
-                dia_semana = feriado_date.strftime('%A').capitalize()
-                
-                # Calcular días restantes
-                dias_restantes = (feriado_date.date() - today.date()).days
-                
-                if dias_restantes == 0:
-                    marcador = "🔴 Hoy"
-                elif dias_restantes == 1:
-                    marcador = "⏰ Mañana"
-                else:
-                    marcador = f"📅 En {dias_restantes} días"
-                
-                proximos_feriados.append({
-                    'fecha': feriado_date,
-                    'nombre': nombre,
-                    'dia_semana': dia_semana,
-                    'fecha_text': fecha_formateada,
-                    'dias_restantes': dias_restantes,
-                    'marcador': marcador
-                })
-        
-        # Ordenar por fecha y obtener los 5 próximos
-        proximos_feriados.sort(key=lambda x: x['fecha'])
-        proximos_feriados = proximos_feriados[:5]
-        
-        if len(proximos_feriados) > 0:
-            print('🥳 *Próximos feriados en Chile:*\n')
-            for i, feriado in enumerate(proximos_feriados, 1):
-                output = f"{i}. *{feriado['nombre']}*\n"
-                output += f"   {feriado['dia_semana'].capitalize()}, {feriado['fecha_text']}\n"
-                output += f"   {feriado['marcador']}"
-                print(output)
-        else:
-            print('🎉 Ucha, parece que no quedan feriados este año. ¡Que descanses!')
+            if dias_restantes == 0:
+                marcador = "🔴 Hoy"
+            elif dias_restantes == 1:
+                marcador = "⏰ Mañana"
+            else:
+                marcador = f"📅 En {dias_restantes} días"
+            
+            proximos_feriados.append({
+                'fecha': feriado_date.strftime('%Y-%m-%d'),
+                'nombre': nombre,
+                'dia_semana': dia_semana,
+                'fecha_text': fecha_formateada,
+                'dias_restantes': dias_restantes,
+                'marcador': marcador
+            })
+    
+    # Ordenar por fecha y obtener los 5 próximos
+    proximos_feriados.sort(key=lambda x: x['fecha'])
+    return proximos_feriados[:5]
+
 
+def formatear_feriados(proximos_feriados):
+    """Texto para WhatsApp a partir de obtener_proximos_feriados()."""
+    if not proximos_feriados:
+        return '🎉 Ucha, parece que no quedan feriados este año. ¡Que descanses!'
+
+    lineas = ['🥳 *Próximos feriados en Chile:*\n']
+    for i, feriado in enumerate(proximos_feriados, 1):
+        output = f"{i}. *{feriado['nombre']}*\n"
+        output += f"   {feriado['dia_semana'].capitalize()}, {feriado['fecha_text']}\n"
+        output += f"   {feriado['marcador']}"
+        lineas.append(output)
+    return "\n".join(lineas)
+
+
+def main():
+    json_mode, _ = script_output.parse_argv()
+    try:
+        with timing.span('fetch'):
+            feriados = obtener_proximos_feriados()
+    except SinTabla as e:
+        script_output.fail('feriados', SCHEMA_VERSION, str(e), json_mode, exit_code=0)
     except Exception as e:
-        print(f"⚠️ Error al obtener los feriados: {str(e)}", file=sys.stderr)
+        script_output.fail('feriados', SCHEMA_VERSION, f"⚠️ Error al obtener los feriados: {str(e)}", json_mode,
+                           exit_code=0, file=sys.stderr)
+
+    script_output.emit('feriados', SCHEMA_VERSION, feriados, formatear_feriados, json_mode)
 
 if __name__ == "__main__":
-    obtener_proximos_feriados()
\ No newline at end of file
+    main()
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 import requests
+import http_client
+import script_output
+import timing
 from bs4 import BeautifulSoup
 import sys
 from unidecode import unidecode
@@ -13,6 +16,8 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 SIGNOS_DIR = os.path.join(SCRIPT_DIR, '..', '..', 'signos')
 
+SCHEMA_VERSION = 1
+
 # Se mantiene tu diccionario de emojis
 emojis_signos = {
     "aries": "♈️", "tauro": "♉️", "geminis": "♊️", "cancer": "♋️", "leo": "♌️", 
@@ -34,90 +39,92 @@ def obtener_ruta_imagen(signo):
         return os.path.abspath(imagen_path)
     return "no_image"
 
-def obtener_horoscopo(signo_buscar):
-    url = "https://www.pudahuel.cl/horoscopo/"
-    try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        return f"Error al conectar con la página de horóscopo: {e}"
+def parsear_signos(response):
+    """Extrae descripción, palabra, número y color de cada signo de la página."""
+    soup = BeautifulSoup(response.content, "html.parser")
     
-    try:
-        soup = BeautifulSoup(response.content, "html.parser")
+    # Buscar todos los h2 que contienen los nombres de los signos
+    signos_h2 = soup.find_all("h2")
+    datos_signos = {}
+    
+    for h2 in signos_h2:
+        nombre_signo = h2.text.strip()
         
-        # Buscar todos los h2 que contienen los nombres de los signos
-        signos_h2 = soup.find_all("h2")
-        datos_signos = {}
+        # Saltar si no es un signo válido
+        nombre_normalizado = unidecode(nombre_signo.lower())
+        if nombre_normalizado not in emojis_signos:
+            continue
         
-        for h2 in signos_h2:
-            nombre_signo = h2.text.strip()
-            
-            # Saltar si no es un signo válido
-            nombre_normalizado = unidecode(nombre_signo.lower())
-            if nombre_normalizado not in emojis_signos:
-                continue
-            
-            descripcion = ""
-            palabra_clave = "No disponible"
-            numero = "No disponible"
-            color = "No disponible"
-            imagen_url = obtener_ruta_imagen(nombre_normalizado)
-            
-            # Recopilar párrafos hasta encontrar los datos o cambiar de sección
-            elementos = []
-            actual = h2.find_next()
+        descripcion = ""
+        palabra_clave = "No disponible"
+        numero = "No disponible"
+        color = "No disponible"
+        imagen_url = obtener_ruta_imagen(nombre_normalizado)
+        
+        # Recopilar párrafos hasta encontrar los datos o cambiar de sección
+        elementos = []
+        actual = h2.find_next()
+        
+        while actual:
+            if actual.name == "h2":
+                # Hemos llegado a otro signo, detener
+                break
+            elif actual.name == "p":
+                elementos.append(actual.text.strip())
             
-            while actual:
-                if actual.name == "h2":
-                    # Hemos llegado a otro signo, detener
-                    break
-                elif actual.name == "p":
-                    elementos.append(actual.text.strip())
-                
-                actual = actual.find_next_sibling()
+            actual = actual.find_next_sibling()
+        
+        # Procesar los elementos recopilados
+        texto_completo = " ".join(elementos)
+        
+        # El primer elemento es la descripción (antes de PALABRA:)
+        if "PALABRA:" in texto_completo:
+            descripcion = texto_completo.split("PALABRA:")[0].strip()
+            resto = texto_completo.split("PALABRA:")[1]
             
-            # Procesar los elementos recopilados
-            texto_completo = " ".join(elementos)
+            # Extraer palabra clave
+            if "NÚMERO:" in resto:
+                palabra_clave = resto.split("NÚMERO:")[0].strip()
+                resto = resto.split("NÚMERO:")[1]
+            else:
+                palabra_clave = resto.split("COLOR:")[0].strip()
+                resto = resto.split("COLOR:")[1]
             
-            # El primer elemento es la descripción (antes de PALABRA:)
-            if "PALABRA:" in texto_completo:
-                descripcion = texto_completo.split("PALABRA:")[0].strip()
-                resto = texto_completo.split("PALABRA:")[1]
-                
-                # Extraer palabra clave
-                if "NÚMERO:" in resto:
-                    palabra_clave = resto.split("NÚMERO:")[0].strip()
-                    resto = resto.split("NÚMERO:")[1]
-                else:
-                    palabra_clave = resto.split("COLOR:")[0].strip()
-                    resto = resto.split("COLOR:")[1]
-                
-                # Extraer número
-                if "COLOR:" in resto:
-                    numero = resto.split("COLOR:")[0].strip()
-                    color_texto = resto.split("COLOR:")[1].strip()
-                    # Limpiar la parte de "Signo de..." del color
-                    if "Signo de" in color_texto:
-                        color = color_texto.split("Signo de")[0].strip()
-                    else:
-                        color = color_texto
+            # Extraer número
+            if "COLOR:" in resto:
+                numero = resto.split("COLOR:")[0].strip()
+                color_texto = resto.split("COLOR:")[1].strip()
+                # Limpiar la parte de "Signo de..." del color
+                if "Signo de" in color_texto:
+                    color = color_texto.split("Signo de")[0].strip()
                 else:
-                    numero = resto.strip()
+                    color = color_texto
             else:
-                descripcion = texto_completo
-            
-            # Limpiar descripciones que contengan información extra
-            if "Signo de" in descripcion:
-                descripcion = descripcion.split("Signo de")[0].strip()
-            
-            datos_signos[nombre_normalizado] = {
-                "descripcion": descripcion,
-                "palabra": palabra_clave,
-                "numero": numero,
-                "color": color,
-                "imagen": imagen_url
-            }
+                numero = resto.strip()
+        else:
+            descripcion = texto_completo
+        
+        # Limpiar descripciones que contengan información extra
+        if "Signo de" in descripcion:
+            descripcion = descripcion.split("Signo de")[0].strip()
+        
+        datos_signos[nombre_normalizado] = {
+            "descripcion": descripcion,
+            "palabra": palabra_clave,
+            "numero": numero,
+            "color": color,
+            "imagen": imagen_url
+        }
 
+    return datos_signos
+
+def obtener_horoscopo(signo_buscar):
+    url = "https://www.pudahuel.cl/horoscopo/"
+    try:
+        # Si la página no cambió (caché fresca o 304) se reutiliza el parseo anterior
+        datos_signos = http_client.get_parsed(url, parsear_signos, key='horoscopo-v1', headers=HEADERS)
+    except requests.RequestException as e:
+        return f"Error al conectar con la página de horóscopo: {e}"
     except Exception as e:
         return f"Error al procesar los datos de la página: {e}"
 
@@ -127,21 +134,32 @@ def obtener_horoscopo(signo_buscar):
     else:
         return "Signo no encontrado."
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Uso: python horoscopo.py <signo>")
-    else:
-        signo = sys.argv[1]
+def formatear_horoscopo(datos):
+    """Texto para WhatsApp del signo pedido."""
+    # --- NUEVO FORMATO DE SALIDA PARA WHATSAPP ---
+    return "\n".join([
+        f"*{datos['nombre']}* {datos['emoji']}\n",
+        f"{datos['descripcion']}\n",
+        f"📖 *Palabra Clave:* {datos['palabra']}",
+        f"🔢 *Número de Suerte:* {datos['numero']}",
+        f"🎨 *Color:* {datos['color']}",
+    ])
+
+def main():
+    json_mode, args = script_output.parse_argv()
+    if len(args) != 1:
+        script_output.fail('horoscopo', SCHEMA_VERSION, "Uso: python horoscopo.py <signo>", json_mode, exit_code=0)
+
+    signo = args[0]
+    with timing.span('fetch'):
         horoscopo = obtener_horoscopo(signo)
-        
-        if isinstance(horoscopo, dict):
-            emoji_signo = emojis_signos.get(unidecode(signo.lower()), "")
-            
-            # --- NUEVO FORMATO DE SALIDA PARA WHATSAPP ---
-            print(f"*{signo.capitalize()}* {emoji_signo}\n")
-            print(f"{horoscopo['descripcion']}\n")
-            print(f"📖 *Palabra Clave:* {horoscopo['palabra']}")
-            print(f"🔢 *Número de Suerte:* {horoscopo['numero']}")
-            print(f"🎨 *Color:* {horoscopo['color']}")
-        else:
-            print(horoscopo)
\ No newline at end of file
+    if not isinstance(horoscopo, dict):
+        script_output.fail('horoscopo', SCHEMA_VERSION, horoscopo, json_mode, exit_code=0)
+
+    signo_normalizado = unidecode(signo.lower())
+    datos = dict(horoscopo, signo=signo_normalizado, nombre=signo.capitalize(),
+                 emoji=emojis_signos.get(signo_normalizado, ""))
+    script_output.emit('horoscopo', SCHEMA_VERSION, datos, formatear_horoscopo, json_mode)
+
+if __name__ == "__main__":
+    main()
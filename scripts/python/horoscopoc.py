@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import sys
-import requests
+import http_client
+import script_output
+import timing
 from bs4 import BeautifulSoup
 from unidecode import unidecode
 import io
@@ -13,6 +15,8 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 SIGNOS_DIR = os.path.join(SCRIPT_DIR, '..', '..', 'signos')
 
+SCHEMA_VERSION = 1
+
 emojis_signos_chinos = {
     "rata": "🐀", "buey": "🐂", "tigre": "🐅", "conejo": "🐇", "dragon": "🐉",
     "serpiente": "🐍", "caballo": "🐎", "cabra": "🐐", "mono": "🐒",
@@ -32,7 +36,7 @@ def obtener_ruta_imagen(signo):
 def obtener_horoscopo_chino(signo_buscar):
     url = "https://www.elhoroscopochino.com.ar/horoscopo-chino-de-hoy"
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
+        response = http_client.get(url, headers=HEADERS, cache=True)
         response.raise_for_status()
         soup = BeautifulSoup(response.content, "html.parser")
         
@@ -80,18 +84,24 @@ def obtener_horoscopo_chino(signo_buscar):
         import traceback
         return f"Error: {str(e)}\n{traceback.format_exc()}"
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Uso: python horoscopoc.py <signo>")
-    else:
-        signo = sys.argv[1]
+def formatear_horoscopo(datos):
+    """Texto para WhatsApp del signo pedido."""
+    return f"*{datos['nombre_original']}* {datos['emoji']}\n\n_{datos['descripcion']}_"
+
+def main():
+    json_mode, args = script_output.parse_argv()
+    if len(args) != 1:
+        script_output.fail('horoscopoc', SCHEMA_VERSION, "Uso: python horoscopoc.py <signo>", json_mode, exit_code=0)
+
+    signo = args[0]
+    with timing.span('fetch'):
         horoscopo = obtener_horoscopo_chino(signo)
+    if not isinstance(horoscopo, dict):
+        script_output.fail('horoscopoc', SCHEMA_VERSION, horoscopo, json_mode, exit_code=0)
 
-        if isinstance(horoscopo, dict):
-            signo_norm = unidecode(signo.lower())
-            emoji = emojis_signos_chinos.get(signo_norm, "🧧")
-            
-            print(f"*{horoscopo['nombre_original']}* {emoji}\n")
-            print(f"_{horoscopo['descripcion']}_")
-        else:
-            print(horoscopo)
\ No newline at end of file
+    signo_norm = unidecode(signo.lower())
+    datos = dict(horoscopo, signo=signo_norm, emoji=emojis_signos_chinos.get(signo_norm, "🧧"))
+    script_output.emit('horoscopoc', SCHEMA_VERSION, datos, formatear_horoscopo, json_mode)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+html_parser.py
+Parseo HTML común para los scrapers: en vez de armar el árbol completo de la
+página con html.parser, se parsea solo el subárbol que el script necesita.
+
+Backends (variable HTML_PARSER_BACKEND, por defecto 'auto'):
+- selectolax: Lexbor (C) ubica los nodos con un selector CSS y BeautifulSoup
+  parsea solo ese HTML.
+- strainer: BeautifulSoup con SoupStrainer sobre lxml (o html.parser si lxml
+  no está instalado); descarta todo lo que no calza mientras parsea.
+- full: el árbol completo con html.parser, como antes.
+
+'auto' usa selectolax si está instalado y si no strainer. Si el backend rápido
+falla o no encuentra nada, se repite con 'full', así que el resultado nunca es
+peor que el de antes.
+
+Los selectores son simples: 'tag' o 'tag.clase' (clase con la misma semántica
+que class_= de BeautifulSoup). El resultado es un BeautifulSoup y se recorre
+igual que antes (soup.find, find_all...).
+
+Uso:
+    from html_parser import parse_subtree
+    soup = parse_subtree(html, 'table.a_tb')
+    tabla = soup.find('table', class_='a_tb')
+"""
+import os
+
+from bs4 import BeautifulSoup, SoupStrainer, UnicodeDammit
+from bs4.builder import ParserRejectedMarkup
+
+import timing
+
+BACKEND = os.getenv('HTML_PARSER_BACKEND', 'auto').lower()
+
+try:
+    import lxml  # noqa: F401
+    TREE_BUILDER = 'lxml'
+except ImportError:
+    TREE_BUILDER = 'html.parser'
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+    SELECTOLAX_AVAILABLE = True
+except ImportError:
+    SELECTOLAX_AVAILABLE = False
+
+
+def _split(selector):
+    name, _, class_ = selector.partition('.')
+    return name, class_ or None
+
+
+def _to_text(html):
+    """Bytes -> str con la misma detección de codificación que usa BeautifulSoup."""
+    if isinstance(html, bytes):
+        return UnicodeDammit(html, is_html=True).unicode_markup
+    return html
+
+
+def _has_match(soup, selectors):
+    return any(soup.find(name, class_=class_) for name, class_ in map(_split, selectors))
+
+
+def _inside(node, chosen):
+    """¿Algún ancestro de `node` está entre los `chosen` (mem_id)?"""
+    parent = node.parent
+    while parent is not None:
+        if parent.mem_id in chosen:
+            return True
+        parent = parent.parent
+    return False
+
+
+def _parse_selectolax(html, selectors):
+    tree = LexborHTMLParser(_to_text(html))
+    nodes = tree.css(', '.join(selectors))
+    # Un nodo dentro de otro ya elegido viene incluido en el HTML de su ancestro
+    chosen = {node.mem_id for node in nodes}
+    fragment = ''.join(node.html for node in nodes if not _inside(node, chosen))
+    # Liberar el DOM de Lexbor (todo el documento) antes de armar el de bs4
+    del tree, nodes
+    return BeautifulSoup(fragment, TREE_BUILDER)
+
+
+def _parse_strainer(html, selectors):
+    # Un SoupStrainer filtra un solo (tag, clase): con varios selectores se
+    # hace una pasada por selector y se juntan los resultados en ese orden
+    soups = []
+    for name, class_ in map(_split, selectors):
+        strainer = SoupStrainer(name, class_=class_) if class_ else SoupStrainer(name)
+        soups.append(BeautifulSoup(html, TREE_BUILDER, parse_only=strainer))
+    soup = soups[0]
+    for extra in soups[1:]:
+        for element in list(extra.contents):
+            soup.append(element.extract())
+    return soup
+
+
+def parse_full(html):
+    """El camino de siempre: árbol completo con html.parser."""
+    return BeautifulSoup(html, 'html.parser')
+
+
+def parse_subtree(html, *selectors, backend=None):
+    """
+    BeautifulSoup con solo los nodos que calzan con `selectors` ('tag' o
+    'tag.clase'). Vuelve al árbol completo si el backend rápido no encuentra nada.
+    """
+    backend = (backend or BACKEND).lower()
+    if backend == 'auto':
+        backend = 'selectolax' if SELECTOLAX_AVAILABLE else 'strainer'
+
+    if backend == 'selectolax' and not SELECTOLAX_AVAILABLE:
+        backend = 'strainer'
+
+    if backend in ('selectolax', 'strainer') and html:
+        with timing.span('parse.html', backend=backend):
+            try:
+                if backend == 'selectolax':
+                    soup = _parse_selectolax(html, selectors)
+                else:
+                    soup = _parse_strainer(html, selectors)
+                if _has_match(soup, selectors):
+                    return soup
+            except (ParserRejectedMarkup, ValueError, UnicodeError):
+                # Marcado que el parser rápido no acepta: se repite con el árbol completo
+                pass
+
+    with timing.span('parse.html', backend='full'):
+        return parse_full(html)
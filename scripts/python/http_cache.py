@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+http_cache.py
+Caché en disco de respuestas HTTP para http_client.
+
+- Guarda el cuerpo (ya descomprimido) y sus metadatos por URL en temp/http_cache/.
+- Respeta Cache-Control (max-age, s-maxage, no-store, no-cache) y Expires.
+- Revalida con If-None-Match / If-Modified-Since: un 304 no descarga nada.
+- Permite forzar el TTL por host (TTL_OVERRIDES) o por llamada.
+- Expulsa por LRU cuando el directorio supera HTTP_CACHE_MAX_MB.
+- Puede guardar además el resultado ya parseado, para saltarse el parseo
+  cuando el cuerpo no cambió.
+
+Las escrituras son atómicas (archivo temporal + os.replace), así que varios
+workers pueden compartir el directorio.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+from result_cache import atomic_write
+
+REPO_DIR = Path(__file__).resolve().parent.parent.parent
+CACHE_DIR = Path(os.getenv('HTTP_CACHE_DIR', str(REPO_DIR / 'temp' / 'http_cache')))
+MAX_BYTES = int(float(os.getenv('HTTP_CACHE_MAX_MB', '50')) * 1024 * 1024)
+
+# TTL forzado (segundos) por host, por sobre lo que diga el servidor
+TTL_OVERRIDES = {
+    'www.pudahuel.cl': 60 * 60,
+    'www.elhoroscopochino.com.ar': 60 * 60,
+    'www.campeonatochileno.cl': 60,
+    'chile.as.com': 5 * 60,
+    'crt.sh': 6 * 60 * 60,
+    'midas.minsal.cl': 10 * 60,
+}
+
+# Cabeceras que no tienen sentido al servir el cuerpo ya decodificado
+_DROP_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+
+def _key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def parse_cache_control(value):
+    """'max-age=60, no-cache' -> {'max-age': '60', 'no-cache': True}"""
+    directives = {}
+    for part in (value or '').split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        if '=' in part:
+            name, _, arg = part.partition('=')
+            directives[name.strip()] = arg.strip().strip('"')
+        else:
+            directives[part] = True
+    return directives
+
+
+def freshness_lifetime(headers, now=None):
+    """
+    Segundos que la respuesta se considera fresca según sus cabeceras,
+    o None si el servidor prohíbe almacenarla (no-store).
+    """
+    now = now or time.time()
+    cc = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-store' in cc:
+        return None
+    if 'no-cache' in cc:
+        return 0
+    for directive in ('s-maxage', 'max-age'):
+        if directive in cc and re.fullmatch(r'\d+', str(cc[directive])):
+            return int(cc[directive])
+    expires = headers.get('Expires')
+    if expires:
+        try:
+            return max(0, int(parsedate_to_datetime(expires).timestamp() - now))
+        except (TypeError, ValueError, OverflowError):
+            return 0
+    return 0
+
+
+class HttpCache:
+    """Almacén en disco: <clave>.json (metadatos) + <clave>.body (cuerpo)."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def _paths(self, url):
+        key = _key(url)
+        return self.directory / f'{key}.json', self.directory / f'{key}.body'
+
+    def load(self, url):
+        """Devuelve (meta, body) o (None, None) si no hay entrada válida."""
+        meta_path, body_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding='utf-8'))
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None, None
+        if meta.get('url') != url:
+            return None, None
+        # mtime del cuerpo = último acceso (para el LRU)
+        try:
+            os.utime(body_path)
+        except OSError:
+            pass
+        return meta, body
+
+    def is_fresh(self, meta, now=None):
+        now = now or time.time()
+        return now < meta.get('stored_at', 0) + meta.get('ttl', 0)
+
+    def conditional_headers(self, meta):
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def build_meta(self, url, status, headers, ttl):
+        return {
+            'url': url,
+            'status': status,
+            'headers': {k: v for k, v in headers.items() if k.lower() not in _DROP_HEADERS},
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'stored_at': time.time(),
+            'ttl': ttl,
+            'parsed': {},
+        }
+
+    def save(self, url, meta, body=None):
+        """Guarda metadatos (y el cuerpo si viene). Expulsa entradas si hace falta."""
+        meta_path, body_path = self._paths(url)
+        if body is not None:
+            atomic_write(body_path, body)
+        atomic_write(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        if body is not None:
+            self.evict()
+
+    def evict(self):
+        """Borra los cuerpos menos usados hasta quedar bajo el presupuesto."""
+        if not self.max_bytes:
+            return
+        try:
+            bodies = [(p, p.stat()) for p in self.directory.glob('*.body')]
+        except OSError:
+            return
+        total = sum(st.st_size for _, st in bodies)
+        if total <= self.max_bytes:
+            return
+        for body_path, st in sorted(bodies, key=lambda item: item[1].st_mtime):
+            for path in (body_path, body_path.with_suffix('.json')):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            total -= st.st_size
+            if total <= self.max_bytes:
+                break
+
+
+_default_cache = None
+
+
+def get_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = HttpCache()
+    return _default_cache
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+http_client.py
+Cliente HTTP común para los scripts de scripts/python.
+
+- Una requests.Session con keep-alive por host (pool de conexiones).
+- Política de reintentos acotada (errores de conexión y 429/5xx).
+- Límite de peticiones simultáneas por host.
+- Descompresión gzip/deflate y brotli (si está instalado `brotli`).
+- Timeouts por defecto definidos solo aquí.
+- Caché en disco opcional con revalidación ETag/Last-Modified (http_cache.py).
+- Modo `inspect=True`: cada respuesta (también las de redirección) trae en
+  `response.tls` la versión TLS, el cifrado, ALPN y el certificado del
+  servidor, y en `response.timing` los tiempos de DNS, TCP, TLS, TTFB y
+  descarga, todo medido sobre la misma conexión (sin abrir otro socket).
+
+Dentro de worker.py el módulo queda cargado, así que las conexiones siguen
+abiertas entre comandos.
+
+Uso:
+    import http_client
+    response = http_client.get(url, headers=HEADERS)
+    response.raise_for_status()
+
+    # Con caché: `response.from_cache` indica si el cuerpo salió del disco
+    response = http_client.get(url, cache=True)
+
+    # Con caché del resultado parseado: si la página no cambió, no se parsea
+    datos = http_client.get_parsed(url, parsear, key='horoscopo-v1')
+
+    # Datos TLS de la conexión
+    response = http_client.get(url, inspect=True)
+    response.tls  # {'version': 'TLSv1.3', 'cipher': ..., 'alpn': ..., 'cert': {...} o None}
+    response.timing  # {'dns_ms': 12.1, 'tcp_ms': 30.4, 'tls_ms': 41.0, 'ttfb_ms': 95.2, 'transfer_ms': 8.7}
+"""
+import json
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util import make_headers
+from urllib3.util.connection import allowed_gai_family
+from urllib3.util.retry import Retry
+
+import http_cache
+import timing
+
+# --- CONFIGURACIÓN ---
+CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+BACKOFF_FACTOR = 0.5
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# Conexiones y peticiones simultáneas permitidas por host
+HOST_MAX_CONCURRENCY = int(os.getenv('HTTP_HOST_MAX_CONCURRENCY', '4'))
+
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+)
+
+# urllib3 solo anuncia 'br' si el paquete brotli está disponible para decodificarlo
+ACCEPT_ENCODING = make_headers(accept_encoding=True)['accept-encoding']
+
+DEFAULT_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept-Encoding': ACCEPT_ENCODING,
+}
+
+# Sesiones por (esquema, host, reintentos, inspect) y semáforos por host
+_sessions = {}
+_host_slots = {}
+_lock = threading.Lock()
+
+
+def _build_retry(retry):
+    if not retry:
+        return Retry(total=0, connect=0, read=0, redirect=False, status=0, raise_on_status=False)
+    return Retry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=1,
+        status=RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset({'GET', 'HEAD', 'OPTIONS'}),
+        # Un Retry-After largo rompería el presupuesto de tiempo del bot
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+class _TimedConnectionMixin:
+    """
+    Mide las fases de la conexión para `response.timing`:
+    - dns_ms / tcp_ms: la resolución se hace aquí y se conecta a cada
+      dirección en orden (como create_connection), así no se cuenta dos veces;
+    - tls_ms: handshake (solo HTTPS), medido en connect();
+    - ttfb_ms: desde que se terminó de enviar la petición hasta tener las
+      cabeceras de la respuesta (lo que tarda el servidor + un RTT).
+    En una conexión reutilizada solo hay ttfb_ms y 'reused': True.
+    """
+
+    timing_info = None
+    _phases = None
+    _requests = 0
+    _sent_at = None
+
+    def _new_conn(self):
+        host = self._dns_host
+        started = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except socket.gaierror:
+            # urllib3 arma el NameResolutionError de siempre
+            return super()._new_conn()
+        resolved = time.perf_counter()
+
+        error = None
+        try:
+            for address in dict.fromkeys(info[4][0] for info in addresses):
+                self._dns_host = address
+                try:
+                    sock = super()._new_conn()
+                    break
+                except (NewConnectionError, ConnectTimeoutError) as e:
+                    error = e
+            else:
+                raise error
+        finally:
+            self._dns_host = host
+
+        self._connected_at = time.perf_counter()
+        self._phases = {'dns_ms': _ms(resolved - started), 'tcp_ms': _ms(self._connected_at - resolved)}
+        self._requests = 0
+        return sock
+
+    def request(self, *args, **kwargs):
+        super().request(*args, **kwargs)
+        self._requests += 1
+        self._sent_at = time.perf_counter()
+
+    def getresponse(self, *args, **kwargs):
+        response = super().getresponse(*args, **kwargs)
+        timing_info = dict(self._phases) if self._requests == 1 and self._phases else {'reused': True}
+        if self._sent_at:
+            timing_info['ttfb_ms'] = _ms(time.perf_counter() - self._sent_at)
+        self.timing_info = timing_info
+        return response
+
+
+class _InspectingHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _InspectingHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    """Conexión HTTPS que guarda los datos TLS del servidor al conectar."""
+
+    tls_info = None
+
+    def connect(self):
+        super().connect()
+        if self._phases is not None:
+            self._phases['tls_ms'] = _ms(time.perf_counter() - self._connected_at)
+        try:
+            cipher = self.sock.cipher()
+            self.tls_info = {
+                'version': self.sock.version(),
+                'cipher': cipher[0] if cipher else None,
+                'alpn': self.sock.selected_alpn_protocol(),
+                # Con verify=False el certificado no se decodifica: queda None
+                'cert': self.sock.getpeercert() or None,
+                'verified': self.is_verified,
+            }
+        except (AttributeError, ValueError, OSError):
+            self.tls_info = None
+
+
+class _InspectingHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _InspectingHTTPConnection
+
+
+class _InspectingHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _InspectingHTTPSConnection
+
+
+class _InspectingAdapter(HTTPAdapter):
+    """
+    Adapter que usa las conexiones _Inspecting* y expone `response.tls` y
+    `response.timing` ({dns_ms, tcp_ms, tls_ms, ttfb_ms, transfer_ms} o
+    {reused, ttfb_ms, transfer_ms}) en cada respuesta, también en los saltos
+    de redirección.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = dict(
+            self.poolmanager.pool_classes_by_scheme, http=_InspectingHTTPPool, https=_InspectingHTTPSPool
+        )
+
+    def build_response(self, req, resp):
+        response = super().build_response(req, resp)
+        response.tls = getattr(resp.connection, 'tls_info', None)
+        timing_info = getattr(resp.connection, 'timing_info', None)
+        response.timing = dict(timing_info) if timing_info else None
+        return response
+
+    def send(self, request, stream=False, **kwargs):
+        response = super().send(request, stream=stream, **kwargs)
+        if not stream and response.timing is not None:
+            # Descarga del cuerpo (requests la haría igual después)
+            started = time.perf_counter()
+            response.content
+            response.timing['transfer_ms'] = _ms(time.perf_counter() - started)
+        return response
+
+
+def _host_key(url):
+    parts = urlsplit(url)
+    return parts.scheme or 'https', (parts.hostname or '').lower()
+
+
+def get_session(url, retry=True, inspect=False):
+    """Devuelve (y crea si hace falta) la sesión compartida para el host de `url`."""
+    scheme, host = _host_key(url)
+    key = (scheme, host, bool(retry), bool(inspect))
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(DEFAULT_HEADERS)
+            adapter_class = _InspectingAdapter if inspect else HTTPAdapter
+            adapter = adapter_class(
+                pool_connections=1,
+                pool_maxsize=HOST_MAX_CONCURRENCY,
+                max_retries=_build_retry(retry),
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[key] = session
+        return session
+
+
+def _get_host_slot(host):
+    slot = _host_slots.get(host)
+    if slot is None:
+        with _lock:
+            slot = _host_slots.setdefault(host, threading.BoundedSemaphore(HOST_MAX_CONCURRENCY))
+    return slot
+
+
+def request(method, url, timeout=None, retry=True, inspect=False, **kwargs):
+    """
+    Hace una petición con la sesión del host, respetando el límite por host.
+    `retry=False` desactiva los reintentos (útil para sondas como net_analyzer).
+    `inspect=True` agrega `response.tls` (ver _InspectingAdapter).
+    """
+    session = get_session(url, retry=retry, inspect=inspect)
+    host = _host_key(url)[1]
+    with timing.span('http', host=host):
+        with _get_host_slot(host):
+            return session.request(method, url, timeout=timeout or DEFAULT_TIMEOUT, **kwargs)
+
+
+def _response_from_cache(meta, body):
+    """Reconstruye un requests.Response a partir de una entrada de la caché."""
+    response = requests.Response()
+    response.status_code = meta['status']
+    response.reason = 'OK'
+    response.headers = CaseInsensitiveDict(meta['headers'])
+    response.url = meta['url']
+    response._content = body
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.from_cache = True
+    response.cache_meta = meta
+    return response
+
+
+def _safe_save(cache, url, meta, body=None):
+    """Un problema de disco nunca debe romper la petición."""
+    try:
+        cache.save(url, meta, body)
+        return True
+    except OSError:
+        return False
+
+
+def cached_get(url, ttl=None, **kwargs):
+    """
+    GET pasando por la caché en disco. Si la entrada está fresca no toca la red;
+    si está vencida revalida y, ante un 304, sirve el cuerpo guardado.
+    `ttl` (segundos) fuerza la vigencia por sobre Cache-Control y TTL_OVERRIDES.
+    """
+    cache = http_cache.get_cache()
+    host = _host_key(url)[1]
+    override = ttl if ttl is not None else http_cache.TTL_OVERRIDES.get(host)
+
+    meta, body = cache.load(url)
+    if meta and cache.is_fresh(meta):
+        return _response_from_cache(meta, body)
+
+    headers = dict(kwargs.pop('headers', None) or {})
+    if meta:
+        headers.update(cache.conditional_headers(meta))
+
+    response = request('GET', url, headers=headers, **kwargs)
+
+    if response.status_code == 304 and meta:
+        lifetime = override if override is not None else http_cache.freshness_lifetime(response.headers)
+        meta['stored_at'] = time.time()
+        meta['ttl'] = lifetime or 0
+        meta['etag'] = response.headers.get('ETag', meta.get('etag'))
+        meta['last_modified'] = response.headers.get('Last-Modified', meta.get('last_modified'))
+        _safe_save(cache, url, meta)
+        return _response_from_cache(meta, body)
+
+    response.from_cache = False
+    response.cache_meta = None
+    if response.status_code == 200:
+        lifetime = override if override is not None else http_cache.freshness_lifetime(response.headers)
+        has_validator = 'ETag' in response.headers or 'Last-Modified' in response.headers
+        if lifetime is not None and (lifetime > 0 or has_validator):
+            # La clave es la URL pedida, aunque haya redirecciones
+            new_meta = cache.build_meta(url, 200, response.headers, lifetime)
+            if _safe_save(cache, url, new_meta, response.content):
+                response.cache_meta = new_meta
+    return response
+
+
+def get_parsed(url, parse, key, ttl=None, **kwargs):
+    """
+    Descarga (con caché) y parsea con `parse(response)`. Si el cuerpo salió de la
+    caché y ya se había parseado con la misma `key`, devuelve ese resultado sin
+    volver a parsear. El resultado debe ser serializable a JSON para guardarse.
+    Lanza requests.HTTPError si la respuesta no es 2xx.
+    """
+    response = cached_get(url, ttl=ttl, **kwargs)
+    response.raise_for_status()
+
+    meta = getattr(response, 'cache_meta', None)
+    if response.from_cache and meta and key in meta.get('parsed', {}):
+        return meta['parsed'][key]
+
+    result = parse(response)
+    if meta is not None:
+        try:
+            json.dumps(result)
+        except (TypeError, ValueError):
+            return result
+        meta.setdefault('parsed', {})[key] = result
+        _safe_save(http_cache.get_cache(), url, meta)
+    return result
+
+
+def get(url, cache=False, ttl=None, **kwargs):
+    if cache or ttl is not None:
+        return cached_get(url, ttl=ttl, **kwargs)
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def head(url, **kwargs):
+    return request('HEAD', url, **kwargs)
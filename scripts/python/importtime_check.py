@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+importtime_check.py
+Mide el costo de importación de cada script con `python -X importtime` y
+falla si alguno supera su presupuesto (importtime_budget.json).
+
+Cada script se carga con runpy bajo otro __name__, así que solo se ejecuta
+el nivel de módulo (imports y constantes), nunca su bloque principal.
+
+Uso:
+    python scripts/python/importtime_check.py            # todos los scripts
+    python scripts/python/importtime_check.py metro.py   # solo algunos
+    python scripts/python/importtime_check.py --json     # salida en JSON
+    python scripts/python/importtime_check.py --top 5    # imports más caros
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+BUDGET_FILE = SCRIPTS_DIR / 'importtime_budget.json'
+
+# Módulos de soporte: no son comandos del bot
+EXCLUDED = {'importtime_check.py', 'worker.py'}
+
+# import time:       self [us] |  cumulative | imported package
+_LINE_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def load_budgets():
+    with open(BUDGET_FILE, encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get('default_ms', 300), data.get('scripts', {})
+
+
+def measure(script, runs=1):
+    """
+    Devuelve (total_ms, [(cumulative_ms, módulo), ...]) del mejor de `runs`
+    intentos. Solo cuenta los imports de primer nivel para no sumar dos veces.
+    """
+    code = (
+        'import runpy, sys; '
+        f'sys.path.insert(0, {str(SCRIPTS_DIR)!r}); '
+        f'runpy.run_path({str(SCRIPTS_DIR / script)!r}, run_name="importtime_check")'
+    )
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    best = None
+    for _ in range(max(1, runs)):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            capture_output=True, text=True, env=env, timeout=60
+        )
+        if proc.returncode != 0:
+            last = (proc.stderr.strip().splitlines() or ['sin salida'])[-1]
+            raise RuntimeError(f'{script}: {last}')
+
+        # Lo anterior a runpy es el arranque del intérprete (site, encodings...)
+        top_level = []
+        started = False
+        for line in proc.stderr.splitlines():
+            match = _LINE_RE.match(line)
+            if not match or len(match.group(3)) != 1:
+                continue
+            if not started:
+                started = match.group(4) == 'runpy'
+            else:
+                top_level.append((int(match.group(2)) / 1000, match.group(4)))
+        total = sum(ms for ms, _ in top_level)
+        if best is None or total < best[0]:
+            best = (total, sorted(top_level, reverse=True))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Presupuesto de tiempo de importación por script')
+    parser.add_argument('scripts', nargs='*', help='Scripts a medir (por defecto todos)')
+    parser.add_argument('--runs', type=int, default=3, help='Intentos por script (se toma el mejor)')
+    parser.add_argument('--top', type=int, default=0, help='Mostrar los N imports más caros')
+    parser.add_argument('--json', action='store_true', help='Salida en JSON')
+    args = parser.parse_args()
+
+    default_ms, budgets = load_budgets()
+    scripts = args.scripts or sorted(
+        p.name for p in SCRIPTS_DIR.glob('*.py') if p.name not in EXCLUDED
+    )
+
+    results = []
+    for script in scripts:
+        budget = budgets.get(script, default_ms)
+        try:
+            total, modules = measure(script, args.runs)
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            results.append({'script': script, 'budget_ms': budget, 'error': str(e), 'ok': False})
+            continue
+        results.append({
+            'script': script,
+            'total_ms': round(total, 1),
+            'budget_ms': budget,
+            'ok': total <= budget,
+            'top': [{'module': m, 'ms': round(ms, 1)} for ms, m in modules[:args.top]],
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        for r in results:
+            status = 'OK ' if r['ok'] else 'MAL'
+            if 'error' in r:
+                print(f"{status} {r['script']:<18} ERROR: {r['error']}")
+                continue
+            print(f"{status} {r['script']:<18} {r['total_ms']:>8.1f} ms  (presupuesto {r['budget_ms']} ms)")
+            for item in r['top']:
+                print(f"      {item['ms']:>8.1f} ms  {item['module']}")
+
+    return 0 if all(r['ok'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
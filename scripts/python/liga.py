@@ -1,5 +1,5 @@
-import requests
-from bs4 import BeautifulSoup
+import http_client
+from html_parser import parse_subtree
 import json
 from datetime import datetime
 import sys
@@ -12,12 +12,13 @@ def scrapear_fecha_actual():
     }
     
     try:
-        respuesta = requests.get(url, headers=headers)
+        respuesta = http_client.get(url, headers=headers, cache=True)
         if respuesta.status_code != 200:
             print(json.dumps({"error": f"Error HTTP: {respuesta.status_code}"}))
             return
             
-        soup = BeautifulSoup(respuesta.text, 'html.parser')
+        # Solo los slides de fechas, no la página completa
+        soup = parse_subtree(respuesta.text, 'div.anwp-fl-matchweek-slides__swiper-slide')
         
         # 1. Buscar TODAS las fechas (los contenedores de los slides)
         slides = soup.find_all('div', class_='anwp-fl-matchweek-slides__swiper-slide')
@@ -2,24 +2,34 @@
 """
 Script mejorado para obtener el estado del Metro de Santiago.
 Incluye: caché, mejor manejo de errores, output JSON opcional, timeouts optimizados.
+Con --watch queda residente y escribe NDJSON solo cuando cambia el estado.
+Con --fingerprint-stats muestra cuántas veces se evitó parsear (bloque sin cambios).
 """
-import sys
+import hashlib
 import json
+import sys
+import threading
 import time
-from bs4 import BeautifulSoup
+from html_parser import parse_subtree
 import requests
+import http_client
+import result_cache
+import script_output
+import telegram_alerts
+import timing
 from unidecode import unidecode
 from datetime import datetime
 import io
-from zoneinfo import ZoneInfo
 import re
 from concurrent.futures import ThreadPoolExecutor
 
+# metro_routes y metro_history se importan en las funciones que los usan: las
+# rutas solo hacen falta con una línea caída, y el historial solo al registrar
+
 # Configurar la salida estándar para soportar UTF-8
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
-# --- CONFIGURACIÓN ---
-REQUEST_TIMEOUT = 8  # segundos (reducido de 10)
+SCHEMA_VERSION = 1
 
 # Mapeo de los íconos de la web a los nombres de las líneas
 LINE_ICONS = {
@@ -46,166 +56,290 @@ COLORS = {
 # --- FUNCIONES DE SCRAPING ---
 
 def get_latest_telegram_alert():
-    """Obtiene el último post del canal de Telegram @metrosantiagoalertas."""
-    url = "https://t.me/s/metrosantiagoalertas"
-    try:
-        response = requests.get(url, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        messages = soup.find_all('div', class_='tgme_widget_message_wrap')
-        
-        if not messages:
-            return {'error': 'No se pudieron obtener mensajes de Telegram', 'text': None}
+    """
+    Último post del canal de Telegram @metrosantiagoalertas, desde el registro
+    incremental de telegram_alerts (solo se bajan los mensajes nuevos).
+    Si la sincronización falla se devuelve igual la última alerta guardada,
+    pero con `error` y stale=True (y age_s, su antigüedad en segundos).
+    """
+    result = telegram_alerts.sync()
+    alerts = telegram_alerts.latest(1)
+    if not alerts:
+        return {'error': result['error'] or 'No se pudieron obtener mensajes de Telegram', 'text': None}
+    data = {
+        'text': alerts[0]['text'],
+        'time': telegram_alerts.local_time(alerts[0]),
+        'error': result['error'],
+        'stale': result['error'] is not None,
+    }
+    if data['stale']:
+        data['age_s'] = telegram_alerts.age_seconds(alerts[0])
+    return data
+
+# --- HUELLA DEL BLOQUE PARSEADO ---
+# metro.cl y red.cl entregan casi todo el día la misma información, pero el
+# resto de la página cambia (tokens, scripts, banners) y get_parsed solo se
+# salta el parseo con un 304. Antes de armar el árbol se corta con regex el
+# bloque que se usa y se saca su hash: si es igual al de la última vez se
+# devuelve el resultado guardado en result_cache, sin BeautifulSoup ni
+# unidecode. La entrada de cada fuente solo se reescribe cuando cambia el bloque.
+# Cada consulta marca 'hit' en el span 'parse.fingerprint' del registro de
+# timing; los aciertos/fallos se cuentan en memoria y se suman a los acumulados
+# una vez por corrida (o cada FINGERPRINT_FLUSH_INTERVAL en --watch).
+# `metro.py --fingerprint-stats` muestra la tasa.
+
+FINGERPRINT_NAMESPACE = 'metro_fingerprint'
+FINGERPRINT_STATS_KEY = '_stats'
+# Subir si cambia lo que devuelven los parsers: descarta los resultados guardados
+FINGERPRINT_VERSION = 1
+FINGERPRINT_STATS_FLAG = '--fingerprint-stats'
+# Sobre propio para --fingerprint-stats: su `data` no es la de metro v1
+FINGERPRINT_STATS_SCHEMA = 'metro.fingerprint_stats'
+FINGERPRINT_STATS_SCHEMA_VERSION = 1
+FINGERPRINT_FLUSH_INTERVAL = 10 * 60
+
+
+def _block_patterns(tag, class_):
+    """(apertura de <tag> con la clase `class_`, cualquier <tag> o </tag>) sobre bytes."""
+    opening = re.compile(
+        rb'<' + tag + rb'\b[^>]*\bclass\s*=\s*["\']?[^"\'>]*(?<![\w-])' + class_ + rb'(?![\w-])',
+        re.IGNORECASE
+    )
+    return opening, re.compile(rb'<(/?)' + tag + rb'\b[^>]*>', re.IGNORECASE)
+
+
+FINGERPRINT_BLOCKS = {
+    'metro': _block_patterns(b'div', b'card-body'),
+    'metrotren': _block_patterns(b'ul', b'linea-metrotren'),
+}
 
-        latest_message = messages[-1]
-        
-        message_text_div = latest_message.find('div', class_='tgme_widget_message_text')
-        if not message_text_div:
-            return {'error': 'No se pudo parsear el texto de la alerta', 'text': None}
-            
-        raw_text = message_text_div.get_text(separator='\n', strip=True)
-        message_text = re.sub(r'\n+', '\n', raw_text).strip()
-
-        time_tag = latest_message.find('time', class_='time')
-        message_time_str = ""
-        if time_tag and 'datetime' in time_tag.attrs:
-            try:
-                utc_time = datetime.fromisoformat(time_tag['datetime'])
-                santiago_time = utc_time.astimezone(ZoneInfo('America/Santiago'))
-                message_time_str = santiago_time.strftime('%H:%M hrs')
-            except (ValueError, KeyError):
-                pass 
-        
-        return {
-            'text': message_text.strip(),
-            'time': message_time_str,
-            'error': None
-        }
-    except requests.exceptions.RequestException as e:
-        return {'error': f'Error de conexión: {str(e)}', 'text': None}
+# Aciertos/fallos de esta corrida que aún no se suman a los acumulados
+_fingerprint_counts = {source: {'hits': 0, 'misses': 0} for source in FINGERPRINT_BLOCKS}
+_fingerprint_lock = threading.Lock()
+
+
+def extract_block(html, source):
+    """
+    El bloque que parsea `source` (div.card-body, ul.linea-metrotren) con su
+    cierre, contando aperturas y cierres de la etiqueta; None si no se ubica.
+    """
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+    opening, tags = FINGERPRINT_BLOCKS[source]
+    start = opening.search(html)
+    if not start:
+        return None
+    depth = 0
+    for tag in tags.finditer(html, start.start()):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            return html[start.start():tag.end()]
+    return None
+
+
+def parse_fingerprinted(source, html, parse):
+    """
+    `parse(html)`, salvo que el bloque de `source` sea idéntico al de la última
+    vez: entonces el resultado guardado. Solo se guardan resultados sin error.
+    """
+    block = extract_block(html, source)
+    digest = hashlib.sha256(block).hexdigest() if block is not None else None
+
+    entry, _ = result_cache.read(FINGERPRINT_NAMESPACE, source)
+    valid = isinstance(entry, dict) and entry.get('version') == FINGERPRINT_VERSION
+
+    hit = valid and digest is not None and digest == entry['digest']
+    with _fingerprint_lock:
+        _fingerprint_counts[source]['hits' if hit else 'misses'] += 1
+    with timing.span('parse.fingerprint', source=source, hit=hit):
+        result = entry['result'] if hit else parse(html)
+
+    if not hit and digest is not None and not result.get('error'):
+        result_cache.write(FINGERPRINT_NAMESPACE, source,
+                           {'version': FINGERPRINT_VERSION, 'digest': digest, 'result': result})
+    return result
+
+
+def _stored_fingerprint_stats():
+    stats, _ = result_cache.read(FINGERPRINT_NAMESPACE, FINGERPRINT_STATS_KEY)
+    if not isinstance(stats, dict) or stats.get('version') != FINGERPRINT_VERSION:
+        stats = {'version': FINGERPRINT_VERSION}
+    for source in FINGERPRINT_BLOCKS:
+        stats.setdefault(source, {'hits': 0, 'misses': 0})
+    return stats
+
+
+def flush_fingerprint_stats():
+    """Suma a los acumulados en disco los aciertos/fallos de esta corrida."""
+    with _fingerprint_lock:
+        pending = {source: dict(counts) for source, counts in _fingerprint_counts.items()}
+        for counts in _fingerprint_counts.values():
+            counts['hits'] = counts['misses'] = 0
+    if not any(counts['hits'] or counts['misses'] for counts in pending.values()):
+        return
+    # Con lock entre procesos: dos corridas que suman a la vez no se pisan
+    with result_cache.locked(FINGERPRINT_NAMESPACE, FINGERPRINT_STATS_KEY):
+        stats = _stored_fingerprint_stats()
+        for source, counts in pending.items():
+            for key, value in counts.items():
+                stats[source][key] += value
+        result_cache.write(FINGERPRINT_NAMESPACE, FINGERPRINT_STATS_KEY, stats)
+
+
+def fingerprint_stats():
+    """Aciertos y fallos acumulados por fuente: {'metro': {'hits', 'misses'}, ...}."""
+    stats = _stored_fingerprint_stats()
+    with _fingerprint_lock:
+        return {source: {key: stats[source][key] + counts[key] for key in ('hits', 'misses')}
+                for source, counts in _fingerprint_counts.items()}
+
+
+def format_fingerprint_stats(stats):
+    lines = ["🧮 *Huellas de metro.py* (bloque sin cambios = sin parsear)"]
+    for source, counts in stats.items():
+        total = counts['hits'] + counts['misses']
+        rate = f"{100 * counts['hits'] / total:.0f}%" if total else '-'
+        lines.append(f"- {source}: {counts['hits']} aciertos, {counts['misses']} fallos ({rate})")
+    return "\n".join(lines)
+
+
+METRO_CL_URL = 'https://www.metro.cl/el-viaje/estado-red'
 
 def get_metro_cl_status():
     """Extrae el estado general de cada línea desde metro.cl."""
-    url = 'https://www.metro.cl/el-viaje/estado-red'
     try:
-        page = requests.get(url, timeout=REQUEST_TIMEOUT)
-        page.raise_for_status()
-        soup = BeautifulSoup(page.content, 'html.parser')
+        return http_client.get_parsed(METRO_CL_URL,
+                                      lambda r: parse_fingerprinted('metro', r.content, parse_metro_cl_status),
+                                      key='metro-cl-v1', ttl=0)
+    except requests.exceptions.RequestException as e:
+        return {'error': f'Error de conexión: {str(e)}', 'lines': [], 'all_operational': None}
 
-        lines_data = []
-        lines_with_problems = []
-        
-        card_body = soup.find('div', class_='card-body')
-        if not card_body:
-            return {'error': 'No se encontró el contenedor principal', 'lines': [], 'all_operational': None}
+def parse_metro_cl_status(html):
+    """Parsea la página de estado de red de metro.cl."""
+    soup = parse_subtree(html, 'div.card-body')
 
-        line_rows = card_body.find_all('div', class_='padding-bottom-30')
-        if not line_rows:
-            return {'error': 'No se encontraron líneas', 'lines': [], 'all_operational': None}
+    lines_data = []
+    lines_with_problems = []
+    
+    card_body = soup.find('div', class_='card-body')
+    if not card_body:
+        return {'error': 'No se encontró el contenedor principal', 'lines': [], 'all_operational': None}
 
-        for row in line_rows:
-            line_info_col = row.find('div', class_='col-md-4')
-            alerts_col = row.find('div', class_='col-md-8')
+    line_rows = card_body.find_all('div', class_='padding-bottom-30')
+    if not line_rows:
+        return {'error': 'No se encontraron líneas', 'lines': [], 'all_operational': None}
 
-            if not line_info_col or not alerts_col:
-                continue
+    for row in line_rows:
+        line_info_col = row.find('div', class_='col-md-4')
+        alerts_col = row.find('div', class_='col-md-8')
 
-            line_name = "Línea Desconocida"
-            line_img = line_info_col.find('img', src=re.compile(r'ico-l[0-9a-z]+\.svg'))
-            if line_img and 'src' in line_img.attrs:
-                icon_file = line_img['src'].split('/')[-1]
-                if icon_file in LINE_ICONS:
-                    line_name = LINE_ICONS[icon_file]
+        if not line_info_col or not alerts_col:
+            continue
 
-            color = COLORS.get(line_name, '⚪️')
+        line_name = "Línea Desconocida"
+        line_img = line_info_col.find('img', src=re.compile(r'ico-l[0-9a-z]+\.svg'))
+        if line_img and 'src' in line_img.attrs:
+            icon_file = line_img['src'].split('/')[-1]
+            if icon_file in LINE_ICONS:
+                line_name = LINE_ICONS[icon_file]
 
-            status_text_tag = line_info_col.find('p', class_='h4')
-            status_text = " ".join(status_text_tag.get_text(separator=' ').split()) if status_text_tag else "Estado no encontrado"
+        color = COLORS.get(line_name, '⚪️')
 
-            problem_list_items = alerts_col.find_all('li')
-            problems = [unidecode(item.get_text(strip=True)) for item in problem_list_items if item.get_text(strip=True)]
-            
-            has_problems = len(problems) > 0
-            
-            if has_problems:
-                lines_with_problems.append(line_name)
-            
-            # Mantener emoji original, solo aplicar unidecode al nombre para comparación
-            lines_data.append({
-                'name': line_name,
-                'name_clean': unidecode(line_name),
-                'color': color,
-                'status': status_text,
-                'has_problems': has_problems,
-                'problems': problems
-            })
+        status_text_tag = line_info_col.find('p', class_='h4')
+        status_text = " ".join(status_text_tag.get_text(separator=' ').split()) if status_text_tag else "Estado no encontrado"
+
+        problem_list_items = alerts_col.find_all('li')
+        problems = [unidecode(item.get_text(strip=True)) for item in problem_list_items if item.get_text(strip=True)]
         
-        return {
-            'error': None,
-            'lines': lines_data,
-            'all_operational': len(lines_with_problems) == 0,
-            'lines_with_problems': [unidecode(name) for name in lines_with_problems]
-        }
+        has_problems = len(problems) > 0
+        
+        if has_problems:
+            lines_with_problems.append(line_name)
+        
+        # Mantener emoji original, solo aplicar unidecode al nombre para comparación
+        lines_data.append({
+            'name': line_name,
+            'name_clean': unidecode(line_name),
+            'color': color,
+            'status': status_text,
+            'has_problems': has_problems,
+            'problems': problems
+        })
+    
+    return {
+        'error': None,
+        'lines': lines_data,
+        'all_operational': len(lines_with_problems) == 0,
+        'lines_with_problems': [unidecode(name) for name in lines_with_problems]
+    }
 
-    except requests.exceptions.RequestException as e:
-        return {'error': f'Error de conexión: {str(e)}', 'lines': [], 'all_operational': None}
+METROTREN_URL = 'https://www.red.cl/mapas-y-horarios/metrotren/'
 
 def get_metrotren_status():
     """Extrae el estado del Metrotren Nos desde red.cl."""
-    url = 'https://www.red.cl/mapas-y-horarios/metrotren/'
-    
+    try:
+        return http_client.get_parsed(METROTREN_URL,
+                                      lambda r: parse_fingerprinted('metrotren', r.content, parse_metrotren_status),
+                                      key='metrotren-v1', ttl=0)
+    except requests.exceptions.RequestException as e:
+        return {'error': f'Error de conexión: {str(e)}', 'all_operational': None, 'problems': []}
+
+def parse_metrotren_status(html):
+    """Parsea la lista de estaciones del Metrotren Nos de red.cl."""
     STATUS_MAP = {
         'cerrada-temporalmente': 'Cerrada temporalmente',
         'no-habilitada': 'No habilitada'
     }
 
-    try:
-        page = requests.get(url, timeout=REQUEST_TIMEOUT)
-        page.raise_for_status()
-        soup = BeautifulSoup(page.content, 'html.parser')
+    soup = parse_subtree(html, 'ul.linea-metrotren')
 
-        problem_stations = []
+    problem_stations = []
 
-        line_ul = soup.find('ul', class_='linea-metrotren')
-        if not line_ul:
-            return {'error': 'No se encontró la lista de estaciones', 'all_operational': None, 'problems': []}
+    line_ul = soup.find('ul', class_='linea-metrotren')
+    if not line_ul:
+        return {'error': 'No se encontró la lista de estaciones', 'all_operational': None, 'problems': []}
 
-        stations = line_ul.find_all('li')
-        if not stations:
-            return {'error': 'No se encontraron estaciones', 'all_operational': None, 'problems': []}
+    stations = line_ul.find_all('li')
+    if not stations:
+        return {'error': 'No se encontraron estaciones', 'all_operational': None, 'problems': []}
 
-        for station in stations:
-            station_classes = station.get('class', [])
+    for station in stations:
+        station_classes = station.get('class', [])
+        
+        if 'operativa' not in station_classes:
+            name_tag = station.find('a')
+            station_name = name_tag.text.strip() if name_tag else "Estación desconocida"
             
-            if 'operativa' not in station_classes:
-                name_tag = station.find('a')
-                station_name = name_tag.text.strip() if name_tag else "Estación desconocida"
-                
-                status_text = "Estado desconocido"
-                for class_name, status_desc in STATUS_MAP.items():
-                    if class_name in station_classes:
-                        status_text = status_desc
-                        break
-                
-                problem_stations.append({
-                    'name': station_name,
-                    'status': status_text
-                })
-
-        return {
-            'error': None,
-            'all_operational': len(problem_stations) == 0,
-            'problems': problem_stations
-        }
+            status_text = "Estado desconocido"
+            for class_name, status_desc in STATUS_MAP.items():
+                if class_name in station_classes:
+                    status_text = status_desc
+                    break
+            
+            problem_stations.append({
+                'name': station_name,
+                'status': status_text
+            })
 
-    except requests.exceptions.RequestException as e:
-        return {'error': f'Error de conexión: {str(e)}', 'all_operational': None, 'problems': []}
+    return {
+        'error': None,
+        'all_operational': len(problem_stations) == 0,
+        'problems': problem_stations
+    }
 
 
 # --- FORMATEO DE OUTPUT ---
 
-def format_text_output(telegram_data, metro_data, metrotren_data):
+def _format_age(seconds):
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes} min"
+    if minutes < 48 * 60:
+        return f"{minutes // 60} h"
+    return f"{minutes // (24 * 60)} días"
+
+
+def format_text_output(telegram_data, metro_data, metrotren_data, advice=None):
     """Formatea la salida como texto legible para WhatsApp."""
     lines = ["🚇 *Estado del Transporte* 🚇\n"]
     
@@ -214,6 +348,10 @@ def format_text_output(telegram_data, metro_data, metrotren_data):
         time_str = f" ({telegram_data['time']})" if telegram_data['time'] else ""
         lines.append(f"--- 📢 *Última Alerta de Telegram*{time_str} ---")
         lines.append(f"_{telegram_data['text']}_\n")
+        if telegram_data.get('stale'):
+            age = telegram_data.get('age_s')
+            age_str = f", publicada hace {_format_age(age)}" if age is not None else ""
+            lines.append(f"⚠️ No se pudo actualizar el canal ({telegram_data['error']}): es la última alerta guardada{age_str}.\n")
     elif telegram_data['error']:
         lines.append(f"--- 📢 *Telegram* ---")
         lines.append(f"⚠️ {telegram_data['error']}\n")
@@ -246,52 +384,229 @@ def format_text_output(telegram_data, metro_data, metrotren_data):
             lines.append('⚠️ Servicio con problemas:')
             for problem in metrotren_data['problems']:
                 lines.append(f"  - {unidecode(problem['name'])} ({problem['status']})")
+
+    # Rutas alternativas (metro_routes)
+    if advice:
+        lines.append("\n--- 💡 *Rutas alternativas* ---")
+        lines.extend(advice)
     
     return "\n".join(lines)
 
 
+# Fuentes del estado. metro.cl y red.cl piden con If-None-Match/If-Modified-Since
+# (get_parsed con ttl=0): un 304 reutiliza el resultado ya parseado; Telegram
+# solo baja los mensajes posteriores al último visto (telegram_alerts)
+SOURCES = {
+    'telegram': get_latest_telegram_alert,
+    'metro': get_metro_cl_status,
+    'metrotren': get_metrotren_status,
+}
+
+
+def obtener_estado():
+    """Consulta las tres fuentes en paralelo: {'telegram', 'metro', 'metrotren'}."""
+    # MEJORA: Ejecutar consultas en paralelo para reducir tiempo de espera
+    with ThreadPoolExecutor(max_workers=len(SOURCES)) as executor:
+        futures = {source: executor.submit(fetch) for source, fetch in SOURCES.items()}
+        return {source: future.result() for source, future in futures.items()}
+
+
+def format_estado(data):
+    return format_text_output(data['telegram'], data['metro'], data['metrotren'], data.get('advice'))
+
+
+def add_advice(data):
+    """Agrega data['advice']: rutas que evitan lo cerrado, calculadas localmente (metro_routes)."""
+    data['advice'] = []
+    if data['metro'].get('all_operational') is False or data['metrotren'].get('all_operational') is False:
+        try:
+            import metro_routes
+
+            data['advice'] = metro_routes.advice(data['metro'], data['metrotren'])
+        except Exception:
+            pass
+    return data
+
+
+def history_lines(source, result):
+    """Estado por línea de un resultado válido, en el formato de metro_history.record."""
+    if source == 'metro':
+        return {
+            line['name']: {'ok': not line['has_problems'], 'status': line['status'], 'problems': line['problems']}
+            for line in result['lines']
+        }
+    if source == 'metrotren':
+        import metro_history
+
+        return {metro_history.METROTREN_LINE: {
+            'ok': result['all_operational'],
+            'status': 'Operativo' if result['all_operational'] else 'Con problemas',
+            'problems': [f"{unidecode(p['name'])} ({p['status']})" for p in result['problems']],
+        }}
+    return {}
+
+
+def record_history(results):
+    """Agrega al historial (metro_history) las fuentes que respondieron bien."""
+    lines = {}
+    for source, result in results.items():
+        if not result.get('error'):
+            lines.update(history_lines(source, result))
+    if lines:
+        import metro_history
+
+        metro_history.record(lines)
+
+
+# --- MODO --watch ---
+#
+# Proceso residente: consulta cada fuente con su propio intervalo y escribe
+# un registro JSON por línea solo cuando algo cambia:
+#
+#   {"type": "snapshot", "at": ..., "data": {...}, "text": "..."}   al partir
+#   {"type": "change", "at": ..., "changes": [...], "data": {...}, "text": "..."}
+#
+# `changes` trae un elemento por cambio:
+#   {"kind": "line", "line": "Línea 1", "before": {"status", "problems"} | null, "after": ...}
+#   {"kind": "station", "station": "...", "before": "Cerrada temporalmente" | null, "after": ...}
+#     (null = estación operativa)
+#   {"kind": "telegram", "alert": {"text", "time"}}      nuevo mensaje en el canal
+#   {"kind": "source", "source": "metro", "error": "..." | null}   la fuente empezó/dejó de fallar
+# `data` y `text` son el estado completo (como en --json) después del cambio.
+# Si una fuente falla se mantiene su último estado válido: un error de red
+# no se informa como cambio de líneas.
+
+WATCH_FLAG = '--watch'
+# Segundos entre consultas de cada fuente
+WATCH_INTERVALS = {
+    'telegram': 60,
+    'metro': 90,
+    'metrotren': 180,
+}
+
+# Resultado de una fuente que no respondió (misma forma que sus errores)
+_EMPTY_RESULTS = {
+    'telegram': {'text': None},
+    'metro': {'lines': [], 'all_operational': None},
+    'metrotren': {'all_operational': None, 'problems': []},
+}
+
+
+def _poll(source):
+    try:
+        return SOURCES[source]()
+    except Exception as e:
+        return dict(_EMPTY_RESULTS[source], error=f'Error inesperado: {str(e)[:100]}')
+
+
+def source_state(source, result):
+    """La parte comparable del resultado de una fuente."""
+    if source == 'metro':
+        return {line['name']: {'status': line['status'], 'problems': line['problems']}
+                for line in result['lines']}
+    if source == 'metrotren':
+        return {station['name']: station['status'] for station in result['problems']}
+    return {'text': result['text'], 'time': result.get('time', '')}
+
+
+def diff_states(source, before, after):
+    """Cambios entre dos estados de `source` (ver el formato arriba)."""
+    if before == after:
+        return []
+    if source == 'metro':
+        names = list(after) + [name for name in before if name not in after]
+        return [{'kind': 'line', 'line': name, 'before': before.get(name), 'after': after.get(name)}
+                for name in names if before.get(name) != after.get(name)]
+    if source == 'metrotren':
+        names = list(after) + [name for name in before if name not in after]
+        return [{'kind': 'station', 'station': name, 'before': before.get(name), 'after': after.get(name)}
+                for name in names if before.get(name) != after.get(name)]
+    return [{'kind': 'telegram', 'alert': after}]
+
+
+def _emit_event(record):
+    record['at'] = datetime.now(script_output.ZONA_CL).isoformat(timespec='seconds')
+    print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+
+def watch(intervals=None):
+    """Bucle del modo --watch; no retorna."""
+    intervals = intervals or WATCH_INTERVALS
+    data = {}      # último resultado por fuente (el último válido si hubo uno)
+    states = {}    # estado comparable del último resultado válido
+    errors = {}    # error actual por fuente (None = ok)
+    due = {source: 0.0 for source in SOURCES}
+    started = False
+    flushed_at = time.monotonic()
+
+    while True:
+        now = time.monotonic()
+        ready = [source for source, at in due.items() if at <= now]
+        if not ready:
+            time.sleep(min(due.values()) - now)
+            continue
+
+        with ThreadPoolExecutor(max_workers=len(ready)) as executor:
+            results = dict(zip(ready, executor.map(_poll, ready)))
+        record_history(results)
+        if time.monotonic() - flushed_at >= FINGERPRINT_FLUSH_INTERVAL:
+            flush_fingerprint_stats()
+            flushed_at = time.monotonic()
+
+        changes = []
+        for source, result in results.items():
+            due[source] = time.monotonic() + intervals[source]
+            error = result.get('error')
+            if started and bool(error) != bool(errors.get(source)):
+                changes.append({'kind': 'source', 'source': source, 'error': error})
+            errors[source] = error
+            if error:
+                data.setdefault(source, result)
+                continue
+            state = source_state(source, result)
+            if started and source in states:
+                changes.extend(diff_states(source, states[source], state))
+            states[source] = state
+            data[source] = result
+
+        if not started:
+            started = True
+            add_advice(data)
+            _emit_event({'type': 'snapshot', 'data': data, 'text': format_estado(data)})
+        elif changes:
+            add_advice(data)
+            _emit_event({'type': 'change', 'changes': changes, 'data': data, 'text': format_estado(data)})
+
+
 def main():
     """Función principal."""
-    # Verificar si se pide output JSON
-    json_output = '--json' in sys.argv
+    # --json: sobre versionado (script_output) para procesamiento programático
+    json_output, args = script_output.parse_argv()
+
+    if FINGERPRINT_STATS_FLAG in args:
+        script_output.emit(FINGERPRINT_STATS_SCHEMA, FINGERPRINT_STATS_SCHEMA_VERSION, fingerprint_stats(),
+                           format_fingerprint_stats, json_output)
+        sys.exit(0)
+
+    if WATCH_FLAG in args:
+        try:
+            watch()
+        except (KeyboardInterrupt, BrokenPipeError):
+            pass
+        flush_fingerprint_stats()
+        sys.exit(0)
     
     try:
-        # MEJORA: Ejecutar consultas en paralelo para reducir tiempo de espera
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            future_telegram = executor.submit(get_latest_telegram_alert)
-            future_metro = executor.submit(get_metro_cl_status)
-            future_metrotren = executor.submit(get_metrotren_status)
-
-            telegram_data = future_telegram.result()
-            metro_data = future_metro.result()
-            metrotren_data = future_metrotren.result()
-        
-        if json_output:
-            # Output JSON para procesamiento programático
-            output = {
-                'success': True,
-                'telegram': telegram_data,
-                'metro': metro_data,
-                'metrotren': metrotren_data
-            }
-            print(json.dumps(output, ensure_ascii=False, indent=2))
-        else:
-            # Output de texto formateado para WhatsApp
-            text = format_text_output(telegram_data, metro_data, metrotren_data)
-            print(text)
-        
-        sys.exit(0)
-        
+        with timing.span('fetch'):
+            data = obtener_estado()
+        record_history(data)
+        flush_fingerprint_stats()
+        add_advice(data)
     except Exception as e:
-        if json_output:
-            error_output = {
-                'success': False,
-                'error': str(e)
-            }
-            print(json.dumps(error_output, ensure_ascii=False))
-        else:
-            print(f"❌ Error inesperado: {str(e)}")
-        sys.exit(1)
+        script_output.fail('metro', SCHEMA_VERSION, f"❌ Error inesperado: {str(e)}", json_output)
+
+    script_output.emit('metro', SCHEMA_VERSION, data, format_estado, json_output)
+    sys.exit(0)
 
 
 if __name__ == '__main__':
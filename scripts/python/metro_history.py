@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+metro_history.py
+Historial local del estado de las líneas de Metro y del Metrotren Nos, en
+SQLite, para responder sin volver a scrapear cuánto lleva caída una línea,
+cuántos incidentes tuvo o su disponibilidad en un período.
+
+metro.py registra cada resultado válido de metro.cl y red.cl, pero solo se
+guarda una fila cuando el estado de una línea cambia (no una por consulta):
+- changes: (line, at, ok, status, problems) con índices por línea y por fecha;
+  ok = 0 si la línea tiene problemas. El Metrotren Nos es la línea
+  'Metrotren Nos' y sus problemas son las estaciones no operativas;
+- lines: la última vez que se consultó cada línea (checked_at). La
+  disponibilidad solo cuenta el tiempo hasta esa consulta: lo que pasó
+  mientras nadie consultaba no se conoce.
+
+Como ct_store, los errores de disco no se propagan: sin base, metro.py
+funciona igual.
+
+Uso como módulo:
+    import metro_history
+
+    metro_history.record({'Línea 1': {'ok': False, 'status': '...', 'problems': [...]}})
+    metro_history.current()                        # estado actual y desde cuándo
+    metro_history.incidents(since, line='Línea 1')   # períodos con problemas
+    metro_history.uptime(since)                    # {línea: {'uptime', 'down_s', ...}}
+
+CLI:
+    python metro_history.py estado
+    python metro_history.py incidentes [--linea=L1] [--dias=30] [--json]
+    python metro_history.py uptime [--linea=L4a] [--dias=7] [--json]
+"""
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import script_output
+
+REPO_DIR = Path(__file__).resolve().parent.parent.parent
+DB_PATH = Path(os.getenv('METRO_HISTORY_PATH', str(REPO_DIR / 'temp' / 'metro_history.db')))
+BUSY_TIMEOUT = 5
+
+SCHEMA_VERSION = 1
+DEFAULT_DAYS = 30
+
+METROTREN_LINE = 'Metrotren Nos'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY,
+    line TEXT NOT NULL,
+    at REAL NOT NULL,
+    ok INTEGER NOT NULL,
+    status TEXT,
+    problems TEXT
+);
+CREATE INDEX IF NOT EXISTS changes_line_at ON changes (line, at);
+CREATE INDEX IF NOT EXISTS changes_at ON changes (at);
+CREATE TABLE IF NOT EXISTS lines (
+    line TEXT PRIMARY KEY,
+    checked_at REAL NOT NULL
+);
+"""
+
+
+def _connect():
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(DB_PATH), timeout=BUSY_TIMEOUT)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _latest(conn, line, before=None):
+    """Última fila de `line` (anterior a `before`, si se indica) o None."""
+    if before is None:
+        return conn.execute(
+            'SELECT at, ok, status, problems FROM changes WHERE line = ? ORDER BY at DESC LIMIT 1', (line,)
+        ).fetchone()
+    return conn.execute(
+        'SELECT at, ok, status, problems FROM changes WHERE line = ? AND at < ? ORDER BY at DESC LIMIT 1',
+        (line, before)
+    ).fetchone()
+
+
+def record(lines, at=None):
+    """
+    Registra el estado de las líneas consultadas: {línea: {'ok', 'status',
+    'problems'}}. Solo agrega una fila por línea cuyo estado cambió respecto
+    de la última guardada. Devuelve cuántas filas agregó (None si no se pudo
+    escribir).
+    """
+    at = time.time() if at is None else at
+    added = 0
+    try:
+        conn = _connect()
+        try:
+            with conn:
+                for line, state in lines.items():
+                    row = (int(bool(state['ok'])), state.get('status'),
+                           json.dumps(state.get('problems') or [], ensure_ascii=False))
+                    last = _latest(conn, line)
+                    if last is None or tuple(last[1:]) != row:
+                        conn.execute(
+                            'INSERT INTO changes (line, at, ok, status, problems) VALUES (?, ?, ?, ?, ?)',
+                            (line, at) + row
+                        )
+                        added += 1
+                    conn.execute(
+                        'INSERT INTO lines (line, checked_at) VALUES (?, ?) '
+                        'ON CONFLICT(line) DO UPDATE SET checked_at = MAX(checked_at, excluded.checked_at)',
+                        (line, at)
+                    )
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError):
+        return None
+    return added
+
+
+def _line_names(conn, line=None):
+    if line is not None:
+        return [line]
+    return [row[0] for row in conn.execute('SELECT line FROM lines ORDER BY line')]
+
+
+def current(line=None, now=None):
+    """
+    Estado actual por línea: [{'line', 'ok', 'status', 'problems', 'since',
+    'duration_s', 'checked_at'}]. `since` es desde cuándo la línea está como
+    está (para una con problemas, el inicio de la falla, aunque después haya
+    cambiado el detalle).
+    """
+    now = time.time() if now is None else now
+    result = []
+    try:
+        conn = _connect()
+        try:
+            for name in _line_names(conn, line):
+                last = _latest(conn, name)
+                if last is None:
+                    continue
+                at, ok, status, problems = last
+                # Inicio de la racha: primera fila después del último cambio de ok
+                since = conn.execute(
+                    'SELECT MIN(at) FROM changes WHERE line = ? AND at > '
+                    'COALESCE((SELECT MAX(at) FROM changes WHERE line = ? AND ok != ?), -1)',
+                    (name, name, ok)
+                ).fetchone()[0]
+                checked_at = conn.execute('SELECT checked_at FROM lines WHERE line = ?', (name,)).fetchone()
+                result.append({
+                    'line': name, 'ok': bool(ok), 'status': status, 'problems': json.loads(problems or '[]'),
+                    'since': since, 'duration_s': round(now - since),
+                    'checked_at': checked_at[0] if checked_at else at,
+                })
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError):
+        return []
+    return result
+
+
+def _timeline(conn, line, since, until):
+    """
+    Tramos (inicio, fin, fila) del estado de `line` dentro de [since, until),
+    cortados en la última consulta registrada.
+    """
+    checked = conn.execute('SELECT checked_at FROM lines WHERE line = ?', (line,)).fetchone()
+    end = min(until, checked[0]) if checked else until
+    rows = conn.execute(
+        'SELECT at, ok, status, problems FROM changes WHERE line = ? AND at >= ? AND at < ? ORDER BY at',
+        (line, since, end)
+    ).fetchall()
+    previous = _latest(conn, line, before=since)
+    if previous is not None:
+        rows.insert(0, (since,) + tuple(previous[1:]))
+
+    spans = []
+    for i, row in enumerate(rows):
+        stop = rows[i + 1][0] if i + 1 < len(rows) else end
+        if stop > row[0]:
+            spans.append((row[0], stop, row))
+    return spans
+
+
+def incidents(since, until=None, line=None):
+    """
+    Períodos con problemas que se cruzan con [since, until):
+    [{'line', 'start', 'end', 'statuses', 'problems'}] ordenados por inicio;
+    'end' es None si sigue abierto. start/end se recortan a la ventana.
+    """
+    until = time.time() if until is None else until
+    found = []
+    try:
+        conn = _connect()
+        try:
+            for name in _line_names(conn, line):
+                incident = None
+                for start, stop, (_, ok, status, problems) in _timeline(conn, name, since, until):
+                    if ok:
+                        incident = None
+                        continue
+                    if incident is None:
+                        incident = {'line': name, 'start': start, 'end': None, 'statuses': [], 'problems': []}
+                        found.append(incident)
+                    incident['end'] = stop
+                    if status not in incident['statuses']:
+                        incident['statuses'].append(status)
+                    for problem in json.loads(problems or '[]'):
+                        if problem not in incident['problems']:
+                            incident['problems'].append(problem)
+                # Sin una fila ok después, la falla sigue abierta
+                last = _latest(conn, name)
+                if incident is not None and last is not None and not last[1] and last[0] < until:
+                    incident['end'] = None
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError):
+        return []
+    return sorted(found, key=lambda incident: incident['start'])
+
+
+def uptime(since, until=None, line=None):
+    """
+    Disponibilidad por línea en [since, until): {línea: {'uptime' (0-1 o
+    None sin datos), 'down_s', 'covered_s', 'incidents'}}. Solo cuenta el
+    tiempo cubierto por el historial.
+    """
+    until = time.time() if until is None else until
+    summary = {}
+    try:
+        conn = _connect()
+        try:
+            for name in _line_names(conn, line):
+                covered = down = 0.0
+                count = 0
+                was_ok = True
+                for start, stop, (_, ok, _status, _problems) in _timeline(conn, name, since, until):
+                    covered += stop - start
+                    if not ok:
+                        down += stop - start
+                        count += was_ok
+                    was_ok = bool(ok)
+                summary[name] = {
+                    'uptime': round(1 - down / covered, 4) if covered else None,
+                    'down_s': round(down), 'covered_s': round(covered), 'incidents': count,
+                }
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError):
+        return {}
+    return summary
+
+
+# --- CLI ---
+
+def resolve_line(arg):
+    """'L1', '4a', 'linea 5', 'metrotren'... -> nombre guardado ('Línea 1', 'Metrotren Nos')."""
+    text = arg.strip().lower()
+    if 'metrotren' in text or text == 'nos':
+        return METROTREN_LINE
+    match = re.fullmatch(r'(?:l|l[ií]nea\s*)?(\d[a-z]?)', text)
+    return f'Línea {match.group(1)}' if match else arg
+
+
+def _duration(seconds):
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f'{minutes} min'
+    hours, minutes = divmod(minutes, 60)
+    if hours < 48:
+        return f'{hours} h {minutes} min'
+    return f'{hours // 24} días {hours % 24} h'
+
+
+def _when(epoch):
+    return datetime.fromtimestamp(epoch, script_output.ZONA_CL).strftime('%d-%m %H:%M')
+
+
+def format_estado(data):
+    if not data:
+        return '📭 Aún no hay historial del Metro.'
+    lines = ['🚇 *Estado según el historial*']
+    for item in data:
+        if item['ok']:
+            lines.append(f"✅ *{item['line']}:* normal hace {_duration(item['duration_s'])}")
+        else:
+            lines.append(f"⚠️ *{item['line']}:* {item['status']} hace {_duration(item['duration_s'])} "
+                         f"(desde {_when(item['since'])})")
+            lines.extend(f"  - {problem}" for problem in item['problems'])
+    return '\n'.join(lines)
+
+
+def format_incidentes(data):
+    if not data['incidents']:
+        return f"✅ Sin incidentes en los últimos {data['days']} días."
+    lines = [f"📋 *Incidentes de los últimos {data['days']} días* ({len(data['incidents'])})"]
+    for incident in data['incidents']:
+        end = 'sigue' if incident['end'] is None else _duration(incident['end'] - incident['start'])
+        lines.append(f"- *{incident['line']}* {_when(incident['start'])} ({end}): "
+                     f"{', '.join(s for s in incident['statuses'] if s)}")
+    return '\n'.join(lines)
+
+
+def format_uptime(data):
+    if not data['lines']:
+        return '📭 Aún no hay historial del Metro.'
+    lines = [f"📊 *Disponibilidad, últimos {data['days']} días*"]
+    for name, item in data['lines'].items():
+        if item['uptime'] is None:
+            lines.append(f"- *{name}:* sin datos")
+            continue
+        plural = '' if item['incidents'] == 1 else 's'
+        lines.append(f"- *{name}:* {item['uptime'] * 100:.2f}% · {item['incidents']} incidente{plural} · "
+                     f"{_duration(item['down_s'])} con problemas")
+    return '\n'.join(lines)
+
+
+COMMANDS = {
+    'estado': format_estado,
+    'incidentes': format_incidentes,
+    'uptime': format_uptime,
+}
+
+
+def main():
+    json_mode, args = script_output.parse_argv()
+    line = next((resolve_line(a.split('=', 1)[1]) for a in args if a.startswith('--linea=')), None)
+    days = next((a.split('=', 1)[1] for a in args if a.startswith('--dias=')), str(DEFAULT_DAYS))
+    args = [a for a in args if not a.startswith(('--linea=', '--dias='))]
+    command = args[0] if args else 'estado'
+
+    if command not in COMMANDS or len(args) > 1 or not days.isdigit():
+        script_output.fail('metro_history', SCHEMA_VERSION,
+                           f"Uso: python metro_history.py [{'|'.join(COMMANDS)}] [--linea=L1] [--dias=N]",
+                           json_mode, file=sys.stderr)
+
+    days = int(days)
+    since = time.time() - days * 24 * 60 * 60
+    if command == 'estado':
+        data = current(line)
+    elif command == 'incidentes':
+        data = {'days': days, 'line': line, 'incidents': incidents(since, line=line)}
+    else:
+        data = {'days': days, 'line': line, 'lines': uptime(since, line=line)}
+
+    script_output.emit('metro_history', SCHEMA_VERSION, data, COMMANDS[command], json_mode)
+
+
+if __name__ == '__main__':
+    main()
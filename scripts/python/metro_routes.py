@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""
+metro_routes.py
+Rutas alternativas en la red de Metro (L1 a L6, L4a) y el Metrotren Nos,
+calculadas localmente cuando metro.py informa líneas o estaciones cerradas.
+
+La red está en data/metro_network.json: estaciones en orden por línea,
+minutos aproximados entre estaciones (hop_min), costo de combinación
+(transfer_min), combinaciones entre estaciones con otro nombre (Estación
+Central <-> Alameda) y alias con que metro.cl nombra algunas estaciones.
+
+Cada nodo del grafo es una estación en una línea ('L1:Baquedano'). Con la red
+completa se precalcula una tabla de todos los pares (distancia y nodo
+anterior, Dijkstra desde cada nodo) que queda en temp/cache/metro_routes.json
+y solo se rehace si cambia el archivo de la red. Con cierres:
+- una ruta de la tabla que no pasa por nada cerrado sigue siendo la mejor
+  (cerrar nodos solo puede alargar las demás) y se usa tal cual;
+- si pasa por un cierre, se recalcula solo la fila de ese origen con los
+  cierres aplicados y queda en memoria para ese conjunto de cierres
+  (en worker.py, entre comandos).
+
+Cierres que se reconocen en el texto de metro.cl y red.cl:
+- estación cerrada: los trenes pasan sin detenerse (no se puede subir,
+  bajar ni combinar ahí);
+- tramo sin servicio ('suspendido entre X y Y') o servicio solo en un tramo
+  ('opera entre X y Y'): por las estaciones sin servicio no pasan trenes;
+- línea suspendida, sin estaciones mencionadas: toda la línea sin servicio.
+Los retrasos no cambian las rutas.
+
+Uso:
+    import metro_routes
+    consejos = metro_routes.advice(datos['metro'], datos['metrotren'])   # [texto, ...]
+
+CLI:
+    python metro_routes.py "Los Héroes" "Tobalaba" [--sin=L1,Baquedano]
+"""
+import hashlib
+import heapq
+import json
+import re
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from unidecode import unidecode
+
+from result_cache import CACHE_DIR, atomic_write
+
+DATA_FILE = Path(__file__).resolve().parent / 'data' / 'metro_network.json'
+TABLE_FILE = CACHE_DIR / 'metro_routes.json'
+# Subir si cambia la forma de la tabla
+TABLE_VERSION = 1
+# Conjuntos de cierres distintos que se recuerdan en memoria
+CLOSURE_MEMO = 8
+
+_CLOSURE_RE = re.compile(r'cerrad|cierre|suspend|interrump|sin servicio|no se detiene|no habilitad')
+_LINE_DOWN_RE = re.compile(r'suspend|interrump|sin servicio')
+_DELAY_RE = re.compile(r'retras|demora|lent[oa]')
+_ONLY_BETWEEN_RE = re.compile(r'\b(?:opera|operando|funciona|habilitad[oa]|disponible|solo)\b')
+
+_lock = threading.Lock()
+_router = None
+
+
+def _normalize(text):
+    return re.sub(r"[^a-z0-9 ]", '', unidecode(text or '').lower().replace('-', ' '))
+
+
+class Closures:
+    """Nodos sin servicio (no pasan trenes) y sin detención (pasan sin parar)."""
+
+    def __init__(self, no_service=(), no_stop=()):
+        self.no_service = frozenset(no_service)
+        self.no_stop = frozenset(no_stop) - self.no_service
+        self.key = (self.no_service, self.no_stop)
+
+    def __bool__(self):
+        return bool(self.no_service or self.no_stop)
+
+    def can_stop(self, node):
+        return node not in self.no_service and node not in self.no_stop
+
+
+class Network:
+    """Grafo de la red a partir de data/metro_network.json."""
+
+    def __init__(self, data):
+        self.lines = data['lines']
+        self.nodes = []
+        self.index = {}
+        self.stations = {}       # nombre normalizado -> [nodos]
+        for code, line in self.lines.items():
+            for station in line['stations']:
+                self.index[(code, station)] = len(self.nodes)
+                self.nodes.append((code, station))
+                self.stations.setdefault(_normalize(station), []).append(self.index[(code, station)])
+
+        # adj[nodo] = [(vecino, minutos, es_combinación)]
+        self.adj = [[] for _ in self.nodes]
+        for code, line in self.lines.items():
+            ids = [self.index[(code, station)] for station in line['stations']]
+            for a, b in zip(ids, ids[1:]):
+                self.adj[a].append((b, line['hop_min'], False))
+                self.adj[b].append((a, line['hop_min'], False))
+        for same in self.stations.values():
+            for a in same:
+                self.adj[a].extend((b, data['transfer_min'], True) for b in same if b != a)
+        for transfer in data.get('transfers', []):
+            a, b = self.index[tuple(transfer['from'])], self.index[tuple(transfer['to'])]
+            self.adj[a].append((b, transfer['min'], True))
+            self.adj[b].append((a, transfer['min'], True))
+
+        self.by_name = {_normalize(line['name']): code for code, line in self.lines.items()}
+        self.patterns = {code: self._station_patterns(line['stations'], data.get('aliases', {}))
+                         for code, line in self.lines.items()}
+
+    @staticmethod
+    def _station_patterns(stations, aliases):
+        names = [(_normalize(name), station) for station in stations
+                 for name in [station] + aliases.get(station, [])]
+        names.sort(key=lambda item: -len(item[0]))
+        return [(re.compile(r'(?<![a-z0-9])' + re.escape(name) + r'(?![a-z0-9])'), station)
+                for name, station in names]
+
+    def label(self, code):
+        return self.lines[code].get('label', code)
+
+    def find_stations(self, code, text):
+        """Estaciones de la línea `code` mencionadas en `text`, en el orden de la línea."""
+        text = _normalize(text)
+        found = set()
+        for regex, station in self.patterns[code]:
+            if regex.search(text):
+                found.add(station)
+                text = regex.sub(' ', text)
+        return [station for station in self.lines[code]['stations'] if station in found]
+
+    def station_nodes(self, name):
+        return self.stations.get(_normalize(name), [])
+
+
+def dijkstra(network, source, closures=None):
+    """(distancias, anteriores) desde `source` evitando los cierres."""
+    n = len(network.nodes)
+    dist = [None] * n
+    prev = [-1] * n
+    dist[source] = 0
+    heap = [(0, source)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        for neighbor, minutes, transfer in network.adj[node]:
+            if closures:
+                if neighbor in closures.no_service:
+                    continue
+                if transfer and not (closures.can_stop(node) and closures.can_stop(neighbor)):
+                    continue
+            nd = d + minutes
+            if dist[neighbor] is None or nd < dist[neighbor]:
+                dist[neighbor] = nd
+                prev[neighbor] = node
+                heapq.heappush(heap, (nd, neighbor))
+    return dist, prev
+
+
+def _data_digest():
+    st = DATA_FILE.stat()
+    return hashlib.sha256(f'{TABLE_VERSION}:{st.st_mtime_ns}:{st.st_size}'.encode()).hexdigest()
+
+
+def load_table(network):
+    """Tabla de todos los pares de la red completa, desde temp/cache o calculada."""
+    digest = _data_digest()
+    try:
+        table = json.loads(TABLE_FILE.read_text(encoding='utf-8'))
+        if table.get('sources') == digest:
+            return table
+    except (OSError, ValueError):
+        pass
+
+    rows = [dijkstra(network, source) for source in range(len(network.nodes))]
+    table = {'sources': digest, 'dist': [row[0] for row in rows], 'prev': [row[1] for row in rows]}
+    try:
+        atomic_write(TABLE_FILE, json.dumps(table, separators=(',', ':')).encode('utf-8'))
+    except OSError:
+        pass
+    return table
+
+
+class Router:
+    def __init__(self, network, table):
+        self.network = network
+        self.dist = table['dist']
+        self.prev = table['prev']
+        self._rows = OrderedDict()   # clave de cierres -> {origen: (dist, prev)}
+
+    @staticmethod
+    def _walk(prev, source, target):
+        path = [target]
+        while path[-1] != source:
+            if prev[path[-1]] == -1:
+                return None
+            path.append(prev[path[-1]])
+        return path[::-1]
+
+    def _blocked(self, path, closures):
+        for a, b in zip(path, path[1:]):
+            if b in closures.no_service:
+                return True
+            if self.network.nodes[a][0] != self.network.nodes[b][0] and not (
+                    closures.can_stop(a) and closures.can_stop(b)):
+                return True
+        return False
+
+    def _row(self, source, closures):
+        rows = self._rows.get(closures.key)
+        if rows is None:
+            rows = self._rows[closures.key] = {}
+            while len(self._rows) > CLOSURE_MEMO:
+                self._rows.popitem(last=False)
+        if source not in rows:
+            rows[source] = dijkstra(self.network, source, closures)
+        return rows[source]
+
+    def node_path(self, source, target, closures=None):
+        """(minutos, [nodos]) de `source` a `target`, o None si no hay ruta."""
+        if self.dist[source][target] is None:
+            return None
+        path = self._walk(self.prev[source], source, target)
+        if not closures or not self._blocked(path, closures):
+            return self.dist[source][target], path
+
+        dist, prev = self._row(source, closures)
+        if dist[target] is None:
+            return None
+        return dist[target], self._walk(prev, source, target)
+
+    def route(self, origin, destination, closures=None):
+        """
+        Mejor ruta entre dos estaciones (por nombre, en cualquiera de sus
+        líneas): (minutos, [nodos]) o None.
+        """
+        closures = closures or Closures()
+        best = None
+        for source in self.network.station_nodes(origin):
+            if not closures.can_stop(source):
+                continue
+            for target in self.network.station_nodes(destination):
+                if not closures.can_stop(target):
+                    continue
+                found = self.node_path(source, target, closures)
+                if found and (best is None or found[0] < best[0]):
+                    best = found
+        return best
+
+    def describe(self, found):
+        """'República (L1) → L1 hasta Estación Central → a pie a Alameda → ... (≈40 min)'"""
+        minutes, path = found
+        nodes = self.network.nodes
+        code, station = nodes[path[0]]
+        parts = [f"{station} ({self.network.label(code)})"]
+        leg_line = None
+        for a, b in zip(path, path[1:]):
+            (line_a, station_a), (line_b, station_b) = nodes[a], nodes[b]
+            if line_a != line_b:
+                if station_a != station_b:
+                    parts.append(f"a pie a {station_b}")
+                leg_line = None
+                continue
+            if leg_line == line_b:
+                parts[-1] = f"{self.network.label(line_b)} hasta {station_b}"
+            else:
+                parts.append(f"{self.network.label(line_b)} hasta {station_b}")
+                leg_line = line_b
+        return f"{' → '.join(parts)} (≈{round(minutes)} min)"
+
+
+def get_router():
+    global _router
+    if _router is None:
+        with _lock:
+            if _router is None:
+                with open(DATA_FILE, encoding='utf-8') as f:
+                    network = Network(json.load(f))
+                _router = Router(network, load_table(network))
+    return _router
+
+
+# --- CIERRES DESDE EL ESTADO DE metro.py ---
+
+def _line_incidents(network, code, texts):
+    """Cierres de una línea a partir de su estado y problemas: [(tipo, [estaciones])]."""
+    stations = network.lines[code]['stations']
+    incidents = []
+    for text in texts:
+        normalized = _normalize(text)
+        mentioned = network.find_stations(code, text)
+        between = len(mentioned) >= 2 and re.search(r'\bentre\b', normalized)
+        # 'Servicio opera solo entre X y Y' no dice 'cierre', pero el resto está sin servicio
+        only_between = between and _ONLY_BETWEEN_RE.search(normalized) and not _DELAY_RE.search(normalized)
+        if not (_CLOSURE_RE.search(normalized) or only_between):
+            continue
+        if between:
+            lo, hi = stations.index(mentioned[0]), stations.index(mentioned[-1])
+            segments = [stations[:lo], stations[hi + 1:]] if only_between else [stations[lo:hi + 1]]
+            incidents.extend(('segment', down) for down in segments if down)
+        elif mentioned:
+            incidents.extend(('station', [station]) for station in mentioned)
+    # El estado y los problemas suelen repetir el mismo cierre
+    incidents = [incident for i, incident in enumerate(incidents) if incident not in incidents[:i]]
+    if not incidents and any(_LINE_DOWN_RE.search(_normalize(text)) for text in texts):
+        incidents.append(('line', list(stations)))
+    return incidents
+
+
+def closures_from_status(metro_data, metrotren_data):
+    """(Closures, [(línea, tipo, [estaciones])]) según los resultados de metro.py."""
+    network = get_router().network
+    incidents = []
+    for line in (metro_data or {}).get('lines', []):
+        code = network.by_name.get(_normalize(line['name']))
+        if code and line.get('has_problems'):
+            incidents.extend((code, kind, down) for kind, down in
+                             _line_incidents(network, code, [line['status']] + line['problems']))
+    for problem in (metrotren_data or {}).get('problems', []):
+        name = re.sub(r'^estacion\s+', '', _normalize(problem['name']))
+        for station in network.find_stations('MTN', name):
+            incidents.append(('MTN', 'station', [station]))
+
+    no_service, no_stop = set(), set()
+    for code, kind, down in incidents:
+        nodes = (network.index[(code, station)] for station in down)
+        (no_stop if kind == 'station' else no_service).update(nodes)
+    return Closures(no_service, no_stop), incidents
+
+
+def _open_neighbors(network, code, position, closures):
+    """La estación abierta más cercana hacia cada lado de `position` en la línea."""
+    stations = network.lines[code]['stations']
+    found = []
+    for step in (-1, 1):
+        i = position + step
+        while 0 <= i < len(stations) and not closures.can_stop(network.index[(code, stations[i])]):
+            i += step
+        if 0 <= i < len(stations):
+            found.append(stations[i])
+    return found
+
+
+def advice(metro_data, metrotren_data):
+    """Consejos de ruta (textos para WhatsApp) para los cierres informados; [] si no hay."""
+    router = get_router()
+    network = router.network
+    closures, incidents = closures_from_status(metro_data, metrotren_data)
+    tips = []
+    for code, kind, down in incidents:
+        label = network.label(code)
+        stations = network.lines[code]['stations']
+        if kind == 'station':
+            station = down[0]
+            neighbors = _open_neighbors(network, code, stations.index(station), closures)
+            tip = f"🚉 *{station}* ({label}) cerrada"
+            if neighbors:
+                tip += f": bájate en {' o '.join(neighbors)}"
+            tips.append(tip + '.')
+            # Combinación cerrada: cómo llegar a las otras líneas de la estación
+            for other in network.station_nodes(station):
+                other_code = network.nodes[other][0]
+                if other_code == code or not closures.can_stop(other) or not neighbors:
+                    continue
+                found = min(filter(None, (router.node_path(network.index[(code, n)], other, closures)
+                                          for n in neighbors)), default=None, key=lambda f: f[0])
+                if found:
+                    tips.append(f"  ↪ Para combinar a {network.label(other_code)}: {router.describe(found)}")
+            continue
+
+        first, last = stations.index(down[0]), stations.index(down[-1])
+        if kind == 'line':
+            transfer_stations = [s for s in stations if len(network.station_nodes(s)) > 1]
+            ends = (transfer_stations[0], transfer_stations[-1]) if len(transfer_stations) > 1 else None
+            tip = f"🚧 *{label}* sin servicio"
+        else:
+            before = stations[first - 1] if first > 0 else None
+            after = stations[last + 1] if last + 1 < len(stations) else None
+            ends = (before, after) if before and after else None
+            tip = f"🚧 *{label}* sin servicio entre {down[0]} y {down[-1]}"
+        found = router.route(*ends, closures) if ends else None
+        if found:
+            tip += f". De {ends[0]} a {ends[1]}: {router.describe(found)}"
+        tips.append(tip + ('' if found else '.'))
+    return tips
+
+
+def main():
+    args = sys.argv[1:]
+    avoid = next((a.split('=', 1)[1] for a in args if a.startswith('--sin=')), '')
+    args = [a for a in args if not a.startswith('--sin=')]
+    if len(args) != 2:
+        print('Uso: python metro_routes.py <origen> <destino> [--sin=L1,Baquedano,...]', file=sys.stderr)
+        sys.exit(1)
+
+    router = get_router()
+    network = router.network
+    no_service, no_stop = set(), set()
+    for item in filter(None, (a.strip() for a in avoid.split(','))):
+        code = next((c for c in network.lines if c.lower() == item.lower()), None)
+        if code:
+            no_service.update(network.index[(code, s)] for s in network.lines[code]['stations'])
+        else:
+            no_stop.update(network.station_nodes(item))
+
+    for name in args:
+        if not network.station_nodes(name):
+            print(f"❌ No conozco la estación '{name}'.")
+            sys.exit(1)
+    found = router.route(args[0], args[1], Closures(no_service, no_stop))
+    print(router.describe(found) if found else '❌ No hay ruta con esos cierres.')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,34 +1,29 @@
+import os
 import sys
 import socket
-import whois
-import ipapi
-import requests
 import io
-import ssl
-import threading
+import json
 import re
-import dns.resolver
-import dns.reversename
+import threading
+import time
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List, Tuple, Optional
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError, as_completed
+from typing import Dict, Iterable, List, Tuple, Optional
 
-# Importación segura de Wappalyzer (opcional)
-try:
-    from Wappalyzer import Wappalyzer, WebPage
-    WAPPALYZER_AVAILABLE = True
-except ImportError:
-    WAPPALYZER_AVAILABLE = False
+import script_output
+import timing
+
+# Las dependencias pesadas (requests/http_client, dnspython, tech_fingerprints)
+# se importan dentro de cada etapa: una entrada inválida o una etapa que no
+# corre no paga su costo de importación.
 
-socket.setdefaulttimeout(10)
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 # Cabeceras para evitar bloqueos
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-    'Accept-Language': 'es-ES,es;q=0.9,en;q=0.8',
-    'Accept-Encoding': 'gzip, deflate, br'
+    'Accept-Language': 'es-ES,es;q=0.9,en;q=0.8'
 }
 
 # Configuración ampliada de puertos
@@ -54,19 +49,126 @@ COMMON_PORTS = {
     8443: ("HTTPS-Alt", "HTTPS alternativo.", "[OK]")
 }
 
+SCHEMA_VERSION = 1
+
+# --stream: una línea JSON por registro (start, section..., end o error) a
+# medida que cada etapa termina, para que Node mande primero lo rápido
+STREAM_FLAG = '--stream'
+
+# Tiempo total para las etapas del análisis, que corren en paralelo. Lo que no
+# termine a tiempo sale como "sin respuesta" en vez de perder todo el reporte
+# (Node corta el script a los 30 s).
+STAGES_DEADLINE = float(os.getenv('NET_ANALYZER_DEADLINE', '20'))
+
+# Geolocalización (ipapi.co): timeout de la petición, en segundos
+GEO_TIMEOUT = 10
+
+# Secciones del reporte, en el orden en que se muestran
+SECTIONS = [
+    ('geo', 'GEOLOCATION'),
+    ('dns', 'DNS RECORDS'),
+    ('blacklist', 'BLACKLIST CHECK'),
+    ('http', 'HTTP PERFORMANCE'),
+    ('ssl', 'SSL/SECURITY'),
+    ('tech', 'TECHNOLOGIES'),
+    ('robots', 'ROBOTS.TXT & SITEMAP'),
+    ('ports', 'PORT SCAN'),
+    ('subdomains', 'SUBDOMAINS (crt.sh)'),
+]
+
 MAX_SUBDOMAINS = 15
+
+# crt.sh: la respuesta se lee por partes y se corta apenas hay suficientes
+# nombres nuevos; lo visto queda en ct_store (SQLite) y se reutiliza durante
+# CT_REFRESH_TTL sin volver a consultar
+CT_REFRESH_TTL = 6 * 60 * 60
+CT_MAX_NEW_NAMES = 500
+CT_STREAM_TIMEOUT = 12
+CT_CHUNK_SIZE = 64 * 1024
+# Top 100 de puertos TCP de nmap (nmap-services)
+TOP_100_PORTS = [
+    7, 9, 13, 21, 22, 23, 25, 26, 37, 53, 79, 80, 81, 88, 106, 110, 111, 113, 119, 135,
+    139, 143, 144, 179, 199, 389, 427, 443, 444, 445, 465, 513, 514, 515, 543, 544, 548, 554,
+    587, 631, 646, 873, 990, 993, 995, 1025, 1026, 1027, 1028, 1029, 1110, 1433, 1720, 1723,
+    1755, 1900, 2000, 2001, 2049, 2121, 2717, 3000, 3128, 3306, 3389, 3986, 4899, 5000, 5009,
+    5051, 5060, 5101, 5190, 5357, 5432, 5631, 5666, 5800, 5900, 6000, 6001, 6646, 7070, 8000,
+    8008, 8009, 8080, 8081, 8443, 8888, 9100, 9999, 10000, 32768, 49152, 49153, 49154, 49155,
+    49156, 49157,
+]
+
+# Perfiles de escaneo: NET_ANALYZER_PORT_PROFILE o --ports=<perfil>
+PORT_PROFILES = {
+    'common': sorted(COMMON_PORTS),
+    # top100 incluye además los de COMMON_PORTS (Redis, etc.)
+    'top100': sorted(set(TOP_100_PORTS) | set(COMMON_PORTS)),
+    'web': [80, 443, 3000, 5000, 8000, 8008, 8080, 8081, 8443, 8888, 9000],
+}
+PORT_PROFILE = os.getenv('NET_ANALYZER_PORT_PROFILE', 'common')
+
 PORT_SCAN_TIMEOUT = 1.0
-MAX_THREADS = 10
+# Conexiones simultáneas: tope inicial; baja sola si el sistema se queda sin sockets
+PORT_SCAN_CONCURRENCY = int(os.getenv('NET_ANALYZER_PORT_CONCURRENCY', '128'))
+PORT_SCAN_MIN_CONCURRENCY = 8
+
+# Lectura del banner en puertos abiertos (NET_ANALYZER_BANNERS=0 la desactiva)
+BANNER_GRAB = os.getenv('NET_ANALYZER_BANNERS', '1') != '0'
+BANNER_TIMEOUT = 1.0
+# Puertos donde el servidor habla primero (None) o hay que mandar una sonda
+BANNER_PROBES = {
+    21: None, 22: None, 23: None, 25: None, 110: None, 143: None, 587: None, 3306: None,
+    6379: b'PING\r\n',
+    80: b'HEAD / HTTP/1.0\r\n\r\n', 8000: b'HEAD / HTTP/1.0\r\n\r\n',
+    8008: b'HEAD / HTTP/1.0\r\n\r\n', 8080: b'HEAD / HTTP/1.0\r\n\r\n',
+    8888: b'HEAD / HTTP/1.0\r\n\r\n',
+}
 DNS_TIMEOUT = 5
 
-# DNSBL conocidas para verificar blacklists
+# Caché de respuestas DNS: el TTL de cada respuesta, con tope; las negativas
+# (NXDOMAIN / sin registros) duran DNS_NEGATIVE_TTL
+DNS_CACHE_MAX_TTL = 60 * 60
+DNS_NEGATIVE_TTL = 5 * 60
+
+# DNSBL a consultar (todas en paralelo). NET_ANALYZER_DNSBL reemplaza la lista
+# con zonas separadas por coma. Las que no manejan IPv6 responden NXDOMAIN.
 DNSBL_SERVERS = [
-    'zen.spamhaus.org',
-    'bl.spamcop.net',
-    'b.barracudacentral.org',
-    'dnsbl.sorbs.net'
+    zone.strip() for zone in os.getenv('NET_ANALYZER_DNSBL', ','.join([
+        'zen.spamhaus.org',
+        'bl.spamcop.net',
+        'b.barracudacentral.org',
+        'dnsbl.sorbs.net',
+        'psbl.surriel.com',
+        'bl.mailspike.net',
+        'dnsbl-1.uceprotect.net',
+        'ix.dnsbl.manitu.net',
+        'all.s5h.net',
+        'dnsbl.dronebl.org',
+    ])).split(',') if zone.strip()
 ]
 
+# Veredicto por IP (result_cache, namespace 'dnsbl')
+DNSBL_CACHE_TTL = 30 * 60
+
+# Caché de secciones ya armadas por objetivo (result_cache, namespace
+# 'net_sections'), con un TTL por sección. dns, blacklist y subdomains no
+# están: ya se cachean por dentro (TTL de cada registro DNS, veredicto DNSBL
+# y ct_store), así que repetirlas no sale a la red.
+SECTION_CACHE_TTL = {
+    'geo': 3 * 24 * 60 * 60,
+    'robots': 6 * 60 * 60,
+    'tech': 6 * 60 * 60,
+    'ssl': 60 * 60,
+    'ports': 15 * 60,
+    'http': 5 * 60,
+}
+# --fresh: ignora todas las cachés (las secciones, DNS, DNSBL y crt.sh) y
+# vuelve a guardar lo obtenido
+FRESH_FLAG = '--fresh'
+FRESH = False
+# Secciones que no se guardan: la etapa falló o respondió a medias
+_DEGRADED_RE = re.compile(
+    r'^\[[!X]\] (?:Error|Timeout|Sin respuesta|Ninguna|No se pudo|HTTPS no disponible)|No accesible'
+)
+
 def is_valid_domain_or_ip(target: str) -> Tuple[bool, bool, Optional[str]]:
     """Valida si el target es un dominio o IP válido."""
     try:
@@ -82,66 +184,125 @@ def is_valid_domain_or_ip(target: str) -> Tuple[bool, bool, Optional[str]]:
     
     return False, False, f"'{target}' no es un dominio o IP válido."
 
+def _dns_cache_key(name: str, rtype: str) -> str:
+    return f"{name.lower().rstrip('.')}|{rtype}"
+
+def _dns_records(rtype: str, answer) -> List[str]:
+    """Registros de una respuesta de dnspython como textos."""
+    if rtype == 'MX':
+        return [f"{r.preference} {r.exchange}" for r in sorted(answer, key=lambda r: r.preference)]
+    if rtype == 'TXT':
+        return [b''.join(r.strings).decode('utf-8', errors='replace') for r in answer]
+    if rtype == 'SOA':
+        return [str(r.mname) for r in answer]
+    return [str(r) for r in answer]
+
+async def _resolve_dns(queries: List[Tuple[str, str]], deadline: float) -> Dict:
+    """
+    Resuelve todas las consultas (nombre, tipo) a la vez con un plazo común.
+    Devuelve {(nombre, tipo): {'records': [...], 'ttl': s}}; sin entrada si
+    la consulta no respondió a tiempo o falló.
+    """
+    import asyncio
+    import dns.asyncresolver
+    import dns.exception
+    import dns.resolver
+
+    resolver = dns.asyncresolver.Resolver()
+    resolver.timeout = deadline
+    resolver.lifetime = deadline
+
+    async def resolve(name, rtype):
+        try:
+            answer = await resolver.resolve(name, rtype)
+            return {'records': _dns_records(rtype, answer), 'ttl': answer.rrset.ttl}
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            # Respuesta negativa: también se cachea, por menos tiempo
+            return {'records': [], 'ttl': DNS_NEGATIVE_TTL}
+        except dns.exception.DNSException:
+            return None
+
+    tasks = {asyncio.ensure_future(resolve(name, rtype)): (name, rtype) for name, rtype in queries}
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    return {tasks[task]: task.result() for task in done if task.result() is not None}
+
+def collect_dns_records(queries: List[Tuple[str, str]], deadline: float = DNS_TIMEOUT) -> Dict:
+    """
+    Respuestas de las consultas (nombre, tipo), primero desde la caché
+    (result_cache, namespace 'dns', vigentes según el TTL de cada respuesta)
+    y el resto en paralelo con dns.asyncresolver.
+    """
+    import asyncio
+    from result_cache import read, write
+
+    results = {}
+    missing = []
+    for name, rtype in queries:
+        value, age = (None, None) if FRESH else read('dns', _dns_cache_key(name, rtype))
+        if value is not None and age < value['ttl']:
+            results[(name, rtype)] = value
+        else:
+            missing.append((name, rtype))
+
+    if missing:
+        fresh = asyncio.run(_resolve_dns(missing, deadline))
+        for (name, rtype), value in fresh.items():
+            value['ttl'] = min(value['ttl'], DNS_CACHE_MAX_TTL)
+            write('dns', _dns_cache_key(name, rtype), value)
+        results.update(fresh)
+    return results
+
 def analyze_dns_records(domain: str) -> str:
-    """Analiza registros DNS completos del dominio."""
+    """Analiza registros DNS completos del dominio (todas las consultas en paralelo)."""
     report = ["\n--- DNS RECORDS ---"]
-    
+    dmarc_name = f"_dmarc.{domain}"
+    queries = [(domain, rtype) for rtype in ('A', 'AAAA', 'MX', 'TXT', 'NS', 'SOA')] + [(dmarc_name, 'TXT')]
+
     try:
-        resolver = dns.resolver.Resolver()
-        resolver.timeout = DNS_TIMEOUT
-        resolver.lifetime = DNS_TIMEOUT
-        
+        answers = collect_dns_records(queries)
+
+        def records(name, rtype):
+            answer = answers.get((name, rtype))
+            return answer['records'] if answer else []
+
         # Registros A (IPv4)
-        try:
-            a_records = resolver.resolve(domain, 'A')
-            ips = [str(r) for r in a_records]
-            report.append(f"*A (IPv4):* `{', '.join(ips)}`")
-        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.exception.Timeout):
-            pass
-        
+        if records(domain, 'A'):
+            report.append(f"*A (IPv4):* `{', '.join(records(domain, 'A'))}`")
+
         # Registros AAAA (IPv6)
-        try:
-            aaaa_records = resolver.resolve(domain, 'AAAA')
-            ipv6s = [str(r) for r in aaaa_records]
-            report.append(f"*AAAA (IPv6):* `{', '.join(ipv6s[:2])}`")
-        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.exception.Timeout):
-            pass
-        
+        if records(domain, 'AAAA'):
+            report.append(f"*AAAA (IPv6):* `{', '.join(records(domain, 'AAAA')[:2])}`")
+
         # Registros MX (Mail Exchange)
-        try:
-            mx_records = resolver.resolve(domain, 'MX')
-            mxs = [f"{r.preference} {str(r.exchange)}" for r in sorted(mx_records, key=lambda x: x.preference)]
-            report.append(f"*MX (Email):* `{', '.join(mxs[:3])}`")
-        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.exception.Timeout):
+        if records(domain, 'MX'):
+            report.append(f"*MX (Email):* `{', '.join(records(domain, 'MX')[:3])}`")
+        elif (domain, 'MX') in answers:
             report.append("*MX:* No configurado")
-        
-        # Registros TXT (SPF, DKIM, DMARC)
-        try:
-            txt_records = resolver.resolve(domain, 'TXT')
-            for txt in txt_records:
-                txt_str = str(txt).replace('"', '')
-                if 'v=spf' in txt_str.lower():
-                    report.append(f"*SPF:* `{txt_str[:80]}`")
-                elif 'v=dmarc' in txt_str.lower():
-                    report.append(f"*DMARC:* `{txt_str[:80]}`")
-        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.exception.Timeout):
-            pass
-        
+
+        # SPF (TXT del dominio) y DMARC (TXT de _dmarc.<dominio>)
+        for txt_str in records(domain, 'TXT'):
+            if 'v=spf' in txt_str.lower():
+                report.append(f"*SPF:* `{txt_str[:80]}`")
+        dmarc = [t for t in records(dmarc_name, 'TXT') if t.lower().startswith('v=dmarc')]
+        if dmarc:
+            report.append(f"*DMARC:* `{dmarc[0][:80]}`")
+        elif (dmarc_name, 'TXT') in answers:
+            report.append("*DMARC:* No configurado")
+
         # Registros NS (Nameservers)
-        try:
-            ns_records = resolver.resolve(domain, 'NS')
-            nameservers = [str(r) for r in ns_records]
-            report.append(f"*NS:* `{', '.join(nameservers[:3])}`")
-        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.exception.Timeout):
-            pass
-        
+        if records(domain, 'NS'):
+            report.append(f"*NS:* `{', '.join(records(domain, 'NS')[:3])}`")
+
         # Registro SOA
-        try:
-            soa_record = resolver.resolve(domain, 'SOA')[0]
-            report.append(f"*SOA (Primary):* `{str(soa_record.mname)}`")
-        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.exception.Timeout):
-            pass
-            
+        if records(domain, 'SOA'):
+            report.append(f"*SOA (Primary):* `{records(domain, 'SOA')[0]}`")
+
+        unanswered = [rtype if name == domain else name for name, rtype in queries if (name, rtype) not in answers]
+        if unanswered:
+            report.append(f"[!] Sin respuesta en {DNS_TIMEOUT}s: {', '.join(unanswered)}")
+
     except Exception as e:
         report.append(f"[!] Error en análisis DNS: {str(e)[:80]}")
     
@@ -152,7 +313,13 @@ def get_geolocation_info(ip_address: str) -> str:
     report = ["\n--- GEOLOCATION ---"]
     
     try:
-        geo_info = ipapi.location(ip=ip_address, output='json')
+        import http_client
+
+        # La API de ipapi.co directo, con timeout por conexión
+        response = http_client.get(f"https://ipapi.co/{ip_address}/json/", headers=HEADERS, timeout=GEO_TIMEOUT)
+        geo_info = response.json() if response.ok else None
+        if geo_info and geo_info.get('error'):
+            geo_info = None
         
         if geo_info:
             country = geo_info.get('country_name', 'N/A')
@@ -184,30 +351,65 @@ def get_geolocation_info(ip_address: str) -> str:
     
     return "\n".join(report)
 
+def _dnsbl_name(ip_address: str) -> str:
+    """1.2.3.4 -> 4.3.2.1; IPv6 -> nibbles invertidos (b.a.9.8...), como piden las DNSBL."""
+    from ipaddress import ip_address as parse_ip
+    return parse_ip(ip_address).reverse_pointer.rsplit('.', 2)[0]
+
+def _dnsbl_listed(records: List[str]) -> bool:
+    """
+    Una respuesta 127.0.0.x significa listada. 127.255.255.x es el código con
+    que Spamhaus y otras rechazan la consulta (p. ej. resolvers públicos): no cuenta.
+    """
+    return any(r.startswith('127.') and not r.startswith('127.255.255.') for r in records)
+
+def lookup_blacklists(ip_address: str, zones: List[str] = None) -> Dict:
+    """
+    Consulta todas las zonas a la vez (un solo plazo, DNS_TIMEOUT).
+    Devuelve {'listed': [...], 'unanswered': [...], 'checked': n}; se cachea
+    DNSBL_CACHE_TTL si todas las zonas respondieron.
+    """
+    import asyncio
+    from result_cache import read, write
+
+    zones = zones or DNSBL_SERVERS
+    key = f"{ip_address}|{','.join(sorted(zones))}"
+    value, age = (None, None) if FRESH else read('dnsbl', key)
+    if value is not None and age < DNSBL_CACHE_TTL:
+        return value
+
+    reversed_ip = _dnsbl_name(ip_address)
+    queries = [(f"{reversed_ip}.{zone}", 'A') for zone in zones]
+    answers = asyncio.run(_resolve_dns(queries, DNS_TIMEOUT))
+
+    verdict = {'listed': [], 'unanswered': [], 'checked': len(zones)}
+    for zone, query in zip(zones, queries):
+        answer = answers.get(query)
+        if answer is None:
+            verdict['unanswered'].append(zone)
+        elif _dnsbl_listed(answer['records']):
+            verdict['listed'].append(zone)
+
+    if not verdict['unanswered']:
+        write('dnsbl', key, verdict)
+    return verdict
+
 def check_blacklists(ip_address: str) -> str:
-    """Verifica si la IP está en listas negras de SPAM."""
+    """Verifica si la IP (v4 o v6) está en listas negras de SPAM."""
     report = ["\n--- BLACKLIST CHECK ---"]
-    blacklisted = []
     
     try:
-        # Invertir IP para consultas DNSBL (ej: 1.2.3.4 -> 4.3.2.1)
-        reversed_ip = '.'.join(reversed(ip_address.split('.')))
-        
-        for dnsbl in DNSBL_SERVERS:
-            try:
-                query = f"{reversed_ip}.{dnsbl}"
-                socket.gethostbyname(query)
-                blacklisted.append(dnsbl)
-            except socket.gaierror:
-                # No está en la lista negra (lo esperado)
-                pass
-            except Exception:
-                pass
+        verdict = lookup_blacklists(ip_address)
+        blacklisted = verdict['listed']
         
         if blacklisted:
             report.append(f"[!!] *IP en {len(blacklisted)} blacklist(s):* `{', '.join(blacklisted)}`")
+        elif len(verdict['unanswered']) == verdict['checked']:
+            report.append("[!] Ninguna blacklist respondió")
         else:
-            report.append("[OK] IP limpia - No está en blacklists conocidas")
+            report.append(f"[OK] IP limpia - No está en {verdict['checked'] - len(verdict['unanswered'])} blacklists conocidas")
+        if verdict['unanswered'] and len(verdict['unanswered']) < verdict['checked']:
+            report.append(f"_Sin respuesta: {', '.join(verdict['unanswered'])}_")
             
     except Exception as e:
         report.append(f"[!] Error verificando blacklists: {str(e)[:50]}")
@@ -217,11 +419,12 @@ def check_blacklists(ip_address: str) -> str:
 def analyze_robots_and_sitemap(domain: str) -> str:
     """Analiza robots.txt y sitemap.xml del dominio."""
     report = ["\n--- ROBOTS.TXT & SITEMAP ---"]
+    import http_client
     
     # Analizar robots.txt
     try:
         robots_url = f"https://{domain}/robots.txt"
-        response = requests.get(robots_url, headers=HEADERS, timeout=5, verify=False)
+        response = http_client.get(robots_url, headers=HEADERS, timeout=5, verify=False, retry=False)
         
         if response.status_code == 200:
             content = response.text
@@ -245,7 +448,7 @@ def analyze_robots_and_sitemap(domain: str) -> str:
     # Analizar sitemap.xml
     try:
         sitemap_url = f"https://{domain}/sitemap.xml"
-        response = requests.get(sitemap_url, headers=HEADERS, timeout=5, verify=False)
+        response = http_client.get(sitemap_url, headers=HEADERS, timeout=5, verify=False, retry=False)
         
         if response.status_code == 200:
             # Contar URLs en el sitemap
@@ -261,159 +464,357 @@ def analyze_robots_and_sitemap(domain: str) -> str:
     
     return "\n".join(report)
 
-def analyze_http_performance(domain: str) -> Dict[str, any]:
-    """Analiza rendimiento HTTP del dominio."""
-    report = ["\n--- HTTP PERFORMANCE ---"]
-    
+def fetch_target(domain: str) -> Dict:
+    """
+    Única petición a la portada del dominio, compartida por las etapas http,
+    ssl y tech: cuerpo, cabeceras, redirecciones, tiempo y datos TLS de cada
+    salto (http_client con inspect=True).
+    Devuelve {'response', 'elapsed', 'scheme', 'cert_valid', 'error'}.
+    """
+    import requests
+    import http_client
+
+    page = {'response': None, 'elapsed': None, 'scheme': 'https', 'cert_valid': None, 'error': None}
+    url = f"https://{domain}"
+    options = dict(headers=HEADERS, timeout=10, allow_redirects=True, retry=False, inspect=True)
+
+    start_time = time.monotonic()
     try:
-        import time
-        start_time = time.time()
-        
-        response = requests.get(f"https://{domain}", headers=HEADERS, timeout=10, allow_redirects=True, verify=False)
-        
-        load_time = time.time() - start_time
+        try:
+            response = http_client.get(url, **options)
+            page['cert_valid'] = True
+        except requests.exceptions.SSLError as e:
+            # Certificado inválido: se repite sin verificar para analizar igual el sitio
+            if 'CERTIFICATE_VERIFY_FAILED' not in str(e):
+                raise
+            page['cert_valid'] = False
+            start_time = time.monotonic()
+            response = http_client.get(url, verify=False, **options)
+    except requests.exceptions.SSLError as e:
+        # HTTPS no disponible: probar HTTP
+        page['scheme'] = 'http'
+        try:
+            start_time = time.monotonic()
+            response = http_client.get(f"http://{domain}", headers=HEADERS, timeout=10, retry=False, inspect=True)
+        except Exception:
+            page['error'] = e
+            return page
+    except Exception as e:
+        page['error'] = e
+        return page
+
+    page['elapsed'] = time.monotonic() - start_time
+    page['response'] = response
+    return page
+
+# Fases de cada salto, en orden, y qué significa que una domine el tiempo total
+TIMING_PHASES = [
+    ('dns_ms', 'DNS', 'resolución DNS lenta'),
+    ('tcp_ms', 'TCP', 'latencia de red alta (servidor lejano o saturado)'),
+    ('tls_ms', 'TLS', 'handshake TLS lento'),
+    ('ttfb_ms', 'TTFB', 'el servidor tarda en generar la respuesta'),
+    ('transfer_ms', 'descarga', 'página pesada o enlace lento'),
+]
+ALPN_PROBE_TIMEOUT = 3
+
+def _probe_alpn(host: str, port: int, verify: bool) -> Optional[str]:
+    """
+    Protocolo que el servidor elige si el cliente ofrece h2. requests solo
+    habla HTTP/1.1 (urllib3 anuncia 'http/1.1'), así que para saber si hay
+    HTTP/2 hace falta un handshake aparte, sin petición HTTP.
+    """
+    import ssl
+
+    context = ssl.create_default_context()
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    context.set_alpn_protocols(['h2', 'http/1.1'])
+    try:
+        with socket.create_connection((host, port), timeout=ALPN_PROBE_TIMEOUT) as sock:
+            with context.wrap_socket(sock, server_hostname=host) as tls_sock:
+                return tls_sock.selected_alpn_protocol()
+    except (OSError, ssl.SSLError):
+        return None
+
+def _format_hop(number: int, hop) -> str:
+    timing_info = getattr(hop, 'timing', None) or {}
+    phases = [f"{label} `{timing_info[key]:.0f}ms`" for key, label, _ in TIMING_PHASES if key in timing_info]
+    reused = " (conexión reutilizada)" if timing_info.get('reused') else ""
+    return f"{number}. `{hop.status_code}` {hop.url}{reused}: " + (" · ".join(phases) or "sin datos")
+
+def _bottleneck(hops) -> Optional[str]:
+    """La fase que más pesa en el total, si se lleva al menos el 40%."""
+    totals = {}
+    for hop in hops:
+        for key, value in (getattr(hop, 'timing', None) or {}).items():
+            if key.endswith('_ms'):
+                totals[key] = totals.get(key, 0) + value
+    total = sum(totals.values())
+    if not total:
+        return None
+    key, value = max(totals.items(), key=lambda item: item[1])
+    if value < total * 0.4:
+        return None
+    label, meaning = next((label, meaning) for k, label, meaning in TIMING_PHASES if k == key)
+    return f"*Cuello de botella:* {label} ({value / total:.0%} del tiempo): {meaning}"
+
+def analyze_http_performance(domain: str, page: Dict) -> str:
+    """
+    Analiza rendimiento HTTP del dominio (a partir de fetch_target): tiempos
+    de DNS, TCP, TLS, TTFB y descarga de cada salto, y la conexión TLS final.
+    """
+    report = ["\n--- HTTP PERFORMANCE ---"]
+    import requests
+
+    response = page['response']
+    error = page['error']
+    if isinstance(error, requests.exceptions.Timeout):
+        report.append("[!] Timeout - Servidor responde lento (\u003e10s)")
+    elif isinstance(error, requests.exceptions.SSLError):
+        report.append("[X] No se pudo conectar")
+    elif error is not None:
+        report.append(f"[!] Error: {str(error)[:60]}")
+    else:
         status_code = response.status_code
         content_length = len(response.content)
-        
+
         # Analizar compresión
         encoding = response.headers.get('Content-Encoding', 'none')
         compressed = encoding.lower() in ['gzip', 'br', 'deflate']
-        
+
         # Estado
-        if status_code == 200:
-            report.append(f"*Status:* [OK] `{status_code}` - Carga: `{load_time:.2f}s`")
+        if page['scheme'] == 'http':
+            report.append(f"[!] HTTPS no disponible, HTTP: `{status_code}` - Carga: `{page['elapsed']:.2f}s`")
+        elif status_code == 200:
+            report.append(f"*Status:* [OK] `{status_code}` - Carga: `{page['elapsed']:.2f}s`")
         else:
             report.append(f"*Status:* [!] `{status_code}`")
-        
+
         report.append(f"*Tamaño:* `{content_length / 1024:.1f} KB`")
-        
+
         if compressed:
             report.append(f"*Compresión:* [OK] `{encoding.upper()}`")
         else:
             report.append("*Compresión:* [!] No habilitada")
-        
+
         # Redirecciones
         if response.history:
             report.append(f"*Redirecciones:* `{len(response.history)}` saltos")
-            
-    except requests.exceptions.Timeout:
-        report.append("[!] Timeout - Servidor responde lento (\u003e10s)")
-    except requests.exceptions.SSLError:
-        # Intentar HTTP
-        try:
-            response = requests.get(f"http://{domain}", headers=HEADERS, timeout=10)
-            report.append(f"[!] HTTPS no disponible, HTTP: `{response.status_code}`")
-        except:
-            report.append("[X] No se pudo conectar")
-    except Exception as e:
-        report.append(f"[!] Error: {str(e)[:60]}")
-    
+
+        # Tiempos por salto, medidos sobre la misma conexión (http_client inspect=True)
+        hops = response.history + [response]
+        if any(getattr(hop, 'timing', None) for hop in hops):
+            report.append("*Tiempos por salto:*")
+            report.extend(_format_hop(number, hop) for number, hop in enumerate(hops, 1))
+            bottleneck = _bottleneck(hops)
+            if bottleneck:
+                report.append(bottleneck)
+
+        # Conexión TLS del salto final
+        tls = getattr(response, 'tls', None)
+        if tls:
+            from urllib.parse import urlsplit
+
+            final = urlsplit(response.url)
+            alpn = _probe_alpn(final.hostname, final.port or 443, verify=page['cert_valid'] is not False)
+            http2 = {"h2": "[OK] HTTP/2", "http/1.1": "[!] Solo HTTP/1.1"}.get(alpn, "ALPN sin respuesta")
+            report.append(f"*TLS:* `{tls['version']}` · `{tls['cipher']}` · ALPN `{tls['alpn'] or '-'}`")
+            report.append(f"*Protocolo:* {http2}")
+
     return "\n".join(report)
 
-def detect_technologies_advanced(domain: str, response_headers: dict = None) -> str:
-    """Detección avanzada de tecnologías sin Wappalyzer."""
+def detect_technologies_advanced(domain: str, page: Dict) -> str:
+    """
+    Detección de tecnologías sobre la respuesta de fetch_target, con las
+    firmas de tech_fingerprints (data/tech_fingerprints*.json).
+    """
     report = ["\n--- TECHNOLOGIES ---"]
     technologies = []
-    
-    # Si tenemos Wappalyzer, usarlo
-    if WAPPALYZER_AVAILABLE:
+    response = page['response']
+
+    if response is not None:
+        import tech_fingerprints
+
         try:
-            wappalyzer = Wappalyzer.latest()
-            webpage = WebPage.new_from_url(f"https://{domain}", timeout=5)
-            techs = wappalyzer.analyze(webpage)
-            if techs:
-                technologies.extend(sorted(techs)[:10])
-        except:
-            pass
-    
-    # Detección manual si no hay Wappalyzer o para complementar
-    if response_headers:
-        server = response_headers.get('Server', '')
-        powered_by = response_headers.get('X-Powered-By', '')
-        
+            found = tech_fingerprints.detect(response.text, response.headers, list(response.cookies.keys()))
+        except Exception:
+            found = []
+        technologies.extend(
+            f"{tech['name']} {tech['version']}" if tech['version'] else tech['name'] for tech in found
+        )
+
+        server = response.headers.get('Server', '')
+        powered_by = response.headers.get('X-Powered-By', '')
         if server:
             technologies.append(f"Server: {server}")
         if powered_by:
             technologies.append(f"Powered-By: {powered_by}")
-    
-    # Intentar detectar por contenido HTML
-    try:
-        response = requests.get(f"https://{domain}", headers=HEADERS, timeout=5, verify=False)
-        html = response.text.lower()
-        
-        # Detectar CMS/Frameworks comunes
-        if 'wp-content' in html or 'wordpress' in html:
-            technologies.append("WordPress")
-        if 'joomla' in html:
-            technologies.append("Joomla")
-        if 'drupal' in html:
-            technologies.append("Drupal")
-        if 'react' in html or 'reactdom' in html:
-            technologies.append("React")
-        if 'vue' in html or 'vuejs' in html:
-            technologies.append("Vue.js")
-        if 'angular' in html:
-            technologies.append("Angular")
-        if 'bootstrap' in html:
-            technologies.append("Bootstrap")
-        if 'jquery' in html:
-            technologies.append("jQuery")
-            
-    except:
-        pass
-    
+
     if technologies:
-        unique_techs = list(set(technologies))[:15]
-        report.append(", ".join(f"`{tech}`" for tech in unique_techs))
+        report.append(", ".join(f"`{tech}`" for tech in technologies[:15]))
     else:
         report.append("No se detectaron tecnologías específicas")
-    
+
     return "\n".join(report)
 
-def scan_single_port(ip_address: str, port: int) -> Optional[Tuple]:
-    """Escanea un puerto individual."""
-    service, advice, emoji = COMMON_PORTS.get(port, (f"Port {port}", "Servicio desconocido.", "❓"))
+class _AdaptiveLimit:
+    """
+    Semáforo cuyo tope baja a la mitad cuando el sistema se queda sin
+    sockets (EMFILE, ENOBUFS...) y vuelve a subir de a uno con cada éxito.
+    """
+
+    def __init__(self, limit: int):
+        import asyncio
+
+        self.limit = self.max_limit = max(PORT_SCAN_MIN_CONCURRENCY, limit)
+        self.active = 0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def shrink(self):
+        self.limit = max(PORT_SCAN_MIN_CONCURRENCY, self.limit // 2)
+
+    def grow(self):
+        self.limit = min(self.max_limit, self.limit + 1)
+
+def _initial_concurrency() -> int:
+    """PORT_SCAN_CONCURRENCY acotado por los descriptores de archivo disponibles."""
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            sock.settimeout(PORT_SCAN_TIMEOUT)
-            if sock.connect_ex((ip_address, port)) == 0:
-                return (port, service, advice, emoji)
-    except (socket.timeout, socket.error):
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft > 0:
+            return min(PORT_SCAN_CONCURRENCY, soft - 64)
+    except (ImportError, ValueError, OSError):
         pass
-    return None
+    return PORT_SCAN_CONCURRENCY
+
+def _interpret_banner(port: int, banner: str) -> Tuple[Optional[str], Optional[str]]:
+    """(marcador que reemplaza al de COMMON_PORTS o None, nota para el reporte)."""
+    if port == 6379:
+        if banner.startswith('+PONG'):
+            return "[!!]", "Redis responde sin autenticación"
+        return None, "Redis pide autenticación"
+    if banner.startswith('HTTP/'):
+        server = re.search(r'^server:\s*(.+)$', banner, re.IGNORECASE | re.MULTILINE)
+        return None, server.group(1).strip()[:40] if server else None
+    if port == 3306:
+        # Saludo de MySQL: el primer texto imprimible es la versión
+        version = re.search(r'\d+\.\d+\.\d+[\w.-]*', banner)
+        return None, f"MySQL {version.group(0)}" if version else None
+    openssh = re.match(r'SSH-[\d.]+-OpenSSH_(\d+)\.(\d+)', banner)
+    if openssh and int(openssh.group(1)) < 8:
+        return "[!]", f"{banner.split()[0][:40]} (versión antigua)"
+    first_line = banner.splitlines()[0].strip() if banner.strip() else ''
+    return None, first_line[:50] or None
+
+async def _grab_banner(reader, writer, port: int) -> str:
+    import asyncio
+
+    probe = BANNER_PROBES[port]
+    if probe:
+        writer.write(probe)
+        await writer.drain()
+    data = await asyncio.wait_for(reader.read(512), BANNER_TIMEOUT)
+    return data.decode('latin-1', errors='replace')
+
+async def _probe_port(ip_address: str, port: int, limit: _AdaptiveLimit, banners: bool) -> Optional[Dict]:
+    """{'port', 'banner'} si el puerto está abierto; None si está cerrado o filtrado."""
+    import asyncio
+    import errno
+
+    while True:
+        async with limit:
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(ip_address, port), PORT_SCAN_TIMEOUT
+                )
+            except OSError as e:
+                if e.errno in (errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.EAGAIN):
+                    # Sin sockets: bajar la concurrencia y reintentar este puerto
+                    limit.shrink()
+                    continue
+                return None
+            except asyncio.TimeoutError:
+                return None
+
+            limit.grow()
+            banner = None
+            try:
+                if banners and port in BANNER_PROBES:
+                    banner = await _grab_banner(reader, writer, port)
+            except (OSError, asyncio.TimeoutError, UnicodeError):
+                pass
+            finally:
+                writer.close()
+            return {'port': port, 'banner': banner}
+
+async def _scan_ports(ip_address: str, ports: List[int], banners: bool) -> List[Dict]:
+    import asyncio
+
+    limit = _AdaptiveLimit(_initial_concurrency())
+    results = await asyncio.gather(*(_probe_port(ip_address, port, limit, banners) for port in ports))
+    return [r for r in results if r]
+
+def detailed_port_scan(ip_address: str, profile: Optional[str] = None) -> str:
+    """
+    Escanea los puertos del perfil (common, top100, web) con conexiones
+    asíncronas en paralelo: el tiempo total queda acotado por
+    PORT_SCAN_TIMEOUT (+ BANNER_TIMEOUT), no por la cantidad de puertos.
+    """
+    import asyncio
 
-def detailed_port_scan(ip_address: str) -> str:
-    """Escanea puertos comunes usando threading."""
+    profile = profile or PORT_PROFILE
+    if profile not in PORT_PROFILES:
+        profile = 'common'
+    ports = PORT_PROFILES[profile]
     report = ["\n--- PORT SCAN ---"]
-    open_ports_details = []
-    
-    with ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
-        futures = {executor.submit(scan_single_port, ip_address, port): port for port in COMMON_PORTS.keys()}
-        
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                port, service, advice, marker = result
-                open_ports_details.append((port, f"{marker} `{port}/{service}`: {advice}"))
-    
-    if open_ports_details:
-        # Ordenar por número de puerto
-        sorted_ports = sorted(open_ports_details, key=lambda x: x[0])
-        report.extend([detail for _, detail in sorted_ports])
-    else:
+
+    open_ports = asyncio.run(_scan_ports(ip_address, ports, BANNER_GRAB))
+
+    for result in sorted(open_ports, key=lambda r: r['port']):
+        port = result['port']
+        service, advice, marker = COMMON_PORTS.get(port, (f"Port {port}", "Servicio desconocido.", "❓"))
+        note = None
+        if result['banner']:
+            override, note = _interpret_banner(port, result['banner'])
+            marker = override or marker
+        line = f"{marker} `{port}/{service}`: {advice}"
+        if note:
+            line += f" `{note}`"
+        report.append(line)
+
+    if not open_ports:
         report.append("[OK] No se encontraron puertos de riesgo abiertos")
+    report.append(f"_Perfil {profile}: {len(ports)} puertos_")
         
     return "\n".join(report)
 
-def analyze_security_headers_and_ssl(domain: str) -> Tuple[str, dict]:
-    """Analiza cabeceras de seguridad y certificado SSL/TLS."""
+def analyze_security_headers_and_ssl(domain: str, page: Dict) -> str:
+    """Analiza cabeceras de seguridad y certificado SSL/TLS (a partir de fetch_target)."""
     report = ["\n--- SSL/SECURITY ---"]
-    response_headers = {}
-    
-    try:
-        response = requests.get(f"https://{domain}", headers=HEADERS, timeout=5, allow_redirects=True, verify=False)
+    import requests
+
+    response = page['response']
+    error = page['error']
+    if isinstance(error, requests.exceptions.Timeout):
+        report.append("[!] Timeout al conectar")
+    elif isinstance(error, requests.exceptions.SSLError) or page['scheme'] == 'http':
+        report.append("[!] HTTPS no disponible o SSL inválido")
+    elif error is not None:
+        report.append(f"[!] Error: {str(error)[:60]}")
+    else:
         response_headers = response.headers
-        
+
         server = response_headers.get('Server', 'No identificado')
         report.append(f"*Servidor:* `{server}`")
 
@@ -424,138 +825,469 @@ def analyze_security_headers_and_ssl(domain: str) -> Tuple[str, dict]:
             "X-Frame-Options": "[OK] Clickjacking protection",
             "X-Content-Type-Options": "[OK] MIME-sniffing protection"
         }
-        
+
         found_count = sum(1 for header in security_headers.keys() if header in response_headers)
-        
+
         if found_count > 0:
             report.append(f"*Headers Seguridad:* {found_count}/4 configurados")
         else:
             report.append("[!] Sin headers de seguridad")
 
-        # Certificado SSL
-        try:
-            context = ssl.create_default_context()
-            with socket.create_connection((domain, 443), timeout=5) as sock:
-                with context.wrap_socket(sock, server_hostname=domain) as ssock:
-                    cert = ssock.getpeercert()
-                    expire_date = datetime.strptime(cert['notAfter'], '%b %d %H:%M:%S %Y %Z')
-                    days_left = (expire_date - datetime.now()).days
-                    
-                    if days_left > 30:
-                        report.append(f"*SSL:* [OK] Válido ({days_left} días restantes)")
-                    else:
-                        report.append(f"*SSL:* [!] Expira pronto ({days_left} días)")
-                        
-        except ssl.SSLCertVerificationError:
+        # Certificado SSL del dominio pedido (primer salto, antes de redirecciones)
+        first_hop = response.history[0] if response.history else response
+        tls = getattr(first_hop, 'tls', None) or {}
+        if page['cert_valid'] is False:
             report.append("*SSL:* [X] Certificado inválido")
-        except:
-            pass
+        elif tls.get('cert'):
+            try:
+                expire_date = datetime.strptime(tls['cert']['notAfter'], '%b %d %H:%M:%S %Y %Z')
+                days_left = (expire_date - datetime.now()).days
 
-    except requests.exceptions.SSLError:
-        report.append("[!] HTTPS no disponible o SSL inválido")
-    except requests.exceptions.Timeout:
-        report.append("[!] Timeout al conectar")
-    except Exception as e:
-        report.append(f"[!] Error: {str(e)[:60]}")
-    
-    return "\n".join(report), response_headers
+                if days_left > 30:
+                    report.append(f"*SSL:* [OK] Válido ({days_left} días restantes)")
+                else:
+                    report.append(f"*SSL:* [!] Expira pronto ({days_left} días)")
+            except (KeyError, ValueError):
+                pass
+            issuer = dict(item for rdn in tls['cert'].get('issuer', ()) for item in rdn)
+            if issuer.get('organizationName') or issuer.get('commonName'):
+                report.append(f"*Emisor:* `{issuer.get('organizationName') or issuer.get('commonName')}`")
 
-def find_subdomains(domain: str) -> str:
-    """Busca subdominios usando crt.sh."""
-    report = ["\n--- SUBDOMAINS (crt.sh) ---"]
-    
+        # Versión TLS negociada (la misma conexión de fetch_target)
+        if tls.get('version') in ('TLSv1', 'TLSv1.1', 'SSLv3'):
+            report.append(f"*TLS:* [!] `{tls['version']}` obsoleto")
+        elif tls.get('version'):
+            report.append(f"*TLS:* [OK] `{tls['version']}`")
+
+    return "\n".join(report)
+
+def _iter_json_array(chunks):
+    """
+    Objetos de un arreglo JSON que llega por partes (bytes), a medida que se
+    completan, sin tener todo el documento en memoria.
+    """
+    import codecs
+
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    started = False
+    for chunk in chunks:
+        buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError('la respuesta no es un arreglo JSON')
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # Objeto incompleto: falta el resto del chunk siguiente
+                break
+            yield item
+    if started:
+        raise ValueError('arreglo JSON incompleto')
+
+def _stream_crtsh(domain: str, last_cert_id: Optional[int], resume: Optional[Tuple[int, int]] = None,
+                  known: Iterable[str] = ()) -> Dict:
+    """
+    Lee la respuesta de crt.sh por partes y devuelve
+    {'names': {nombre: id_certificado}, 'max_id', 'min_id', 'descending', 'reason'}.
+    `names` trae solo los nombres que no están en `known` (ya en ct_store), y
+    max_id/min_id son los ids más alto y más bajo que se procesaron (0 si ninguno).
+    Los certificados con id en `resume` (id_bajo, id_alto) ya se procesaron en
+    una lectura anterior cortada y se saltan.
+
+    reason:
+    - 'end': se leyó todo el arreglo.
+    - 'known': crt.sh entrega los certificados del más nuevo al más viejo y se
+      llegó a `last_cert_id`; lo que sigue ya está en ct_store.
+    - 'limit': se juntaron CT_MAX_NEW_NAMES nombres nuevos o se acabó
+      CT_STREAM_TIMEOUT; lo que falta se completa en la próxima consulta.
+    """
+    import http_client
+
+    known = set(known)
+    names = {}
+    max_id = 0
+    min_id = 0
+    prev_id = None
+    descending = True
+    reason = 'end'
+    deadline_at = time.monotonic() + CT_STREAM_TIMEOUT
+    suffix = '.' + domain
+
+    response = http_client.get(f"https://crt.sh/?q=%.{domain}&output=json",
+                               headers=HEADERS, timeout=(5, 10), retry=False, stream=True)
     try:
-        response = requests.get(f"https://crt.sh/?q=%.{domain}&output=json", headers=HEADERS, timeout=10)
         response.raise_for_status()
-        subdomains = set()
-        
-        for entry in response.json():
-            name_value = entry.get('name_value', '').lower().strip()
-            subdomains.update(name.strip() for name in name_value.split('\n') if name.strip())
-        
-        filtered_subdomains = sorted([s for s in subdomains if s != domain and '*' not in s])
-        
-        if filtered_subdomains:
-            displayed = filtered_subdomains[:MAX_SUBDOMAINS]
-            report.append(f"Encontrados: `{len(filtered_subdomains)}` (mostrando {len(displayed)})")
-            report.extend(f"- `{s}`" for s in displayed)
-            if len(filtered_subdomains) > MAX_SUBDOMAINS:
-                report.append(f"_... y {len(filtered_subdomains) - MAX_SUBDOMAINS} más_")
-        else:
-            report.append("No se encontraron subdominios")
-            
-    except requests.exceptions.Timeout:
-        report.append("[!] Timeout en búsqueda")
-    except:
-        report.append("[!] Error en búsqueda")
-        
+        for entry in _iter_json_array(response.iter_content(CT_CHUNK_SIZE)):
+            cert_id = entry.get('id') or 0
+            if prev_id is not None and cert_id > prev_id:
+                descending = False
+            prev_id = cert_id
+            if last_cert_id and cert_id <= last_cert_id:
+                if descending:
+                    reason = 'known'
+                    break
+                continue
+            if resume and resume[0] <= cert_id <= resume[1]:
+                continue
+            max_id = max(max_id, cert_id)
+            min_id = min(min_id, cert_id) if min_id else cert_id
+            for name in (entry.get('name_value') or '').lower().split('\n'):
+                name = name.strip()
+                if name.endswith(suffix) and '*' not in name and name not in names and name not in known:
+                    names[name] = cert_id
+            if len(names) >= CT_MAX_NEW_NAMES or time.monotonic() > deadline_at:
+                reason = 'limit'
+                break
+    finally:
+        response.close()
+
+    return {'names': names, 'max_id': max_id, 'min_id': min_id, 'descending': descending, 'reason': reason}
+
+
+def _resume_range(result: Dict, resume: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+    """
+    Rango de ids ya procesados tras una lectura cortada de crt.sh. Del más
+    nuevo al más viejo, la lectura pasó por los ids sobre `resume`, se saltó
+    `resume` y siguió hacia abajo: si lo cruzó, los dos quedan en un solo
+    rango; si no, el tramo recién leído reemplaza al anterior (lo que había
+    en él ya está en ct_store y no cuenta para el límite).
+    """
+    if not result['descending']:
+        return resume
+    if not result['max_id']:
+        return resume
+    low, high = result['min_id'], result['max_id']
+    if resume and low < resume[0]:
+        return low, max(high, resume[1])
+    return low, high
+
+def find_subdomains(domain: str) -> str:
+    """
+    Busca subdominios en certificate transparency (crt.sh). Responde desde
+    ct_store si la última consulta tiene menos de CT_REFRESH_TTL; si no, lee
+    de crt.sh solo los certificados nuevos y los agrega a la base.
+    """
+    report = ["\n--- SUBDOMAINS (crt.sh) ---"]
+    import requests
+    import ct_store
+
+    state = ct_store.state(domain) or {}
+    last_cert_id = state.get('last_cert_id')
+    resume = state.get('resume')
+    complete = state.get('complete', False)
+    fresh = not FRESH and state.get('checked_at') and time.time() - state['checked_at'] < CT_REFRESH_TTL
+    known = ct_store.subdomains(domain) if state else []
+    new_count = 0
+    problem = None
+
+    if not fresh:
+        try:
+            result = _stream_crtsh(domain, last_cert_id, resume, known)
+            new_count = len(result['names'])
+            finished = result['reason'] in ('end', 'known')
+            complete = finished
+            if finished:
+                # Todo lo procesado, incluido el rango de lecturas cortadas, queda bajo el límite
+                top = max(result['max_id'], resume[1] if resume else 0)
+                ct_store.record(domain, result['names'], last_cert_id=top or None, complete=True)
+            else:
+                ct_store.record(domain, result['names'], complete=False,
+                                resume=_resume_range(result, resume))
+            known = sorted(set(known) | set(result['names']))
+        except requests.exceptions.Timeout:
+            problem = "[!] Timeout en búsqueda"
+        except Exception:
+            problem = "[!] Error en búsqueda"
+
+    if problem and not known:
+        report.append(problem)
+        return "\n".join(report)
+    if problem:
+        report.append(f"{problem}; se muestra lo guardado")
+
+    if known:
+        displayed = known[:MAX_SUBDOMAINS]
+        total = f"`{len(known)}`" if complete else f"al menos `{len(known)}`"
+        report.append(f"Encontrados: {total} (mostrando {len(displayed)})")
+        report.extend(f"- `{s}`" for s in displayed)
+        if len(known) > MAX_SUBDOMAINS:
+            report.append(f"_... y {len(known) - MAX_SUBDOMAINS} más_")
+        if fresh:
+            minutes = int((time.time() - state['checked_at']) // 60)
+            report.append(f"_Base local (consultado hace {minutes} min)_")
+        elif new_count and state:
+            report.append(f"_{new_count} nuevos desde la última consulta_")
+    else:
+        report.append("No se encontraron subdominios")
+
     return "\n".join(report)
 
-def analyze_domain_complete(domain: str, ip_address: str) -> str:
-    """Análisis completo mejorado de un dominio."""
-    report = [f"[SEARCH] *Análisis de:* `{domain}` ({ip_address})\n"]
-    
-    # 1. Geolocalización mejorada
-    report.append(get_geolocation_info(ip_address))
-    
-    # 2. DNS Records completos
-    report.append(analyze_dns_records(domain))
-    
-    # 3. Blacklist check
-    report.append(check_blacklists(ip_address))
-    
-    # 4. Performance HTTP
-    report.append(analyze_http_performance(domain))
-    
-    # 5. SSL y Security Headers
-    ssl_report, headers = analyze_security_headers_and_ssl(domain)
-    report.append(ssl_report)
-    
-    # 6. Detección de tecnologías
-    report.append(detect_technologies_advanced(domain, headers))
-    
-    # 7. Robots.txt y Sitemap
-    report.append(analyze_robots_and_sitemap(domain))
-    
-    # 8. Port Scan
-    report.append(detailed_port_scan(ip_address))
-    
-    # 9. Subdominios
-    report.append(find_subdomains(domain))
-    
+def _to_section(section_id: str, text: str) -> Dict:
+    """'\\n--- TÍTULO ---\\nlínea...' -> {'id', 'title', 'lines'}"""
+    title, _, body = text.lstrip('\n').partition('\n')
+    return {
+        'id': section_id,
+        'title': title.strip('- ').strip(),
+        'lines': body.split('\n') if body else [],
+    }
+
+def _start_stage(section_id: str, func, *args) -> Future:
+    """
+    Lanza una etapa en su propio hilo y devuelve su Future. Los hilos son
+    daemon: una etapa colgada no impide que el proceso termine. Se llaman
+    'stage-*': si alguno sigue vivo al responder, worker.py se recicla en vez
+    de correr el comando siguiente junto a él. Sus etapas de timing quedan en
+    la corrida que las lanzó.
+    """
+    future = Future()
+    timing_run = timing.current()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            with timing.bind(timing_run), timing.span(f'stage.{section_id}'):
+                future.set_result(func(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f'stage-{section_id}', daemon=True).start()
+    return future
+
+def _with_page(func, domain: str, page_future: Future, deadline_at: float) -> str:
+    """Corre una etapa que lee la respuesta compartida de fetch_target."""
+    page = page_future.result(timeout=max(0, deadline_at - time.monotonic()))
+    return func(domain, page)
+
+def _collect_section(section_id: str, title: str, future: Future, deadline: float) -> Dict:
+    """Sección del reporte a partir del Future de su etapa (status: ok, timeout o error)."""
+    if not future.done() or isinstance(future.exception(), FuturesTimeoutError):
+        return {'id': section_id, 'title': title,
+                'lines': [f"[!] Sin respuesta en {deadline:.0f}s"], 'status': 'timeout'}
+    try:
+        result = future.result()
+    except Exception as e:
+        return {'id': section_id, 'title': title,
+                'lines': [f"[!] Error: {str(e)[:60]}"], 'status': 'error'}
+    return dict(_to_section(section_id, result), status='ok')
+
+def _section_cache_key(section_id: str, port_profile: Optional[str]) -> str:
+    """Clave de la sección en la caché; el escaneo depende del perfil de puertos."""
+    if section_id == 'ports':
+        return f"ports:{port_profile or PORT_PROFILE}"
+    return section_id
+
+def _cached_sections(domain: str, ip_address: str, port_profile: Optional[str]) -> Tuple[Dict, Dict]:
+    """
+    (secciones vigentes {id: sección}, entrada completa de la caché) para el
+    objetivo. La entrada guarda {clave: {'lines', 'at'}} y se reescribe al final.
+    """
+    from result_cache import read
+
+    entry, _ = read('net_sections', f'{domain}|{ip_address}')
+    entry = entry if isinstance(entry, dict) else {}
+    if FRESH:
+        return {}, entry
+
+    titles = dict(SECTIONS)
+    now = time.time()
+    hits = {}
+    for section_id, ttl in SECTION_CACHE_TTL.items():
+        cached = entry.get(_section_cache_key(section_id, port_profile))
+        if not cached or now - cached['at'] >= ttl:
+            continue
+        age = now - cached['at']
+        hits[section_id] = {
+            'id': section_id, 'title': titles[section_id], 'status': 'ok', 'cached': round(age),
+            'lines': cached['lines'] + [f"_Desde caché (hace {max(1, round(age / 60))} min)_"],
+        }
+    return hits, entry
+
+def _cacheable(section: Dict, page: Optional[Future]) -> bool:
+    """Solo se guardan secciones completas: etapa ok, sin líneas de falla y con portada."""
+    if section['id'] not in SECTION_CACHE_TTL or section['status'] != 'ok' or 'cached' in section:
+        return False
+    if any(_DEGRADED_RE.search(line) for line in section['lines']):
+        return False
+    if section['id'] in ('ssl', 'tech'):
+        return page is not None and page.done() and page.exception() is None \
+            and page.result()['response'] is not None
+    return True
+
+def _store_sections(domain: str, ip_address: str, port_profile: Optional[str],
+                    entry: Dict, sections: List[Dict], page: Optional[Future]):
+    from result_cache import write
+
+    now = time.time()
+    changed = False
+    for section in sections:
+        if _cacheable(section, page):
+            entry[_section_cache_key(section['id'], port_profile)] = {'lines': section['lines'], 'at': now}
+            changed = True
+    if changed:
+        write('net_sections', f'{domain}|{ip_address}', entry)
+
+def analyze_domain_complete(domain: str, ip_address: str, deadline: Optional[float] = None,
+                            port_profile: Optional[str] = None, on_section=None) -> Dict:
+    """
+    Análisis completo mejorado de un dominio: {'target', 'ip', 'sections': [...]}.
+    Las etapas corren en paralelo con un plazo total (STAGES_DEADLINE); las
+    secciones salen siempre en el orden de SECTIONS. `on_section(section)` se
+    llama con cada sección apenas su etapa termina (las que no alcanzan,
+    al vencer el plazo).
+
+    Las secciones de SECTION_CACHE_TTL que siguen vigentes en la caché no se
+    vuelven a calcular: salen de inmediato con 'cached' (segundos de
+    antigüedad). Con FRESH (--fresh) se recalcula todo.
+    """
+    deadline = STAGES_DEADLINE if deadline is None else deadline
+    deadline_at = time.monotonic() + deadline
+
+    collected, entry = _cached_sections(domain, ip_address, port_profile)
+
+    # http, ssl y tech comparten una sola petición a la portada
+    page = None
+    if not {'http', 'ssl', 'tech'} <= collected.keys():
+        page = _start_stage('fetch', fetch_target, domain)
+
+    stages = {
+        'geo': (get_geolocation_info, ip_address),
+        'dns': (analyze_dns_records, domain),
+        'blacklist': (check_blacklists, ip_address),
+        'http': (_with_page, analyze_http_performance, domain, page, deadline_at),
+        'ssl': (_with_page, analyze_security_headers_and_ssl, domain, page, deadline_at),
+        'tech': (_with_page, detect_technologies_advanced, domain, page, deadline_at),
+        'robots': (analyze_robots_and_sitemap, domain),
+        'ports': (detailed_port_scan, ip_address, port_profile),
+        'subdomains': (find_subdomains, domain),
+    }
+    futures = {
+        section_id: _start_stage(section_id, *stage)
+        for section_id, stage in stages.items() if section_id not in collected
+    }
+
+    titles = dict(SECTIONS)
+
+    if on_section is not None:
+        for section_id, _ in SECTIONS:
+            if section_id in collected:
+                on_section(collected[section_id])
+
+    def collect(section_id):
+        collected[section_id] = _collect_section(section_id, titles[section_id], futures[section_id], deadline)
+        if on_section is not None:
+            on_section(collected[section_id])
+
+    by_future = {future: section_id for section_id, future in futures.items()}
+    try:
+        for future in as_completed(by_future, timeout=max(0, deadline_at - time.monotonic())):
+            collect(by_future[future])
+    except FuturesTimeoutError:
+        pass
+    for section_id, _ in SECTIONS:
+        if section_id not in collected:
+            collect(section_id)
+
+    sections = [collected[section_id] for section_id, _ in SECTIONS]
+    _store_sections(domain, ip_address, port_profile, entry, sections, page)
+    return {'target': domain, 'ip': ip_address, 'sections': sections}
+
+def format_section(section: Dict) -> str:
+    return "\n".join([f"\n--- {section['title']} ---"] + section['lines'])
+
+def format_header(target: str, ip_address: str) -> str:
+    return f"[SEARCH] *Análisis de:* `{target}` ({ip_address})\n"
+
+def format_report(data: Dict) -> str:
+    """Texto para WhatsApp a partir de analyze_domain_complete()."""
+    report = [format_header(data['target'], data['ip'])]
+    report.extend(format_section(section) for section in data['sections'])
     return "\n".join(report)
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Uso: python net_analyzer.py <dominio_o_ip>", file=sys.stderr)
-        sys.exit(1)
+def _emit_record(record: Dict):
+    """Modo --stream: un registro por línea, enviado de inmediato."""
+    print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+def main():
+    json_mode, args = script_output.parse_argv()
+    stream_mode = STREAM_FLAG in args
+    args = [a for a in args if a != STREAM_FLAG]
+
+    def fail(message, file=None):
+        if stream_mode:
+            _emit_record({'type': 'error', 'error': message})
+            sys.exit(1)
+        script_output.fail('net_analyzer', SCHEMA_VERSION, message, json_mode, file=file)
+
+    global FRESH
+    FRESH = FRESH_FLAG in args
+    args = [a for a in args if a != FRESH_FLAG]
+
+    # --ports=<perfil>: common, top100 o web (por defecto NET_ANALYZER_PORT_PROFILE)
+    port_profile = next((a.split('=', 1)[1] for a in args if a.startswith('--ports=')), None)
+    args = [a for a in args if not a.startswith('--ports=')]
+    if len(args) != 1 or (port_profile and port_profile not in PORT_PROFILES):
+        fail(f"Uso: python net_analyzer.py <dominio_o_ip> [--ports={'|'.join(PORT_PROFILES)}] [{FRESH_FLAG}] [{STREAM_FLAG}]",
+             file=sys.stderr)
     
-    target = sys.argv[1].lower().strip()
+    target = args[0].lower().strip()
     
     # Validar entrada
     es_valido, es_ip, error = is_valid_domain_or_ip(target)
     if not es_valido:
-        print(f"[ERROR] {error}")
-        sys.exit(1)
+        fail(f"[ERROR] {error}")
     
     try:
         # Resolver IP si es dominio
         if not es_ip:
-            ip_address_str = socket.gethostbyname(target)
+            with timing.span('resolve'):
+                ip_address_str = socket.gethostbyname(target)
         else:
             ip_address_str = target
             try:
                 target = socket.gethostbyaddr(target)[0]
             except socket.herror:
                 pass
+
+        on_section = None
+        if stream_mode:
+            _emit_record({'type': 'start', 'target': target, 'ip': ip_address_str,
+                          'sections': [section_id for section_id, _ in SECTIONS],
+                          'text': format_header(target, ip_address_str)})
+
+            def on_section(section):
+                _emit_record({'type': 'section', 'section': section, 'text': format_section(section)})
         
         # Ejecutar análisis completo
-        full_report = analyze_domain_complete(target, ip_address_str)
-        print(full_report)
+        with timing.span('fetch'):
+            data = analyze_domain_complete(target, ip_address_str, port_profile=port_profile,
+                                           on_section=on_section)
         
     except socket.gaierror:
-        print(f"[ERROR] No se pudo resolver '{target}'")
-        sys.exit(1)
+        fail(f"[ERROR] No se pudo resolver '{target}'")
     except Exception as e:
-        print(f"[ERROR] {str(e)[:150]}")
-        sys.exit(1)
\ No newline at end of file
+        fail(f"[ERROR] {str(e)[:150]}")
+
+    if stream_mode:
+        _emit_record({'type': 'end', 'target': target, 'ip': ip_address_str,
+                      'status': {section['id']: section['status'] for section in data['sections']}})
+        return
+
+    script_output.emit('net_analyzer', SCHEMA_VERSION, data, format_report, json_mode)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
 # partidos.py
 import requests
+import http_client
+from result_cache import get_or_fetch
+import script_output
+import timing
 from datetime import datetime, timedelta
 import sys
 import io
@@ -15,6 +19,8 @@ LIGAS = {
 
 ZONA_HORARIA_CHILE = ZoneInfo('America/Santiago')
 
+SCHEMA_VERSION = 1
+
 # Traducción manual para no depender del sistema operativo (locale)
 DIAS_SEMANA = {0: "Lunes", 1: "Martes", 2: "Miércoles", 3: "Jueves", 4: "Viernes", 5: "Sábado", 6: "Domingo"}
 MESES = {1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio", 7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"}
@@ -25,83 +31,124 @@ def formatear_fecha(dt):
     mes = MESES[dt.month]
     return f"{dia}, {dt.day} de {mes}"
 
-def obtener_y_formatear_partidos(codigo_liga, fecha):
+def obtener_partidos(codigo_liga, fecha):
     """
     Obtiene los partidos de una liga para una fecha específica.
+    Cacheado por liga y día (result_cache), así repetir !partidos no vuelve a
+    consultar ESPN para cada uno de los días buscados.
     """
-    url = f"https://site.api.espn.com/apis/site/v2/sports/soccer/{codigo_liga}/scoreboard?dates={fecha.strftime('%Y%m%d')}"
+    dia = fecha.strftime('%Y%m%d')
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        return get_or_fetch('espn_scoreboard', f"v2:{codigo_liga}:{dia}", lambda: _descargar_partidos(codigo_liga, dia))
     except (requests.RequestException, ValueError):
         return []
 
-    partidos_formateados = []
+def _descargar_partidos(codigo_liga, dia):
+    url = f"https://site.api.espn.com/apis/site/v2/sports/soccer/{codigo_liga}/scoreboard?dates={dia}"
+    response = http_client.get(url)
+    response.raise_for_status()
+    return parsear_scoreboard(response.json())
+
+def parsear_scoreboard(data):
+    """Partidos del JSON de scoreboard de ESPN."""
+    partidos = []
     for evento in data.get("events", []):
         try:
             equipos_data = evento["competitions"][0]["competitors"]
-            equipo_local = equipos_data[0]["team"]["displayName"]
-            equipo_visitante = equipos_data[1]["team"]["displayName"]
-
-            estado_detalle = evento["status"]["type"]["shortDetail"]
-            estado_tipo = evento["status"]["type"]["state"]
-
-            if estado_tipo == "pre":
+            partido = {
+                "local": equipos_data[0]["team"]["displayName"],
+                "visitante": equipos_data[1]["team"]["displayName"],
+                "estado": evento["status"]["type"]["state"],
+                "detalle": evento["status"]["type"]["shortDetail"],
+            }
+
+            if partido["estado"] == "pre":
                 # Parseo manual ISO8601 para evitar dependencia de dateutil
                 hora_utc = datetime.fromisoformat(evento["date"].replace('Z', '+00:00'))
-                hora_chile = hora_utc.astimezone(ZONA_HORARIA_CHILE).strftime("%H:%M")
-                partidos_formateados.append(f"🏟️ *{equipo_local}* vs *{equipo_visitante}* _({hora_chile})_")
+                partido["hora"] = hora_utc.astimezone(ZONA_HORARIA_CHILE).strftime("%H:%M")
             else:
-                score_local = equipos_data[0].get("score", "0")
-                score_visitante = equipos_data[1].get("score", "0")
-                partidos_formateados.append(f"⚽ *{equipo_local}* {score_local} - {score_visitante} *{equipo_visitante}* _({estado_detalle})_")
+                partido["goles_local"] = equipos_data[0].get("score", "0")
+                partido["goles_visitante"] = equipos_data[1].get("score", "0")
+            partidos.append(partido)
         except (KeyError, IndexError):
             continue
-    return partidos_formateados
+    return partidos
 
-def main():
+def _jornada(fecha, partidos):
+    return {"fecha": fecha.strftime('%Y-%m-%d'), "partidos": partidos}
+
+def obtener_datos():
+    """
+    Partidos por liga: los de hoy y mañana o, si hoy no hay, los de la
+    próxima fecha con partidos dentro de los siguientes 7 días.
+    """
     fecha_hoy = datetime.now(ZONA_HORARIA_CHILE)
-    fecha_manana = fecha_hoy + timedelta(days=1)
+    ligas = []
 
     for nombre_liga, codigo in LIGAS.items():
-        print(f"\n*{nombre_liga}*")
-
-        # --- Partidos de hoy ---
-        partidos_de_hoy = obtener_y_formatear_partidos(codigo, fecha_hoy)
+        liga = {"nombre": nombre_liga, "codigo": codigo, "hoy": None, "manana": None, "proxima": None}
+        partidos_de_hoy = obtener_partidos(codigo, fecha_hoy)
+        liga["hoy"] = _jornada(fecha_hoy, partidos_de_hoy)
 
         if partidos_de_hoy:
-            print(f"📅 *Hoy*, {formatear_fecha(fecha_hoy)}:")
-            for partido in partidos_de_hoy:
-                print(partido)
-
             # --- Partidos de mañana (solo si hoy tiene partidos) ---
-            partidos_manana = obtener_y_formatear_partidos(codigo, fecha_manana)
-            if partidos_manana:
-                print(f"\n📅 *Mañana*, {formatear_fecha(fecha_manana)}:")
-                for partido in partidos_manana:
-                    print(partido)
-            else:
-                print(f"\n🚫 No hay partidos programados para mañana.")
-
+            fecha_manana = fecha_hoy + timedelta(days=1)
+            liga["manana"] = _jornada(fecha_manana, obtener_partidos(codigo, fecha_manana))
         else:
-            print(f"🚫 No hay partidos programados para hoy.")
-
             # Buscar la próxima fecha con partidos (desde mañana)
-            encontrado_futuro = False
             for i in range(1, 8):
                 fecha_futura = fecha_hoy + timedelta(days=i)
-                partidos_futuros = obtener_y_formatear_partidos(codigo, fecha_futura)
-
+                partidos_futuros = obtener_partidos(codigo, fecha_futura)
                 if partidos_futuros:
-                    print(f"📅 Próxima fecha: {formatear_fecha(fecha_futura)}")
-                    for partido in partidos_futuros:
-                        print(partido)
-                    encontrado_futuro = True
+                    liga["proxima"] = _jornada(fecha_futura, partidos_futuros)
                     break
 
-            if not encontrado_futuro:
-                print("🚫 _No se encontraron partidos en los próximos 7 días._")
+        ligas.append(liga)
+    return {"ligas": ligas}
+
+def formatear_partido(partido):
+    if partido["estado"] == "pre":
+        return f"🏟️ *{partido['local']}* vs *{partido['visitante']}* _({partido['hora']})_"
+    return (f"⚽ *{partido['local']}* {partido['goles_local']} - {partido['goles_visitante']} "
+            f"*{partido['visitante']}* _({partido['detalle']})_")
+
+def _fecha_de(jornada):
+    return formatear_fecha(datetime.strptime(jornada["fecha"], '%Y-%m-%d'))
+
+def formatear_partidos(datos):
+    """Texto para WhatsApp a partir de obtener_datos()."""
+    lineas = []
+    for liga in datos["ligas"]:
+        lineas.append(f"\n*{liga['nombre']}*")
+        hoy = liga["hoy"]
+
+        if hoy["partidos"]:
+            lineas.append(f"📅 *Hoy*, {_fecha_de(hoy)}:")
+            lineas.extend(formatear_partido(p) for p in hoy["partidos"])
+
+            manana = liga["manana"]
+            if manana and manana["partidos"]:
+                lineas.append(f"\n📅 *Mañana*, {_fecha_de(manana)}:")
+                lineas.extend(formatear_partido(p) for p in manana["partidos"])
+            else:
+                lineas.append(f"\n🚫 No hay partidos programados para mañana.")
+
+        else:
+            lineas.append(f"🚫 No hay partidos programados para hoy.")
+
+            proxima = liga["proxima"]
+            if proxima:
+                lineas.append(f"📅 Próxima fecha: {_fecha_de(proxima)}")
+                lineas.extend(formatear_partido(p) for p in proxima["partidos"])
+            else:
+                lineas.append("🚫 _No se encontraron partidos en los próximos 7 días._")
+    return "\n".join(lineas)
+
+def main():
+    json_mode, _ = script_output.parse_argv()
+    with timing.span('fetch'):
+        datos = obtener_datos()
+    script_output.emit('partidos', SCHEMA_VERSION, datos, formatear_partidos, json_mode)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
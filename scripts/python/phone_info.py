@@ -1,6 +1,7 @@
 import sys
 import json
 import requests
+import http_client
 import re
 import io
 
@@ -28,7 +29,7 @@ def get_phone_info(phone_number):
 
     try:
         # Agregamos timeout para evitar bloqueos
-        response = requests.post(url, headers=headers, data=data, timeout=15)
+        response = http_client.post(url, headers=headers, data=data)
         response.raise_for_status()  # Lanza una excepción para errores HTTP (ej. 404, 500)
         try:
             api_response = response.json()
@@ -2,22 +2,21 @@
 """
 proxpar.py
 Muestra los partidos de la jornada actual (y la siguiente si existe)
-de la Liga Chilena, scrapeando chile.as.com con Selenium.
+de la Liga Chilena, scrapeando chile.as.com con el navegador compartido
+(browser_pool).
 """
 import sys
 import io
 import re
 import time
-import requests
+import http_client
+import script_output
+import timing
+from result_cache import get_or_fetch
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+from html_parser import parse_subtree
+from browser_pool import lease_page
 
 # Salida UTF-8
 if sys.stdout.encoding != 'utf-8':
@@ -31,6 +30,8 @@ JORNADA_TPL = BASE_URL + "/resultados/futbol/chile/2026/jornada/regular_a_{n}/"
 
 ZONA_CL     = ZoneInfo("America/Santiago")
 
+SCHEMA_VERSION = 1
+
 # ──────────────────────────────────────────
 # Detectar jornada actual via ESPN
 # ──────────────────────────────────────────
@@ -39,9 +40,17 @@ def detectar_jornada_espn():
     Usa la API de ESPN para determinar cuántas jornadas se han disputado
     mirando el campo 'week.number' o buscando en eventos el número de semana.
     Devuelve un entero con el número de jornada estimado, o None.
+    El resultado se cachea (result_cache) porque cambia una vez por semana.
     """
     try:
-        r = requests.get(ESPN_URL, timeout=8)
+        return get_or_fetch('espn_jornada', 'chi.1', _consultar_jornada_espn)
+    except Exception:
+        return None
+
+
+def _consultar_jornada_espn():
+    try:
+        r = http_client.get(ESPN_URL)
         data = r.json()
 
         # Intentar leer week.number directamente
@@ -76,34 +85,30 @@ def detectar_jornada_por_fecha():
 
 
 # ──────────────────────────────────────────
-# Configuración de Selenium
+# Navegador (browser_pool)
 # ──────────────────────────────────────────
-def crear_driver():
-    opts = webdriver.ChromeOptions()
-    opts.add_argument("--headless")
-    opts.add_argument("--disable-gpu")
-    opts.add_argument("--log-level=3")
-    opts.add_argument("--no-sandbox")
-    opts.add_argument("--disable-dev-shm-usage")
-    opts.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    )
-    opts.add_experimental_option('excludeSwitches', ['enable-logging'])
-    return webdriver.Chrome(service=Service(), options=opts)
-
-
-def get_html(driver, url, timeout=14):
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+
+def get_html(page, url, timeout=14):
     """Carga una URL y espera que aparezca un bloque de día 'a_sd'."""
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
     try:
-        driver.get(url)
-        WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "a_sd"))
-        )
-        return driver.page_source
-    except TimeoutException:
+        with timing.span('browser.goto'):
+            page.goto(url, wait_until='domcontentloaded', timeout=30000)
+        with timing.span('browser.wait'):
+            page.wait_for_selector(".a_sd", state="attached", timeout=timeout * 1000)
+        return page.content()
+    except PlaywrightTimeoutError:
         # Devolver lo que haya aunque no haya partidos
-        return driver.page_source
+        try:
+            return page.content()
+        except Exception:
+            return ""
     except Exception:
         return ""
 
@@ -113,7 +118,7 @@ def numero_de_h1(html):
     Extrae el número de jornada desde el H1 de la página.
     Ej: 'Resultados jornada 3 Liga Chilena 2026' → 3
     """
-    soup = BeautifulSoup(html, "html.parser")
+    soup = parse_subtree(html, "h1")
     h1 = soup.find("h1")
     if h1:
         m = re.search(r"jornada\s+(\d+)", h1.text, re.IGNORECASE)
@@ -128,32 +133,33 @@ def numero_de_h1(html):
 def parsear_jornada(html):
     """
     Parsea el HTML de una página de jornada de AS.com.
-    Devuelve lista de strings formateados, o [] si no hay partidos.
+    Devuelve {'titulo', 'dias': [{'dia', 'partidos': [...]}]}, o None si no hay partidos.
+    Cada partido trae 'local', 'visitante', 'estado' y además 'hora' (por jugar)
+    o 'marcador' (en juego o finalizado).
     """
     if not html:
-        return []
+        return None
 
-    soup   = BeautifulSoup(html, "html.parser")
-    lineas = []
+    soup   = parse_subtree(html, "h1", "div.a_sd")
+    jornada = {"titulo": None, "dias": []}
 
     # Título
     titulo_tag = soup.find("h1")
     if titulo_tag:
         titulo = " ".join(titulo_tag.get_text().split())
         # AS.com a veces omite espacio entre número y nombre: "jornada 3Liga" → "jornada 3 Liga"
-        titulo = re.sub(r"(\d)([A-ZÁÉÍÓÚÜÑa-z])", r"\1 \2", titulo)
-        lineas.append(f"🏆 *{titulo}*")
+        jornada["titulo"] = re.sub(r"(\d)([A-ZÁÉÍÓÚÜÑa-z])", r"\1 \2", titulo)
 
 
     # Bloques por día
     day_blocks = soup.find_all("div", class_="a_sd")
     if not day_blocks:
-        return []
+        return None
 
     for bloque in day_blocks:
         dia_tag = bloque.find("h2", class_="a_sd_t")
-        if dia_tag:
-            lineas.append(f"\n📅 *{dia_tag.text.strip()}*")
+        dia = {"dia": dia_tag.text.strip() if dia_tag else None, "partidos": []}
+        jornada["dias"].append(dia)
 
         partidos = bloque.find_all("li", class_="a_sc_l_it")
         for partido in partidos:
@@ -179,28 +185,62 @@ def parsear_jornada(html):
                 estado = div_estado.text.strip() if div_estado else ""
 
                 if div_hora:
-                    hora = " ".join(div_hora.text.split())
-                    lineas.append(f"  🏟️ *{local}* vs *{visitante}* — {hora}")
+                    dia["partidos"].append({"local": local, "visitante": visitante, "estado": estado,
+                                            "hora": " ".join(div_hora.text.split())})
                 elif div_gol:
-                    marcador = " ".join(div_gol.text.split())
-                    if estado.lower() == "finalizado":
-                        lineas.append(f"  ✅ *{local}* {marcador} *{visitante}* _(FT)_")
-                    else:
-                        st = f" _({estado})_" if estado else ""
-                        lineas.append(f"  ▶️ *{local}* {marcador} *{visitante}*{st}")
+                    dia["partidos"].append({"local": local, "visitante": visitante, "estado": estado,
+                                            "marcador": " ".join(div_gol.text.split())})
 
             except AttributeError:
                 continue
 
+    return jornada
+
+
+def formatear_jornada(jornada):
+    """Líneas de texto para WhatsApp de una jornada de parsear_jornada()."""
+    lineas = []
+    if jornada["titulo"]:
+        lineas.append(f"🏆 *{jornada['titulo']}*")
+
+    for dia in jornada["dias"]:
+        if dia["dia"]:
+            lineas.append(f"\n📅 *{dia['dia']}*")
+        for p in dia["partidos"]:
+            if "hora" in p:
+                lineas.append(f"  🏟️ *{p['local']}* vs *{p['visitante']}* — {p['hora']}")
+            elif p["estado"].lower() == "finalizado":
+                lineas.append(f"  ✅ *{p['local']}* {p['marcador']} *{p['visitante']}* _(FT)_")
+            else:
+                st = f" _({p['estado']})_" if p["estado"] else ""
+                lineas.append(f"  ▶️ *{p['local']}* {p['marcador']} *{p['visitante']}*{st}")
     return lineas
 
 
+def formatear_jornadas(datos):
+    """Texto para WhatsApp: jornada actual y, si existe, la siguiente."""
+    num_jornada = datos["jornada"]
+    lineas = []
+
+    if datos["actual"]:
+        lineas.extend(formatear_jornada(datos["actual"]))
+    else:
+        lineas.append(f"🚫 No se encontraron datos para la Jornada {num_jornada}.")
+
+    if datos["siguiente"]:
+        lineas.append("\n" + "─" * 40)
+        lineas.extend(formatear_jornada(datos["siguiente"]))
+    else:
+        lineas.append(f"\n🚫 Aún no hay datos para la Jornada {num_jornada + 1}.")
+    return "\n".join(lineas)
+
+
 # ──────────────────────────────────────────
 # Main
 # ──────────────────────────────────────────
-def main():
-    driver = crear_driver()
-    try:
+def obtener_jornadas():
+    """Devuelve {'jornada': N, 'actual': jornada o None, 'siguiente': jornada o None}."""
+    with lease_page(user_agent=USER_AGENT) as page:
         # 1. Estimar jornada actual
         jornada_esp = detectar_jornada_espn()
         jornada_est = detectar_jornada_por_fecha()
@@ -209,7 +249,7 @@ def main():
 
         # 2. Verificar y ajustar: buscar la jornada real más cercana
         #    Cargamos la estimada; si el H1 dice otro número, lo usamos.
-        html_actual = get_html(driver, JORNADA_TPL.format(n=num_inicio))
+        html_actual = get_html(page, JORNADA_TPL.format(n=num_inicio))
         num_h1 = numero_de_h1(html_actual)
 
         # Si el H1 confirmó un número diferente al estimado, usar el del H1
@@ -217,33 +257,24 @@ def main():
             num_jornada = num_h1
             # Recargar con el numero correcto si no coincide
             if num_h1 != num_inicio:
-                html_actual = get_html(driver, JORNADA_TPL.format(n=num_jornada))
+                html_actual = get_html(page, JORNADA_TPL.format(n=num_jornada))
         else:
             num_jornada = num_inicio
 
-        # 3. Mostrar jornada actual
-        lineas = parsear_jornada(html_actual)
-        if lineas:
-            for l in lineas:
-                print(l)
-        else:
-            print(f"🚫 No se encontraron datos para la Jornada {num_jornada}.")
+        # 3. Jornada actual y 4. jornada siguiente (si existe)
+        actual = parsear_jornada(html_actual)
+        url_sig = JORNADA_TPL.format(n=num_jornada + 1)
+        siguiente = parsear_jornada(get_html(page, url_sig, timeout=10))
 
-        # 4. Mostrar jornada siguiente (si existe)
-        url_sig    = JORNADA_TPL.format(n=num_jornada + 1)
-        html_sig   = get_html(driver, url_sig, timeout=10)
-        lineas_sig = parsear_jornada(html_sig)
+    return {"jornada": num_jornada, "actual": actual, "siguiente": siguiente}
 
-        if lineas_sig:
-            print("\n" + "─" * 40)
-            for l in lineas_sig:
-                print(l)
-        else:
-            print(f"\n🚫 Aún no hay datos para la Jornada {num_jornada + 1}.")
 
-    finally:
-        driver.quit()
+def main():
+    json_mode, _ = script_output.parse_argv()
+    with timing.span('fetch'):
+        jornadas = obtener_jornadas()
+    script_output.emit('proxpar', SCHEMA_VERSION, jornadas, formatear_jornadas, json_mode)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,5 +1,6 @@
 # random_info.py (Versión JSON Estructurado)
 import requests
+import http_client
 import random
 from datetime import datetime
 import sys
@@ -7,8 +8,9 @@ import io
 import json
 import os
 from pathlib import Path
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
+from browser_pool import lease_page
+import timing
+from result_cache import get_or_fetch
 
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
@@ -19,56 +21,23 @@ DEFAULT_HEADERS = {
 
 # Variables de entorno
 NASA_API_KEY = os.getenv('NASA_API_KEY', 'DEMO_KEY')
-REQUEST_TIMEOUT = 10  # segundos
 
 # Resolver path dinámico del JSON
 SCRIPT_DIR = Path(__file__).parent.parent.parent
 GEEK_TERMS_PATH = SCRIPT_DIR / 'src' / 'data' / 'terminos_geek.json'
 
-# Cache y reintentos
+# Reintentos del navegador (la caché de cartelera vive en result_cache.py)
 import time
 
-CARTELERA_CACHE_PATH = SCRIPT_DIR / 'temp' / 'cartelera_cache.json'
-CARTELERA_TTL = 6 * 60 * 60  # 6 horas
 RETRIES = 3
 BACKOFF_FACTOR = 1.5
 
 def requests_get_with_retries(url, **kwargs):
-    """Wrapper de requests.get con reintentos exponenciales."""
-    timeout = kwargs.pop('timeout', REQUEST_TIMEOUT)
+    """GET con el cliente compartido (los reintentos los maneja http_client)."""
     headers = kwargs.pop('headers', DEFAULT_HEADERS)
-    attempt = 0
-    while attempt < RETRIES:
-        try:
-            resp = requests.get(url, headers=headers, timeout=timeout, **kwargs)
-            resp.raise_for_status()
-            return resp
-        except requests.exceptions.RequestException:
-            attempt += 1
-            if attempt >= RETRIES:
-                raise
-            sleep_time = BACKOFF_FACTOR ** attempt
-            time.sleep(sleep_time)
-
-def read_cartelera_cache():
-    try:
-        if not CARTELERA_CACHE_PATH.exists():
-            return None
-        data = json.loads(CARTELERA_CACHE_PATH.read_text(encoding='utf-8'))
-        ts = data.get('timestamp', 0)
-        if time.time() - ts > CARTELERA_TTL:
-            return None
-        return data.get('result')
-    except Exception:
-        return None
-
-def write_cartelera_cache(result):
-    try:
-        CARTELERA_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
-        payload = {'timestamp': time.time(), 'result': result}
-        CARTELERA_CACHE_PATH.write_text(json.dumps(payload, ensure_ascii=False), encoding='utf-8')
-    except Exception:
-        pass
+    resp = http_client.get(url, headers=headers, **kwargs)
+    resp.raise_for_status()
+    return resp
 
 # --- FUNCIONES (Retornan diccionario) ---
 
@@ -78,7 +47,7 @@ def get_efemeride():
         today = datetime.now()
         month, day = today.strftime("%m"), today.strftime("%d")
         url = f"https://es.wikipedia.org/api/rest_v1/feed/onthisday/events/{month}/{day}"
-        response = requests_get_with_retries(url, headers=DEFAULT_HEADERS, timeout=REQUEST_TIMEOUT)
+        response = requests_get_with_retries(url, headers=DEFAULT_HEADERS)
         eventos = response.json().get('events', [])
         if not eventos:
             return None
@@ -95,8 +64,7 @@ def get_fun_fact():
     try:
         response = requests_get_with_retries(
             "https://uselessfacts.jsph.pl/api/v2/facts/random?language=es",
-            headers=DEFAULT_HEADERS,
-            timeout=REQUEST_TIMEOUT
+            headers=DEFAULT_HEADERS
         )
         texto = response.json().get('text')
         if not texto:
@@ -113,8 +81,7 @@ def get_nasa_apod():
     try:
         response = requests_get_with_retries(
             f"https://api.nasa.gov/planetary/apod?api_key={NASA_API_KEY}",
-            headers=DEFAULT_HEADERS,
-            timeout=REQUEST_TIMEOUT
+            headers=DEFAULT_HEADERS
         )
         data = response.json()
         title = data.get('title', 'Foto astronómica')
@@ -140,8 +107,7 @@ def get_quote_of_the_day():
     try:
         response = requests_get_with_retries(
             "https://api.quotable.io/random?language=es",
-            headers=DEFAULT_HEADERS,
-            timeout=REQUEST_TIMEOUT
+            headers=DEFAULT_HEADERS
         )
         data = response.json()
         content = data.get('content')
@@ -158,31 +124,28 @@ def get_quote_of_the_day():
         return None
 
 def get_cartelera_cine():
-    """Obtiene la cartelera de películas de Cinépolis Chile."""
-    # Intentar leer cache primero
-    cached = read_cartelera_cache()
-    if cached:
-        return cached
+    """Obtiene la cartelera de películas de Cinépolis Chile (cacheada 6 h, con stale-while-revalidate)."""
+    try:
+        return get_or_fetch('cartelera', 'cinepolis', _descargar_cartelera)
+    except Exception:
+        return None
+
+def _descargar_cartelera():
+    """Scrapea la cartelera con el navegador compartido. Devuelve None si falla."""
+    # bs4 solo se necesita aquí; `streaming` y las APIs JSON no lo cargan
+    from bs4 import BeautifulSoup
 
     try:
         content = None
         last_exc = None
         for attempt in range(1, RETRIES + 1):
             try:
-                with sync_playwright() as p:
-                    # MEJORA: Argumentos para estabilidad en servidor (VPS/Linux)
-                    browser = p.chromium.launch(
-                        headless=True, 
-                        args=['--no-sandbox', '--disable-dev-shm-usage']
-                    )
-                    context = browser.new_context(user_agent=DEFAULT_HEADERS['User-Agent'])
-                    page = context.new_page()
-                    try:
+                with lease_page(user_agent=DEFAULT_HEADERS['User-Agent']) as page:
+                    with timing.span('browser.goto'):
                         page.goto("https://cinepolischile.cl/", wait_until='domcontentloaded', timeout=20000)
+                    with timing.span('browser.wait'):
                         page.wait_for_selector('div.titulo-pelicula', timeout=15000)
-                        content = page.content()
-                    finally:
-                        browser.close()
+                    content = page.content()
                 break
             except Exception as e:
                 last_exc = e
@@ -203,12 +166,10 @@ def get_cartelera_cine():
         if not peliculas:
             return None
 
-        result = {
+        return {
             "type": "text",
             "caption": f"🎬 *Cartelera de Cine Hoy*\n- " + "\n- ".join(peliculas[:8])
         }
-        write_cartelera_cache(result)
-        return result
     except Exception:
         return None
 
@@ -217,8 +178,7 @@ def get_geek_joke():
     try:
         response = requests_get_with_retries(
             "https://backend-omega-seven.vercel.app/api/getjoke",
-            headers=DEFAULT_HEADERS,
-            timeout=REQUEST_TIMEOUT
+            headers=DEFAULT_HEADERS
         )
         datos = response.json()
         if not datos or not isinstance(datos, list):
@@ -266,8 +226,7 @@ def get_cat_fact():
     try:
         response = requests_get_with_retries(
             "https://catfact.ninja/fact",
-            headers=DEFAULT_HEADERS,
-            timeout=REQUEST_TIMEOUT
+            headers=DEFAULT_HEADERS
         )
         fact = response.json().get('fact')
         if not fact:
@@ -285,8 +244,7 @@ def get_numero_random():
         num = random.randint(1, 9999)
         response = requests_get_with_retries(
             f"http://numbersapi.com/{num}",
-            headers=DEFAULT_HEADERS,
-            timeout=REQUEST_TIMEOUT
+            headers=DEFAULT_HEADERS
         )
         text = response.text.strip()
         if not text:
@@ -317,11 +275,11 @@ def get_streaming_trending():
             "query": "query GetPopularTitles($country: Country!, $language: Language!, $first: Int!, $popularTitlesFilter: TitleFilter, $sortBy: PopularTitlesSorting!) { popularTitles(country: $country first: $first sortBy: $sortBy filter: $popularTitlesFilter) { edges { node { id objectType content(country: $country language: $language) { title shortDescription originalReleaseYear } offers(country: $country platform: WEB) { package { clearName } } } } } }"
         }
 
-        resp = requests.post(url, json=payload, headers={
+        resp = http_client.post(url, json=payload, headers={
             **DEFAULT_HEADERS,
             'Content-Type': 'application/json',
             'Referer': 'https://www.justwatch.com/'
-        }, timeout=15)
+        })
 
         if resp.status_code != 200:
             return None
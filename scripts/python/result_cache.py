@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+result_cache.py
+Caché en disco para los resultados de los scripts (dicts, listas, textos),
+generalizando la caché de cartelera que tenía random_info.py.
+
+- Escrituras atómicas (archivo temporal + os.replace).
+- TTL por namespace (NAMESPACES) o por llamada.
+- stale-while-revalidate: pasado el TTL, y dentro de la ventana `swr`, se
+  devuelve el valor viejo al instante y se refresca en segundo plano.
+- stale-if-error: si la fuente falla (excepción o None) se sirve el valor viejo
+  mientras esté dentro de la ventana `sie`.
+- Expulsión LRU por namespace (MAX_ENTRIES) y tamaño total (RESULT_CACHE_MAX_MB).
+
+El refresco en segundo plano corre en un único hilo dedicado y solo dentro
+de worker.py (que llama a enable_background_refresh()), donde termina después
+de que el comando ya respondió. En una ejecución suelta el proceso tendría que
+esperarlo antes de salir, así que ahí se refresca en el momento. Si el
+refresco usó browser_pool, el navegador de ese hilo se cierra al terminar.
+
+Uso:
+    from result_cache import get_or_fetch, cached
+
+    valor = get_or_fetch('cartelera', 'cinepolis', _descargar_cartelera)
+
+    @cached('indicadores', ttl=600)
+    def obtener_indicadores():
+        ...
+"""
+import functools
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent.parent
+CACHE_DIR = Path(os.getenv('RESULT_CACHE_DIR', str(REPO_DIR / 'temp' / 'cache')))
+MAX_BYTES = int(float(os.getenv('RESULT_CACHE_MAX_MB', '20')) * 1024 * 1024)
+MAX_ENTRIES = 200
+
+# Valores por defecto (segundos) y configuración por namespace
+DEFAULT_TTL = 5 * 60
+DEFAULT_SIE = 24 * 60 * 60
+
+NAMESPACES = {
+    'cartelera': {'ttl': 6 * 60 * 60, 'swr': 18 * 60 * 60, 'sie': 3 * 24 * 60 * 60},
+    'indicadores': {'ttl': 10 * 60, 'swr': 50 * 60},
+    'espn_scoreboard': {'ttl': 60, 'swr': 4 * 60},
+    'espn_jornada': {'ttl': 60 * 60, 'swr': 5 * 60 * 60},
+}
+
+_refresher = None
+_background_refresh = False
+_in_flight = set()
+_lock = threading.Lock()
+
+
+def atomic_write(path, data):
+    """Escribe bytes en `path` sin dejar nunca un archivo a medias."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Lock exclusivo entre procesos sobre `path` (flock, o msvcrt en Windows).
+    Si el archivo no se puede abrir o bloquear se sigue sin lock.
+    """
+    path = Path(path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(path, 'a+b')
+    except OSError:
+        yield
+        return
+    try:
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        except OSError:
+            pass
+        yield
+    finally:
+        # Cerrar el archivo libera el lock
+        lock_file.close()
+
+
+def _entry_path(namespace, key):
+    digest = hashlib.sha256(str(key).encode('utf-8')).hexdigest()[:32]
+    return CACHE_DIR / namespace / f'{digest}.json'
+
+
+def locked(namespace, key):
+    """
+    Lock entre procesos para leer-modificar-escribir una entrada:
+        with result_cache.locked(ns, key):
+            valor, _ = result_cache.read(ns, key)
+            result_cache.write(ns, key, nuevo)
+    """
+    return file_lock(_entry_path(namespace, key).with_suffix('.lock'))
+
+
+def _settings(namespace, ttl, swr, sie):
+    conf = NAMESPACES.get(namespace, {})
+    ttl = ttl if ttl is not None else conf.get('ttl', DEFAULT_TTL)
+    swr = swr if swr is not None else conf.get('swr', ttl)
+    sie = sie if sie is not None else conf.get('sie', DEFAULT_SIE)
+    return ttl, swr, sie
+
+
+def read(namespace, key):
+    """Devuelve (valor, edad_en_segundos) o (None, None) si no hay entrada."""
+    path = _entry_path(namespace, key)
+    try:
+        data = json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None, None
+    if data.get('key') != str(key):
+        return None, None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data.get('value'), time.time() - data.get('stored_at', 0)
+
+
+def write(namespace, key, value):
+    """Guarda el valor (debe ser serializable a JSON). Nunca lanza por errores de disco."""
+    payload = {'key': str(key), 'stored_at': time.time(), 'value': value}
+    try:
+        atomic_write(_entry_path(namespace, key), json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+        _evict(CACHE_DIR / namespace)
+    except (OSError, TypeError, ValueError):
+        pass
+
+
+def invalidate(namespace, key):
+    try:
+        _entry_path(namespace, key).unlink()
+    except OSError:
+        pass
+
+
+def _evict(namespace_dir):
+    """LRU por cantidad de entradas en el namespace y por tamaño total."""
+    try:
+        entries = sorted(
+            ((p, p.stat()) for p in namespace_dir.glob('*.json')),
+            key=lambda item: item[1].st_mtime
+        )
+        for path, _ in entries[:max(0, len(entries) - MAX_ENTRIES)]:
+            path.unlink()
+
+        if not MAX_BYTES:
+            return
+        all_entries = sorted(
+            ((p, p.stat()) for p in CACHE_DIR.glob('*/*.json')),
+            key=lambda item: item[1].st_mtime
+        )
+        total = sum(st.st_size for _, st in all_entries)
+        for path, st in all_entries:
+            if total <= MAX_BYTES:
+                break
+            path.unlink()
+            total -= st.st_size
+    except OSError:
+        pass
+
+
+def _fetch_and_store(namespace, key, fetch):
+    value = fetch()
+    if value is not None:
+        write(namespace, key, value)
+    return value
+
+
+def enable_background_refresh():
+    """Lo llama worker.py: el proceso sigue vivo después de responder."""
+    global _background_refresh
+    _background_refresh = True
+
+
+def _release_thread_resources():
+    browser_pool = sys.modules.get('browser_pool')
+    if browser_pool is not None:
+        browser_pool.close_thread_pool()
+
+
+def _refresh_in_background(namespace, key, fetch):
+    global _refresher
+    token = (namespace, str(key))
+    with _lock:
+        if token in _in_flight:
+            return
+        _in_flight.add(token)
+        if _refresher is None:
+            _refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='result-cache')
+
+    def job():
+        import timing
+
+        try:
+            # Sin corrida asignada las etapas del refresco no se registran: si no,
+            # irían a la corrida global, que ya es la del comando siguiente
+            with timing.bind(None):
+                _fetch_and_store(namespace, key, fetch)
+        except Exception:
+            pass
+        finally:
+            _release_thread_resources()
+            with _lock:
+                _in_flight.discard(token)
+
+    _refresher.submit(job)
+
+
+def get_or_fetch(namespace, key, fetch, ttl=None, swr=None, sie=None):
+    """
+    Devuelve el valor cacheado o llama a `fetch()` (sin argumentos).
+    Un `fetch` que devuelve None se considera fallo: no se guarda y, si hay un
+    valor viejo dentro de la ventana stale-if-error, se devuelve ese.
+    """
+    ttl, swr, sie = _settings(namespace, ttl, swr, sie)
+    value, age = read(namespace, key)
+
+    if value is not None:
+        if age < ttl:
+            return value
+        if age < ttl + swr and _background_refresh:
+            _refresh_in_background(namespace, key, fetch)
+            return value
+
+    try:
+        fresh = _fetch_and_store(namespace, key, fetch)
+    except Exception:
+        if value is not None and age < ttl + sie:
+            return value
+        raise
+
+    if fresh is None and value is not None and age < ttl + sie:
+        return value
+    return fresh
+
+
+def cached(namespace, ttl=None, swr=None, sie=None):
+    """Decorador: la clave es la representación de los argumentos de la función."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = json.dumps([args, kwargs], sort_keys=True, default=str, ensure_ascii=False)
+            return get_or_fetch(
+                namespace, key, lambda: func(*args, **kwargs),
+                ttl=ttl, swr=swr, sie=sie
+            )
+        return wrapper
+    return decorator
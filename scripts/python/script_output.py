@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+script_output.py
+Modo --json común para los scripts de scripts/python.
+
+Cada script separa la obtención de datos (dicts/listas serializables) del
+formato para WhatsApp. Sin flag imprime el texto de siempre; con --json
+imprime un único sobre versionado:
+
+    {
+      "schema": "tabla",            # nombre del script sin .py
+      "version": 1,                 # versión del formato de `data` de ese script
+      "ok": true,
+      "generated_at": "2026-03-01T12:00:00-03:00",
+      "data": {...},                # datos estructurados
+      "text": "🏆 *Tabla...",        # el mismo texto que el modo normal
+      "error": null
+    }
+
+Si un script cambia la forma de `data` de manera incompatible, sube su
+SCHEMA_VERSION; Node rechaza versiones que no conoce.
+
+Uso:
+    import script_output
+
+    json_mode, args = script_output.parse_argv()
+    ...
+    script_output.emit('tabla', SCHEMA_VERSION, datos, formatear_tabla, json_mode)
+"""
+import json
+import sys
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import timing
+
+JSON_FLAG = '--json'
+ZONA_CL = ZoneInfo('America/Santiago')
+
+
+def parse_argv(argv=None):
+    """Devuelve (json_mode, argumentos sin el flag --json)."""
+    argv = sys.argv[1:] if argv is None else argv
+    return JSON_FLAG in argv, [a for a in argv if a != JSON_FLAG]
+
+
+def envelope(schema, version, data=None, text=None, error=None):
+    return {
+        'schema': schema,
+        'version': version,
+        'ok': error is None,
+        'generated_at': datetime.now(ZONA_CL).isoformat(timespec='seconds'),
+        'data': data,
+        'text': text,
+        'error': error,
+    }
+
+
+def emit(schema, version, data, formatear, json_mode):
+    """Imprime `formatear(data)` o, en modo JSON, el sobre con datos y texto."""
+    with timing.span('format'):
+        text = formatear(data)
+    if json_mode:
+        print(json.dumps(envelope(schema, version, data, text), ensure_ascii=False, default=str))
+    else:
+        print(text)
+
+
+def fail(schema, version, message, json_mode, exit_code=1, file=None):
+    """
+    Informa un error y termina con `exit_code`. En modo texto imprime el
+    mensaje tal cual (en `file`, stdout por defecto); en modo JSON, el sobre
+    con ok=false.
+    """
+    if json_mode:
+        print(json.dumps(envelope(schema, version, error=str(message)), ensure_ascii=False))
+    else:
+        print(message, file=file or sys.stdout)
+    sys.exit(exit_code)
@@ -1,6 +1,8 @@
 import sys
-import requests
-from bs4 import BeautifulSoup
+import http_client
+import script_output
+import timing
+from html_parser import parse_subtree
 import io
 from unidecode import unidecode
 
@@ -20,72 +22,95 @@ BANDERAS = {
     'Chile': '🇨🇱', 'Peru': '🇵🇪', 'Perú': '🇵🇪'
 }
 
-def main():
-    try:
-        response = requests.get(URL, headers=HEADERS, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
+SCHEMA_VERSION = 1
+
+
+class SinDatos(Exception):
+    """La página cargó pero no trae la tabla esperada."""
+
+
+def obtener_tabla():
+    """Devuelve [{'pos', 'equipo', 'bandera', 'puntos'}, ...] de las clasificatorias."""
+    response = http_client.get(URL, headers=HEADERS, cache=True)
+    response.raise_for_status()
+    
+    soup = parse_subtree(response.content, 'table.tabla-datos', 'table.a_tb')
+    
+    # Intentar encontrar la tabla con selectores comunes de AS
+    tabla = soup.find('table', class_='tabla-datos')
+    if not tabla:
+        tabla = soup.find('table', class_='a_tb') # Selector nuevo diseño
         
-        # Intentar encontrar la tabla con selectores comunes de AS
-        tabla = soup.find('table', class_='tabla-datos')
-        if not tabla:
-            tabla = soup.find('table', class_='a_tb') # Selector nuevo diseño
-            
-        if not tabla:
-            print("Error: No se encontró la tabla de posiciones.")
-            return
+    if not tabla:
+        raise SinDatos("Error: No se encontró la tabla de posiciones.")
+
+    equipos_data = []
+    tbody = tabla.find('tbody')
+    
+    if not tbody:
+        raise SinDatos("Error: Tabla sin contenido.")
 
-        equipos_data = []
-        tbody = tabla.find('tbody')
+    for i, row in enumerate(tbody.find_all('tr')):
+        # Nombre equipo
+        nombre_tag = row.find('span', class_='nombre-equipo')
+        if not nombre_tag:
+            nombre_tag = row.find('span', class_='a_tb_n')
         
-        if not tbody:
-             print("Error: Tabla sin contenido.")
-             return
-
-        for i, row in enumerate(tbody.find_all('tr')):
-            # Nombre equipo
-            nombre_tag = row.find('span', class_='nombre-equipo')
-            if not nombre_tag:
-                nombre_tag = row.find('span', class_='a_tb_n')
+        # Puntos
+        puntos_tag = row.find('td', class_='destacado')
+        if not puntos_tag:
+            puntos_tag = row.find('td', class_='--bd')
+
+        if nombre_tag and puntos_tag:
+            nombre = nombre_tag.text.strip()
+            puntos = puntos_tag.text.strip()
             
-            # Puntos
-            puntos_tag = row.find('td', class_='destacado')
-            if not puntos_tag:
-                puntos_tag = row.find('td', class_='--bd')
-
-            if nombre_tag and puntos_tag:
-                nombre = nombre_tag.text.strip()
-                puntos = puntos_tag.text.strip()
-                
-                # Buscar bandera
-                nombre_clean = unidecode(nombre)
-                bandera = "🏳️"
-                for pais, flag in BANDERAS.items():
-                    if pais in nombre_clean or nombre_clean in pais:
-                        bandera = flag
-                        break
-                
-                equipos_data.append({'pos': i + 1, 'equipo': nombre, 'bandera': bandera, 'puntos': puntos})
-
-        if not equipos_data:
-            print("No se pudieron extraer datos.")
-            return
-
-        print("🏆 *Clasificatorias Sudamericanas* 🏆\n")
-        print(f"`{'#':<2} {'Equipo':<12} {'Pts':>3}`")
-        print("`--------------------`")
-        
-        for e in equipos_data:
-            nombre_corto = e['equipo'][:12] # Truncar para que quepa en celular
-            linea = f"{e['pos']:<2} {nombre_corto:<12} {e['puntos']:>3}"
-            print(f"`{e['bandera']} {linea}`")
+            # Buscar bandera
+            nombre_clean = unidecode(nombre)
+            bandera = "🏳️"
+            for pais, flag in BANDERAS.items():
+                if pais in nombre_clean or nombre_clean in pais:
+                    bandera = flag
+                    break
             
-            if e['pos'] == 6: print("`--------------------` (Repechaje)")
-            elif e['pos'] == 7: print("`--------------------` (Eliminados)")
+            equipos_data.append({'pos': i + 1, 'equipo': nombre, 'bandera': bandera, 'puntos': puntos})
 
+    if not equipos_data:
+        raise SinDatos("No se pudieron extraer datos.")
+
+    return equipos_data
+
+
+def formatear_tabla(equipos_data):
+    """Texto para WhatsApp a partir de obtener_tabla()."""
+    lineas = [
+        "🏆 *Clasificatorias Sudamericanas* 🏆\n",
+        f"`{'#':<2} {'Equipo':<12} {'Pts':>3}`",
+        "`--------------------`",
+    ]
+    
+    for e in equipos_data:
+        nombre_corto = e['equipo'][:12] # Truncar para que quepa en celular
+        linea = f"{e['pos']:<2} {nombre_corto:<12} {e['puntos']:>3}"
+        lineas.append(f"`{e['bandera']} {linea}`")
+        
+        if e['pos'] == 6: lineas.append("`--------------------` (Repechaje)")
+        elif e['pos'] == 7: lineas.append("`--------------------` (Eliminados)")
+
+    return "\n".join(lineas)
+
+
+def main():
+    json_mode, _ = script_output.parse_argv()
+    try:
+        with timing.span('fetch'):
+            equipos_data = obtener_tabla()
+    except SinDatos as e:
+        script_output.fail('tclasi', SCHEMA_VERSION, str(e), json_mode, exit_code=0)
     except Exception as e:
-        print(f"Error al obtener la tabla: {e}")
+        script_output.fail('tclasi', SCHEMA_VERSION, f"Error al obtener la tabla: {e}", json_mode, exit_code=0)
+
+    script_output.emit('tclasi', SCHEMA_VERSION, equipos_data, formatear_tabla, json_mode)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+tech_fingerprints.py
+Detección de tecnologías web (CMS, frameworks, CDN, pagos...) a partir de la
+respuesta HTTP, para la sección TECHNOLOGIES de net_analyzer.
+
+Las firmas están en archivos JSON, no en el código:
+- data/tech_fingerprints*.json (las generales y las de Chile, *_cl.json);
+- más los *.json de TECHNOLOGY_FINGERPRINTS_DIR, si está definida.
+Un archivo posterior reemplaza una tecnología con el mismo nombre.
+
+Formato (un subconjunto del de Wappalyzer; los patrones son regex sin
+distinguir mayúsculas, y el primer grupo, si lo hay, es la versión):
+
+    "WordPress": {
+      "cats": "CMS",
+      "html": ["/wp-content/"],                       # en el HTML
+      "scripts": ["/wp-includes/"],                   # en el src de <script>
+      "meta": {"generator": "^WordPress ?([\\d.]+)?"},  # <meta name|property=...>
+      "headers": {"link": "api\\.w\\.org"},           # "" = basta que exista
+      "cookies": {"wordpress_logged_in_.*": ""},      # regex sobre el nombre
+      "implies": ["PHP"]
+    }
+
+Los archivos se validan y se juntan en un índice que queda serializado en
+temp/cache/tech_index.json; solo se rearma cuando cambia algún archivo. Para
+cada firma de HTML el índice guarda además el literal más largo que exige el
+patrón ('wp-content', 'cdn.shopify.com'...).
+
+Al detectar:
+- una sola pasada de regex sobre el documento junta los <script src> y <meta>,
+  que se comparan con una regex combinada por tipo (scripts, cada meta, cada
+  cabecera y las cookies), compilada una vez por proceso (en worker.py queda
+  compilada entre comandos);
+- las firmas de HTML se filtran primero por su literal sobre el documento en
+  minúsculas (búsqueda de substrings en C) y solo las candidatas corren su
+  regex. Una alternancia con todas las firmas sobre el documento completo es
+  cientos de veces más lenta: el motor de `re` prueba cada alternativa en
+  cada posición.
+
+Uso:
+    import tech_fingerprints
+    for tech in tech_fingerprints.detect(response.text, response.headers, cookie_names):
+        tech['name'], tech['version'], tech['cats']
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+try:
+    from re import _parser as _re_parser
+    from re._constants import LITERAL
+except ImportError:  # Python < 3.11
+    import sre_parse as _re_parser
+    from sre_constants import LITERAL
+
+from result_cache import CACHE_DIR, atomic_write
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+EXTRA_DIR = os.getenv('TECHNOLOGY_FINGERPRINTS_DIR')
+INDEX_FILE = CACHE_DIR / 'tech_index.json'
+# Subir si cambia la forma del índice
+INDEX_VERSION = 1
+
+FLAGS = re.IGNORECASE
+# Referencias hacia atrás: dejan de valer al combinar las regex
+_BACKREF_RE = re.compile(r'\\[1-9]|\(\?P=')
+# Literal mínimo para usar el prefiltro (más corto calza en casi cualquier página)
+MIN_LITERAL = 3
+# <script src=...> y <meta ...> del documento, en una pasada
+_TAGS_RE = re.compile(
+    r'<(?:script\b[^>]*?\bsrc\s*=\s*["\']?(?P<script>[^"\'\s>]+)|meta\b(?P<meta>[^>]*)>)', FLAGS
+)
+_META_ATTR_RE = re.compile(r'\b(name|property|http-equiv)\s*=\s*["\']([^"\']*)["\']', FLAGS)
+_META_CONTENT_RE = re.compile(r'\bcontent\s*=\s*["\']([^"\']*)["\']', FLAGS)
+
+_lock = threading.Lock()
+_engine = None
+
+
+def _sources():
+    paths = sorted(DATA_DIR.glob('tech_fingerprints*.json'))
+    if EXTRA_DIR:
+        paths.extend(sorted(Path(EXTRA_DIR).glob('*.json')))
+    return paths
+
+
+def _sources_digest(paths):
+    digest = hashlib.sha256(str(INDEX_VERSION).encode())
+    for path in paths:
+        st = path.stat()
+        digest.update(f'{path}:{st.st_mtime_ns}:{st.st_size}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _check(pattern):
+    """El patrón sin el sufijo '\\;version:...' de Wappalyzer, o None si no sirve."""
+    pattern = pattern.split('\\;', 1)[0]
+    if _BACKREF_RE.search(pattern):
+        return None
+    try:
+        # Dentro de una alternativa: descarta flags globales y grupos con nombre
+        re.compile(f'(?:{pattern})|(?P<_probe>)', FLAGS)
+    except re.error:
+        return None
+    return pattern
+
+
+def _required_literal(pattern):
+    """
+    El tramo literal más largo que todo calce de `pattern` tiene que contener
+    (en minúsculas), o None si no hay uno de al menos MIN_LITERAL caracteres.
+    Solo mira el nivel superior: lo que está dentro de grupos o repeticiones
+    corta el tramo.
+    """
+    best = current = ''
+    for op, value in _re_parser.parse(pattern):
+        if op is LITERAL:
+            current += chr(value)
+            continue
+        best = max(best, current, key=len)
+        current = ''
+    best = max(best, current, key=len)
+    return best.lower() if len(best) >= MIN_LITERAL else None
+
+
+def build_index(paths):
+    """Junta y valida las firmas de `paths` en un índice serializable."""
+    definitions = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            definitions.update(json.load(f))
+
+    index = {'version': INDEX_VERSION, 'techs': [], 'html': [], 'scripts': [],
+             'meta': {}, 'headers': {}, 'cookies': [], 'skipped': []}
+
+    def add(target, tid, name, kind, pattern, literal=False):
+        checked = _check(pattern)
+        if checked is None:
+            index['skipped'].append(f'{name}: {kind} {pattern!r}')
+        elif literal:
+            target.append([tid, checked, _required_literal(checked)])
+        else:
+            target.append([tid, checked])
+
+    for name, spec in sorted(definitions.items()):
+        tid = len(index['techs'])
+        index['techs'].append({'name': name, 'cats': spec.get('cats'), 'implies': spec.get('implies', [])})
+        for pattern in spec.get('html', []):
+            add(index['html'], tid, name, 'html', pattern, literal=True)
+        for pattern in spec.get('scripts', []):
+            add(index['scripts'], tid, name, 'scripts', pattern)
+        for key, pattern in spec.get('meta', {}).items():
+            add(index['meta'].setdefault(key.lower(), []), tid, name, f'meta {key}', pattern)
+        for key, pattern in spec.get('headers', {}).items():
+            add(index['headers'].setdefault(key.lower(), []), tid, name, f'header {key}', pattern)
+        for cookie in spec.get('cookies', {}):
+            add(index['cookies'], tid, name, 'cookie', cookie)
+    return index
+
+
+def load_index():
+    """Índice desde temp/cache si sigue vigente; si no, lo arma y lo guarda."""
+    paths = _sources()
+    digest = _sources_digest(paths)
+    try:
+        index = json.loads(INDEX_FILE.read_text(encoding='utf-8'))
+        if index.get('sources') == digest:
+            return index
+    except (OSError, ValueError):
+        pass
+
+    index = build_index(paths)
+    index['sources'] = digest
+    try:
+        atomic_write(INDEX_FILE, json.dumps(index, ensure_ascii=False).encode('utf-8'))
+    except OSError:
+        pass
+    return index
+
+
+def _combine(entries, prefix, wrap='{}'):
+    """
+    Una regex con una alternativa con nombre por patrón ('<prefix><n>') y el
+    mapa nombre -> (id de tecnología, patrón). None si no hay patrones.
+    """
+    if not entries:
+        return None, {}
+    groups = {}
+    alternatives = []
+    for n, (tid, pattern) in enumerate(entries):
+        name = f'{prefix}{n}'
+        groups[name] = (tid, pattern)
+        alternatives.append(f'(?P<{name}>{pattern})')
+    return re.compile(wrap.format('|'.join(alternatives)), FLAGS), groups
+
+
+class _Engine:
+    """Regex combinadas del índice, compiladas una vez por proceso."""
+
+    def __init__(self, index):
+        self.techs = index['techs']
+        self.skipped = index['skipped']
+        self.html = index['html']
+        self.scripts, self.script_groups = _combine(index['scripts'], 's')
+        self.meta = {key: _combine(entries, 'm') for key, entries in index['meta'].items()}
+        self.headers = {key: _combine(entries, 'x') for key, entries in index['headers'].items()}
+        self.cookies, self.cookie_groups = _combine(index['cookies'], 'c', '^(?:{})$')
+        self._regexes = {}
+
+    def _regex(self, pattern):
+        regex = self._regexes.get(pattern)
+        if regex is None:
+            regex = self._regexes[pattern] = re.compile(pattern, FLAGS)
+        return regex
+
+    def _version(self, pattern, text):
+        regex = self._regex(pattern)
+        if not regex.groups:
+            return None
+        match = regex.search(text)
+        return match.group(1) if match and match.group(1) else None
+
+    @staticmethod
+    def _add(found, tid, version):
+        if tid not in found or (version and not found[tid]):
+            found[tid] = version
+
+    def _scan(self, regex, groups, text, found):
+        if regex is None or text is None:
+            return
+        for match in regex.finditer(text):
+            name = match.lastgroup
+            if name not in groups:
+                continue
+            tid, pattern = groups[name]
+            self._add(found, tid, self._version(pattern, match.group(name)))
+
+    def detect(self, html, headers, cookies):
+        found = {}  # id de tecnología -> versión (o None)
+
+        for key, value in (headers or {}).items():
+            regex, groups = self.headers.get(key.lower(), (None, None))
+            self._scan(regex, groups, value, found)
+
+        for cookie in cookies or ():
+            self._scan(self.cookies, self.cookie_groups, cookie, found)
+
+        html = html or ''
+        for match in _TAGS_RE.finditer(html):
+            if match.group('script'):
+                self._scan(self.scripts, self.script_groups, match.group('script'), found)
+                continue
+            attrs = match.group('meta') or ''
+            key = _META_ATTR_RE.search(attrs)
+            content = _META_CONTENT_RE.search(attrs)
+            if key and content:
+                regex, groups = self.meta.get(key.group(2).lower(), (None, None))
+                self._scan(regex, groups, content.group(1), found)
+
+        lowered = html.lower()
+        for tid, pattern, literal in self.html:
+            if found.get(tid) or (literal and literal not in lowered):
+                continue
+            match = self._regex(pattern).search(html)
+            if match:
+                self._add(found, tid, match.group(1) if match.re.groups and match.group(1) else None)
+
+        # Implicancias (WooCommerce -> WordPress -> PHP)
+        by_name = {tech['name']: tid for tid, tech in enumerate(self.techs)}
+        pending = list(found)
+        while pending:
+            for implied in self.techs[pending.pop()]['implies']:
+                tid = by_name.get(implied)
+                if tid is not None and tid not in found:
+                    found[tid] = None
+                    pending.append(tid)
+
+        return sorted(
+            ({'name': self.techs[tid]['name'], 'version': version, 'cats': self.techs[tid]['cats']}
+             for tid, version in found.items()),
+            key=lambda tech: tech['name'].lower()
+        )
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = _Engine(load_index())
+    return _engine
+
+
+def detect(html, headers=None, cookies=None):
+    """
+    Tecnologías encontradas en el HTML, las cabeceras ({nombre: valor}) y los
+    nombres de cookies: [{'name', 'version', 'cats'}] ordenadas por nombre.
+    """
+    return get_engine().detect(html, headers, cookies)
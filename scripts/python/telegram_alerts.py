@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+telegram_alerts.py
+Registro local e incremental de las alertas del canal de Telegram
+@metrosantiagoalertas, para no bajar y parsear la página completa del canal
+en cada consulta.
+
+- Se recuerda el id del último mensaje visto (last_id). Cada sincronización
+  pide solo lo posterior con la vista web del canal (t.me/s/<canal>?after=<id>)
+  y parsea solo esa página; si no trae ids nuevos ni se parsea.
+- La primera vez se toma la página actual y se completa hacia atrás con
+  ?before=<id> (INITIAL_PAGES páginas).
+- Las alertas quedan en temp/telegram_alerts.json (TELEGRAM_ALERTS_PATH), sin
+  repetir ids y con las últimas MAX_ALERTS.
+- Una sincronización hecha hace menos de MIN_SYNC_INTERVAL no vuelve a la red.
+- sync() lee, completa y guarda el registro con un lock de archivo
+  (telegram_alerts.json.lock): dos workers que sincronizan a la vez no se
+  pisan las alertas, y el segundo ve la sincronización del primero.
+
+Si hubo más de SYNC_PAGE_LIMIT páginas nuevas, la siguiente sincronización
+sigue desde donde quedó.
+
+Uso como módulo:
+    import telegram_alerts
+
+    telegram_alerts.sync()                 # {'new': 2, 'error': None}
+    telegram_alerts.latest(5)              # [{'id', 'text', 'datetime'}], la más nueva primero
+    telegram_alerts.search('línea 1')      # las que contienen todas las palabras
+
+CLI:
+    python telegram_alerts.py [ultimas [N]] [--json]
+    python telegram_alerts.py buscar <texto> [--json]
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from unidecode import unidecode
+
+import script_output
+from result_cache import atomic_write, file_lock
+
+# requests/http_client y el parser HTML se importan al sincronizar: leer o
+# buscar en el registro, o una sincronización reciente, no paga su costo
+
+CHANNEL = 'metrosantiagoalertas'
+CHANNEL_URL = f'https://t.me/s/{CHANNEL}'
+
+REPO_DIR = Path(__file__).resolve().parent.parent.parent
+LOG_PATH = Path(os.getenv('TELEGRAM_ALERTS_PATH', str(REPO_DIR / 'temp' / 'telegram_alerts.json')))
+LOCK_PATH = LOG_PATH.with_name(LOG_PATH.name + '.lock')
+
+SCHEMA_VERSION = 1
+MAX_ALERTS = 500
+MIN_SYNC_INTERVAL = 30
+# La vista web entrega hasta ~20 mensajes por página
+PAGE_SIZE = 20
+SYNC_PAGE_LIMIT = 5
+INITIAL_PAGES = 3
+DEFAULT_LATEST = 5
+MAX_LATEST = 20
+
+_POST_ID_RE = re.compile(r'data-post="' + re.escape(CHANNEL) + r'/(\d+)"')
+
+# Entre hilos del mismo proceso; entre procesos, el lock de archivo
+_lock = threading.Lock()
+
+
+def parse_messages(html, after_id=0):
+    """Mensajes del HTML con id mayor que `after_id`: [{'id', 'text', 'datetime'}] por id."""
+    ids = [int(post_id) for post_id in _POST_ID_RE.findall(html)]
+    if not ids or max(ids) <= after_id:
+        return []
+
+    from html_parser import parse_subtree
+
+    soup = parse_subtree(html, 'div.tgme_widget_message_wrap')
+    messages = []
+    for wrap in soup.find_all('div', class_='tgme_widget_message_wrap'):
+        message = wrap.find('div', attrs={'data-post': True})
+        post_id = message['data-post'].rpartition('/')[2] if message else ''
+        if not post_id.isdigit() or int(post_id) <= after_id:
+            continue
+
+        text_div = wrap.find('div', class_='tgme_widget_message_text')
+        if not text_div:
+            # Foto o sticker sin texto: no es una alerta, pero el id cuenta como visto
+            messages.append({'id': int(post_id), 'text': None, 'datetime': None})
+            continue
+        raw_text = text_div.get_text(separator='\n', strip=True)
+
+        time_tag = wrap.find('time', attrs={'datetime': True})
+        messages.append({
+            'id': int(post_id),
+            'text': re.sub(r'\n+', '\n', raw_text).strip(),
+            'datetime': time_tag['datetime'] if time_tag else None,
+        })
+    return sorted(messages, key=lambda message: message['id'])
+
+
+def load():
+    """El registro en disco: {'last_id', 'checked_at', 'alerts'} (vacío si no existe)."""
+    try:
+        log = json.loads(LOG_PATH.read_text(encoding='utf-8'))
+        if log.get('version') == SCHEMA_VERSION:
+            return log
+    except (OSError, ValueError):
+        pass
+    return {'version': SCHEMA_VERSION, 'last_id': 0, 'checked_at': 0, 'alerts': []}
+
+
+def _save(log):
+    try:
+        atomic_write(LOG_PATH, json.dumps(log, ensure_ascii=False).encode('utf-8'))
+    except OSError:
+        pass
+
+
+@contextmanager
+def _log_lock():
+    """Exclusión entre hilos y procesos para leer-modificar-guardar el registro."""
+    # Sin lock de archivo (file_lock sigue sin él) al menos los hilos de este
+    # proceso no se pisan
+    with _lock, file_lock(LOCK_PATH):
+        yield
+
+
+def _fetch(params=None):
+    import http_client
+
+    response = http_client.get(CHANNEL_URL, params=params)
+    response.raise_for_status()
+    return response.text
+
+
+def _merge(log, messages):
+    """Agrega los mensajes nuevos al registro; devuelve cuántas alertas sumó."""
+    known = {alert['id'] for alert in log['alerts']}
+    added = [m for m in messages if m['text'] and m['id'] not in known]
+    if messages:
+        log['last_id'] = max(log['last_id'], messages[-1]['id'])
+    log['alerts'] = sorted(log['alerts'] + added, key=lambda alert: alert['id'])[-MAX_ALERTS:]
+    return len(added)
+
+
+def sync(force=False):
+    """
+    Trae las alertas posteriores a la última vista y las guarda.
+    Devuelve {'new': cantidad, 'error': mensaje o None}.
+    """
+    with _log_lock():
+        return _sync(force)
+
+
+def _sync(force):
+    log = load()
+    if not force and time.time() - log['checked_at'] < MIN_SYNC_INTERVAL:
+        return {'new': 0, 'error': None}
+
+    import requests
+
+    new = 0
+    error = None
+    try:
+        if not log['last_id']:
+            messages = parse_messages(_fetch())
+            new += _merge(log, messages)
+            for _ in range(INITIAL_PAGES - 1):
+                if not messages:
+                    break
+                messages = parse_messages(_fetch({'before': messages[0]['id']}))
+                new += _merge(log, messages)
+        else:
+            for _ in range(SYNC_PAGE_LIMIT):
+                messages = parse_messages(_fetch({'after': log['last_id']}), after_id=log['last_id'])
+                new += _merge(log, messages)
+                if len(messages) < PAGE_SIZE:
+                    break
+    except requests.exceptions.RequestException as e:
+        error = f'Error de conexión: {str(e)}'
+
+    if error is None:
+        log['checked_at'] = time.time()
+    if new or error is None:
+        _save(log)
+    return {'new': new, 'error': error}
+
+
+def latest(n=DEFAULT_LATEST):
+    """Las `n` alertas más recientes del registro, la más nueva primero."""
+    return load()['alerts'][::-1][:n]
+
+
+def _normalize(text):
+    return unidecode(text or '').lower()
+
+
+def search(query, n=10):
+    """Alertas que contienen todas las palabras de `query` (sin tildes ni mayúsculas)."""
+    words = _normalize(query).split()
+    found = [alert for alert in load()['alerts'][::-1]
+             if all(word in _normalize(alert['text']) for word in words)]
+    return found[:n]
+
+
+def age_seconds(alert):
+    """Segundos desde que se publicó la alerta (None si no se conoce)."""
+    try:
+        return max(0.0, time.time() - datetime.fromisoformat(alert['datetime']).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def local_time(alert, fmt='%H:%M hrs'):
+    """Hora de la alerta en Chile ('' si no se conoce)."""
+    try:
+        return datetime.fromisoformat(alert['datetime']).astimezone(script_output.ZONA_CL).strftime(fmt)
+    except (TypeError, ValueError):
+        return ''
+
+
+# --- CLI ---
+
+def format_alerts(data):
+    if not data['alerts']:
+        if data['query']:
+            return f"🔎 No hay alertas de Metro que mencionen \"{data['query']}\"."
+        return '📭 No hay alertas de Metro registradas.'
+    title = f"🔎 *Alertas de Metro con \"{data['query']}\"*" if data['query'] else '📢 *Últimas alertas de Metro*'
+    lines = [title]
+    for alert in data['alerts']:
+        when = local_time(alert, '%d-%m %H:%M')
+        lines.append(f"\n🕒 *{when}*" if when else '')
+        lines.append(f"_{alert['text']}_")
+    if data['error']:
+        lines.append(f"\n⚠️ No se pudo actualizar: {data['error']}")
+    return '\n'.join(lines)
+
+
+def main():
+    json_mode, args = script_output.parse_argv()
+    command = args[0] if args else 'ultimas'
+    rest = args[1:]
+
+    if command == 'ultimas' and len(rest) <= 1 and all(a.isdigit() for a in rest):
+        result = sync()
+        data = {'query': None, 'alerts': latest(min(int(rest[0]), MAX_LATEST) if rest else DEFAULT_LATEST)}
+    elif command == 'buscar' and rest:
+        result = sync()
+        data = {'query': ' '.join(rest), 'alerts': search(' '.join(rest))}
+    else:
+        script_output.fail('telegram_alerts', SCHEMA_VERSION,
+                           'Uso: python telegram_alerts.py [ultimas [N] | buscar <texto>]',
+                           json_mode, file=sys.stderr)
+
+    data['error'] = result['error']
+    script_output.emit('telegram_alerts', SCHEMA_VERSION, data, format_alerts, json_mode)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+timing.py
+Tiempos por etapa (spans) y perfilado opcional de los scripts de scripts/python.
+
+Los scripts marcan sus etapas con `timing.span('nombre')` y los módulos
+comunes ya marcan las suyas:
+- http_client: 'http' (con el host)
+- browser_pool: 'browser.launch' y 'browser.page'
+- html_parser: 'parse.html' (con el backend usado)
+- script_output: 'format'
+
+Con SCRIPT_TIMING=1 (Node lo define siempre) cada corrida termina con una
+línea en stderr que python.service.js recoge y quita de la salida:
+
+    @@timing {"script": "tabla.py", "pid": 123, "startup_ms": 61.2, "total_ms": 2310.4,
+              "spans": [{"name": "browser.launch", "start_ms": 70.1, "ms": 812.3}, ...]}
+
+- startup_ms: desde que Node lanzó el proceso hasta que se importó este
+  módulo (arranque del intérprete + imports previos). Solo aparece si Node
+  pasó SCRIPT_TIMING_T0 (epoch en ms).
+- start_ms es relativo al inicio de la corrida; `depth` indica anidamiento y
+  `error` el tipo de excepción si la etapa falló.
+
+Dentro de worker.py no se escribe esa línea: el worker llama a begin()/end()
+alrededor de cada petición y manda el registro en su respuesta.
+
+Perfilado: con SCRIPT_PROFILE=1 cada corrida se perfila con cProfile y queda
+un .prof por corrida en SCRIPT_PROFILE_DIR (por defecto temp/profiles/).
+Se revisa con `python -m pstats archivo.prof` o snakeviz. cProfile solo ve
+el hilo que lo inició.
+
+Uso:
+    import timing
+
+    with timing.span('fetch'):
+        html = obtener_html()
+
+    @timing.span('parse')
+    def parsear(html): ...
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+MARKER = '@@timing '
+
+ENABLED = os.getenv('SCRIPT_TIMING', '') not in ('', '0')
+PROFILE = os.getenv('SCRIPT_PROFILE', '') not in ('', '0')
+REPO_DIR = Path(__file__).resolve().parent.parent.parent
+PROFILE_DIR = Path(os.getenv('SCRIPT_PROFILE_DIR', str(REPO_DIR / 'temp' / 'profiles')))
+
+# Un script que hace cientos de peticiones no debe generar una línea gigante
+MAX_SPANS = 200
+
+_lock = threading.Lock()
+_local = threading.local()
+_NOT_BOUND = object()
+_profiles_written = 0
+
+
+class _Run:
+    """Etapas registradas en una corrida de un script."""
+
+    def __init__(self, script, startup_ms=None):
+        self.script = script
+        self.startup_ms = startup_ms
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self.profiler = None
+        # Cerrada con end(): las etapas que sigan corriendo ya no se registran
+        self.closed = False
+
+
+def _startup_ms():
+    t0 = os.getenv('SCRIPT_TIMING_T0')
+    if not t0:
+        return None
+    try:
+        return round(time.time() * 1000 - float(t0), 1)
+    except ValueError:
+        return None
+
+
+def _start_profile(run):
+    import cProfile
+
+    run.profiler = cProfile.Profile()
+    run.profiler.enable()
+
+
+def _stop_profile(run):
+    """Detiene el perfilador de `run` y devuelve la ruta del .prof (o None)."""
+    global _profiles_written
+    if run.profiler is None:
+        return None
+    run.profiler.disable()
+    _profiles_written += 1
+    stem = os.path.splitext(os.path.basename(run.script))[0] or 'script'
+    name = f"{stem}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{_profiles_written}.prof"
+    path = PROFILE_DIR / name
+    try:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        run.profiler.dump_stats(str(path))
+    except OSError:
+        return None
+    return str(path)
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Mide el bloque como la etapa `name`; `attrs` se agregan tal cual al
+    registro (deben ser serializables a JSON). Sin corrida activa no hace nada.
+    También sirve como decorador.
+    """
+    run = getattr(_local, 'run', _run)
+    if run is None or run.closed:
+        yield
+        return
+
+    depth = getattr(_local, 'depth', 0)
+    _local.depth = depth + 1
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _local.depth = depth
+        entry = {
+            'name': name,
+            'start_ms': round((start - run.started) * 1000, 1),
+            'ms': round((time.perf_counter() - start) * 1000, 1),
+        }
+        if depth:
+            entry['depth'] = depth
+        if error:
+            entry['error'] = error
+        entry.update(attrs)
+        with _lock:
+            if len(run.spans) < MAX_SPANS:
+                run.spans.append(entry)
+            else:
+                run.dropped += 1
+
+
+def _finish(run):
+    profile = _stop_profile(run)
+    record = {
+        'script': run.script,
+        'pid': os.getpid(),
+        'total_ms': round((time.perf_counter() - run.started) * 1000, 1),
+        'spans': run.spans,
+    }
+    if run.startup_ms is not None:
+        record['startup_ms'] = run.startup_ms
+    if run.dropped:
+        record['dropped_spans'] = run.dropped
+    if profile:
+        record['profile'] = profile
+    return record
+
+
+def current():
+    """La corrida a la que se asignan las etapas de este hilo (para pasarla a bind())."""
+    return getattr(_local, 'run', _run)
+
+
+@contextmanager
+def bind(run):
+    """
+    Asigna las etapas del hilo actual a `run` (de current() en el hilo que lo
+    lanzó). Así un hilo que sigue corriendo después de end() no mezcla sus
+    etapas con la corrida siguiente del worker: se descartan.
+    """
+    previous = getattr(_local, 'run', _NOT_BOUND)
+    _local.run = run
+    try:
+        yield
+    finally:
+        if previous is _NOT_BOUND:
+            del _local.run
+        else:
+            _local.run = previous
+
+
+def begin(script):
+    """Inicia la corrida de `script` (worker.py); reemplaza la anterior."""
+    global _run, _managed
+    _managed = True
+    _run = _Run(os.path.basename(script)) if (ENABLED or PROFILE) else None
+    if _run is not None and PROFILE:
+        _start_profile(_run)
+
+
+def end():
+    """Cierra la corrida iniciada con begin() y devuelve su registro (o None)."""
+    global _run
+    run, _run = _run, None
+    if run is None:
+        return None
+    run.closed = True
+    record = _finish(run)
+    return record if ENABLED else None
+
+
+@atexit.register
+def _emit_at_exit():
+    """Proceso por comando: escribe el registro de la corrida en stderr."""
+    if _managed or _run is None:
+        return
+    record = end()
+    if record is None:
+        return
+    try:
+        stream = sys.__stderr__ or sys.stderr
+        stream.write(MARKER + json.dumps(record, ensure_ascii=False) + '\n')
+        stream.flush()
+    except (OSError, ValueError):
+        pass
+
+
+# Proceso por comando: la corrida empieza al importar el módulo.
+# worker.py la reemplaza con begin() en cada petición.
+_managed = False
+_run = None
+if ENABLED or PROFILE:
+    _run = _Run(os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else 'python', _startup_ms())
+    if PROFILE:
+        _start_profile(_run)
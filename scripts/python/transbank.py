@@ -4,40 +4,30 @@ Script optimizado para obtener estado de Transbank.
 Sin caché local (delegado a Node.js), con soporte de zona horaria y manejo de errores.
 """
 import sys
-import json
-import requests
-from bs4 import BeautifulSoup
+import http_client
+import script_output
+import timing
+from html_parser import parse_subtree
 import io
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
 # Configurar salida UTF-8
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 # Configuración
 URL_TRANSBANK = 'https://status.transbankdevelopers.cl/'
-# Requests session con reintentos
-SESSION = requests.Session()
-RETRY_STRAT = Retry(
-    total=3,
-    backoff_factor=1,
-    status_forcelist=[429, 500, 502, 503, 504],
-    allowed_methods=["GET", "POST"]
-)
-ADAPTER = HTTPAdapter(max_retries=RETRY_STRAT)
-SESSION.mount("https://", ADAPTER)
-SESSION.mount("http://", ADAPTER)
-SESSION.headers.update({'User-Agent': 'Botillero/2.0'})
+HEADERS = {'User-Agent': 'Botillero/2.0'}
+
+SCHEMA_VERSION = 1
 
 def get_transbank_status():
     """Obtiene el estado de los servicios haciendo scraping."""
     try:
-        response = SESSION.get(URL_TRANSBANK, timeout=10)
+        response = http_client.get(URL_TRANSBANK, headers=HEADERS)
         response.raise_for_status()
 
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = parse_subtree(response.text, 'div.components-container')
         container = soup.find('div', class_='components-container')
 
         if not container:
@@ -65,51 +55,54 @@ def get_transbank_status():
     except Exception as e:
         raise e
 
+# Normalizar estados comunes
+NIVELES = {
+    'Operational': 'OK',
+    'Degraded Performance': 'WARN',
+    'Partial Outage': 'WARN',
+    'Major Outage': 'DOWN',
+    'Under Maintenance': 'MAINT',
+    'Investigating': 'WARN'
+}
+
+EMOJIS = {
+    'OK': '✅',
+    'WARN': '⚠️',
+    'DOWN': '❌',
+    'MAINT': '🛠️',
+    'UNKNOWN': '❓'
+}
+
+def obtener_estado():
+    """{'services': {nombre: estado}, 'updated_at': hora de Chile}"""
+    # Fecha en hora de Chile
+    now_chile = datetime.now(ZoneInfo('America/Santiago'))
+    return {
+        'services': get_transbank_status(),
+        'updated_at': now_chile.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+def formatear_estado(data):
+    """Formato texto para WhatsApp"""
+    output = "*Estado de Servicios Transbank*\n\n"
+    
+    for service, status in data['services'].items():
+        emoji = EMOJIS.get(NIVELES.get(status, 'UNKNOWN'), '❓')
+        output += f"{emoji} {service}: {status}\n"
+
+    output += f"\nActualizado: {data['updated_at']}"
+    return output
+
 def main():
+    json_output, _ = script_output.parse_argv()
     try:
-        json_output = '--json' in sys.argv
-        data = get_transbank_status()
-        
-        if json_output:
-            # Salida JSON pura para el monitoreo automático
-            print(json.dumps(data, ensure_ascii=False))
-            return
-
-        # Formato texto para WhatsApp
-        output = "*Estado de Servicios Transbank*\n\n"
-        
-        # Normalizar estados comunes
-        for service, status in data.items():
-            normalized = {
-                'Operational': 'OK',
-                'Degraded Performance': 'WARN',
-                'Partial Outage': 'WARN',
-                'Major Outage': 'DOWN',
-                'Under Maintenance': 'MAINT',
-                'Investigating': 'WARN'
-            }.get(status, 'UNKNOWN')
-            
-            emoji_map = {
-                'OK': '✅',
-                'WARN': '⚠️',
-                'DOWN': '❌',
-                'MAINT': '🛠️',
-                'UNKNOWN': '❓'
-            }
-            emoji = emoji_map.get(normalized, '❓')
-            output += f"{emoji} {service}: {status}\n"
-
-        # Fecha en hora de Chile
-        now_chile = datetime.now(ZoneInfo('America/Santiago'))
-        timestamp = now_chile.strftime('%Y-%m-%d %H:%M:%S')
-        output += f"\nActualizado: {timestamp}"
-        
-        print(output)
-        
+        with timing.span('fetch'):
+            data = obtener_estado()
     except Exception as e:
-        # Imprimir error en stderr y salir con código 1 para que Node.js lo detecte
-        print(f"Error: {str(e)}", file=sys.stderr)
-        sys.exit(1)
+        # Error en stderr y código 1 para que Node.js lo detecte
+        script_output.fail('transbank', SCHEMA_VERSION, f"Error: {str(e)}", json_output, file=sys.stderr)
+
+    script_output.emit('transbank', SCHEMA_VERSION, data, formatear_estado, json_output)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,8 +1,10 @@
 import asyncio
-import aiohttp
-from bs4 import BeautifulSoup
 import sys
 import requests
+import http_client
+from result_cache import cached
+import script_output
+import timing
 from datetime import datetime
 import io
 
@@ -14,6 +16,8 @@ HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
 }
 
+SCHEMA_VERSION = 1
+
 # Limitar el número de solicitudes simultáneas
 MAX_CONCURRENT_REQUESTS = 5
 
@@ -28,32 +32,37 @@ async def obtener_html(session, url):
         return None
 
 async def obtener_valor_google(session, url, semaphore):
+    from html_parser import parse_subtree
+
     async with semaphore:
         html = await obtener_html(session, url)
         if html:
-            soup = BeautifulSoup(html, 'html.parser')
+            soup = parse_subtree(html, 'div.YMlKec')
             div_valor = soup.find('div', class_='YMlKec fxKbKc')
             if div_valor:
                 return div_valor.text.strip().replace(",", "")
         return None
 
+# Código -> (etiqueta para WhatsApp, URL de Google Finance)
+DIVISAS = {
+    'USD': ('💵 USD (Google)', 'https://www.google.com/finance/quote/USD-CLP'),
+    'EUR': ('🇪🇺 EUR (Google)', 'https://www.google.com/finance/quote/EUR-CLP'),
+    'ARS': ('🇦🇷 ARS', 'https://www.google.com/finance/quote/ARS-CLP'),
+    'PEN': ('🇵🇪 PEN', 'https://www.google.com/finance/quote/PEN-CLP'),
+    'BOB': ('🇧🇴 BOB', 'https://www.google.com/finance/quote/BOB-CLP'),
+    'COP': ('🇨🇴 COP', 'https://www.google.com/finance/quote/COP-CLP'),
+    'JPY': ('🇯🇵 JPY', 'https://www.google.com/finance/quote/JPY-CLP'),
+    'BRL': ('🇧🇷 BRL', 'https://www.google.com/finance/quote/BRL-CLP'),
+}
+
 async def obtener_valores_divisas(session):
-    urls = {
-        '💵 USD (Google)': 'https://www.google.com/finance/quote/USD-CLP',
-        '🇪🇺 EUR (Google)': 'https://www.google.com/finance/quote/EUR-CLP',
-        '🇦🇷 ARS': 'https://www.google.com/finance/quote/ARS-CLP',
-        '🇵🇪 PEN': 'https://www.google.com/finance/quote/PEN-CLP',
-        '🇧🇴 BOB': 'https://www.google.com/finance/quote/BOB-CLP',
-        '🇨🇴 COP': 'https://www.google.com/finance/quote/COP-CLP',
-        '🇯🇵 JPY': 'https://www.google.com/finance/quote/JPY-CLP',
-        '🇧🇷 BRL': 'https://www.google.com/finance/quote/BRL-CLP'
-    }
+    """Devuelve {código: valor en CLP como texto o None}."""
     semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
     
     tasks = []
     keys = []
-    for name, url in urls.items():
-        keys.append(name)
+    for codigo, (_, url) in DIVISAS.items():
+        keys.append(codigo)
         tasks.append(obtener_valor_google(session, url, semaphore))
     
     resultados = await asyncio.gather(*tasks)
@@ -71,21 +80,24 @@ def formatear_con_decimales(valor):
     except (ValueError, TypeError):
         return str(valor)
 
+@cached('indicadores')
+def descargar_indicadores():
+    """Descarga de mindicador.cl solo los indicadores que mostramos (cacheado 10 min)."""
+    url = "https://mindicador.cl/api"
+    response = http_client.get(url, headers=HEADERS)
+    response.raise_for_status()
+    data = response.json()
+    return {nombre: data.get(nombre, {}) for nombre in ('uf', 'dolar', 'euro', 'utm', 'ipc')}
+
 def obtener_indicadores_mindicador():
-    """Obtiene los principales indicadores económicos desde mindicador.cl."""
+    """
+    Obtiene los principales indicadores económicos desde mindicador.cl.
+    Devuelve {'uf', 'dolar', 'euro', 'utm', 'ipc', 'ipc_fecha'} o {'error': mensaje}.
+    """
     try:
-        url = "https://mindicador.cl/api"
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-        # Formateamos los indicadores que nos interesan
-        uf = data.get('uf', {}).get('valor', 0)
-        dolar = data.get('dolar', {}).get('valor', 0)
-        euro = data.get('euro', {}).get('valor', 0)
-        utm = data.get('utm', {}).get('valor', 0)
+        data = descargar_indicadores()
+
         ipc_data = data.get('ipc', {})
-        ipc_valor = ipc_data.get('valor', 0)
         
         # Formateamos la fecha del IPC para mostrar Mes/Año
         ipc_fecha_str = ipc_data.get('fecha', '')
@@ -96,42 +108,69 @@ def obtener_indicadores_mindicador():
             except ValueError:
                 pass
         
-        reporte = [
-            f"🇨🇱 *UF:* ${formatear_con_separadores(uf)}",
-            f"💵 *Dólar (Obs):* ${formatear_con_separadores(dolar)}",
-            f"🇪🇺 *Euro (Obs):* ${formatear_con_separadores(euro)}",
-            f"🇨🇱 *UTM:* ${formatear_con_separadores(utm)}",
-            f"📈 *IPC ({ipc_fecha}):* {ipc_valor}%"
-        ]
-        return "\n".join(reporte)
-    except (requests.RequestException, KeyError) as e:
-        return f"⚠️ Error obteniendo indicadores oficiales: {e}"
-
-async def main():
+        return {
+            'uf': data.get('uf', {}).get('valor', 0),
+            'dolar': data.get('dolar', {}).get('valor', 0),
+            'euro': data.get('euro', {}).get('valor', 0),
+            'utm': data.get('utm', {}).get('valor', 0),
+            'ipc': ipc_data.get('valor', 0),
+            'ipc_fecha': ipc_fecha,
+        }
+    except (requests.RequestException, KeyError, ValueError) as e:
+        return {'error': str(e)}
+
+def formatear_indicadores(indicadores):
+    if 'error' in indicadores:
+        return f"⚠️ Error obteniendo indicadores oficiales: {indicadores['error']}"
+    reporte = [
+        f"🇨🇱 *UF:* ${formatear_con_separadores(indicadores['uf'])}",
+        f"💵 *Dólar (Obs):* ${formatear_con_separadores(indicadores['dolar'])}",
+        f"🇪🇺 *Euro (Obs):* ${formatear_con_separadores(indicadores['euro'])}",
+        f"🇨🇱 *UTM:* ${formatear_con_separadores(indicadores['utm'])}",
+        f"📈 *IPC ({indicadores['ipc_fecha']}):* {indicadores['ipc']}%"
+    ]
+    return "\n".join(reporte)
+
+async def obtener_datos():
     ahora = datetime.now()
-    fecha = ahora.strftime("%d-%m-%Y")
-    
-    print(f"📅 *Indicadores Económicos - {fecha}*\n")
     
     # 1. Indicadores Oficiales (Mindicador.cl)
-    print(obtener_indicadores_mindicador())
+    indicadores = obtener_indicadores_mindicador()
     
     # 2. Divisas en tiempo real (Google Finance)
+    import aiohttp
+
     async with aiohttp.ClientSession() as session:
-        valores_divisas = await obtener_valores_divisas(session)
+        divisas = await obtener_valores_divisas(session)
 
-        if any(valores_divisas.values()):
-            print("\n--- 🌎 *Divisas (Google Finance)* ---")
-            for nombre, valor in valores_divisas.items():
-                if valor:
-                    print(f"{nombre}: ${formatear_con_decimales(valor)}")
+    return {'fecha': ahora.strftime("%d-%m-%Y"), 'indicadores': indicadores, 'divisas': divisas}
+
+def formatear_valores(datos):
+    """Texto para WhatsApp a partir de obtener_datos()."""
+    lineas = [f"📅 *Indicadores Económicos - {datos['fecha']}*\n", formatear_indicadores(datos['indicadores'])]
+
+    if any(datos['divisas'].values()):
+        lineas.append("\n--- 🌎 *Divisas (Google Finance)* ---")
+        for codigo, valor in datos['divisas'].items():
+            if valor:
+                lineas.append(f"{DIVISAS[codigo][0]}: ${formatear_con_decimales(valor)}")
+    return "\n".join(lineas)
+
+def main():
+    json_mode, _ = script_output.parse_argv()
 
-if __name__ == "__main__":
     # Fix para Windows y asyncio
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
         
     try:
-        asyncio.run(main())
+        with timing.span('fetch'):
+            datos = asyncio.run(obtener_datos())
     except Exception as e:
-        print(f"Error en el script principal: {e}", file=sys.stderr)
+        script_output.fail('valores', SCHEMA_VERSION, f"Error en el script principal: {e}", json_mode,
+                           exit_code=0, file=sys.stderr)
+
+    script_output.emit('valores', SCHEMA_VERSION, datos, formatear_valores, json_mode)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+worker.py
+Proceso Python persistente que ejecuta los scripts de scripts/python sin
+pagar el arranque del intérprete ni las importaciones en cada comando.
+
+Protocolo (una línea JSON por mensaje, sobre stdin/stdout):
+  -> {"id": 1, "script": "metro.py", "args": ["--json"]}
+  <- {"id": 1, "code": 0, "stdout": "...", "stderr": "...", "timing": {...}}
+
+`timing` es el registro de etapas de timing.py (solo con SCRIPT_TIMING=1).
+Con "recycle": true el worker termina después de esa respuesta.
+
+Con "stream": true cada línea completa que el script escribe en stdout se
+reenvía al instante, antes de la respuesta final (que trae en `stdout` solo
+lo que quedó sin salto de línea):
+  <- {"id": 1, "line": "{\"type\": \"section\", ...}"}
+
+Cada script se compila una sola vez y se ejecuta como `__main__` con un
+namespace limpio por petición; las dependencias pesadas (bs4, requests,
+playwright...) quedan cargadas en sys.modules entre peticiones.
+El timeout por petición y el reinicio tras un fallo los maneja Node
+(src/services/python.service.js).
+
+Si al terminar una petición queda vivo algún hilo 'stage-*' (etapas de
+net_analyzer que no alcanzaron su plazo), el worker responde y se recicla:
+ese trabajo no sigue ocupando sockets y CPU durante el comando siguiente.
+"""
+import io
+import json
+import os
+import sys
+import threading
+import traceback
+
+import result_cache
+import timing
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Tras cuántas peticiones el worker se recicla solo (Node lo vuelve a levantar)
+MAX_REQUESTS = int(os.getenv('PYTHON_WORKER_MAX_REQUESTS', '200'))
+
+# Hilos que un script puede dejar corriendo al responder; si quedan, el worker se recicla
+LEFTOVER_THREAD_PREFIX = 'stage-'
+
+# Código compilado de cada script: {ruta: (mtime, code)}
+_CODE_CACHE = {}
+
+
+class _CaptureBuffer(io.BytesIO):
+    """BytesIO que sobrevive a que el wrapper de texto del script lo cierre."""
+
+    def close(self):
+        pass
+
+
+class _LineForwarder(_CaptureBuffer):
+    """
+    Buffer de stdout para peticiones con "stream": entrega cada línea
+    completa a `on_line` y guarda solo lo que queda después del último salto.
+    """
+
+    def __init__(self, on_line):
+        super().__init__()
+        self.on_line = on_line
+        self.pending = b''
+
+    def write(self, data):
+        data = bytes(data)
+        self.pending += data
+        while b'\n' in self.pending:
+            line, self.pending = self.pending.split(b'\n', 1)
+            self.on_line(line.decode('utf-8', errors='replace'))
+        return len(data)
+
+    def getvalue(self):
+        return self.pending
+
+
+def _open_protocol_channel():
+    """
+    Reserva el fd 1 original para el protocolo y redirige el fd 1 del proceso
+    a stderr, así cualquier escritura directa (chromedriver, subprocesos,
+    extensiones en C) no corrompe las respuestas.
+    """
+    protocol_fd = os.dup(1)
+    os.dup2(2, 1)
+    return io.open(protocol_fd, 'w', encoding='utf-8', newline='\n', buffering=1)
+
+
+def _load_code(script_path):
+    """Compila el script una vez y lo reutiliza mientras no cambie en disco."""
+    mtime = os.path.getmtime(script_path)
+    cached = _CODE_CACHE.get(script_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(script_path, 'rb') as f:
+        code = compile(f.read(), script_path, 'exec')
+    _CODE_CACHE[script_path] = (mtime, code)
+    return code
+
+
+def _exit_code(exc):
+    """Traduce un SystemExit al código de salida que vería el proceso."""
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code, file=sys.stderr)
+    return 1
+
+
+def run_script(script_name, args, on_line=None):
+    """
+    Ejecuta un script como si fuera `python -u script.py args...` y devuelve
+    (code, stdout, stderr, timing). Con `on_line`, stdout se entrega línea a
+    línea mientras el script corre (ver _LineForwarder).
+    """
+    script_path = os.path.join(SCRIPTS_DIR, os.path.basename(script_name))
+    if not os.path.isfile(script_path):
+        return 2, '', f"can't open file '{script_path}': [Errno 2] No such file or directory", None
+
+    out_buffer = _LineForwarder(on_line) if on_line else _CaptureBuffer()
+    err_buffer = _CaptureBuffer()
+    saved = (sys.stdout, sys.stderr, sys.stdin, sys.argv)
+
+    # Los scripts hacen `io.TextIOWrapper(sys.stdout.buffer, ...)`, así que el
+    # reemplazo debe exponer `.buffer` igual que la salida real.
+    sys.stdout = io.TextIOWrapper(out_buffer, encoding='utf-8', write_through=True)
+    sys.stderr = io.TextIOWrapper(err_buffer, encoding='utf-8', write_through=True)
+    sys.stdin = io.StringIO('')
+    sys.argv = [script_path, *args]
+
+    code = 0
+    timing.begin(script_path)
+    try:
+        namespace = {
+            '__name__': '__main__',
+            '__file__': script_path,
+            '__builtins__': __builtins__,
+        }
+        exec(_load_code(script_path), namespace)
+    except SystemExit as e:
+        code = _exit_code(e)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        # El script puede haber reemplazado sys.stdout por su propio wrapper
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+        stdout = out_buffer.getvalue().decode('utf-8', errors='replace')
+        stderr = err_buffer.getvalue().decode('utf-8', errors='replace')
+        sys.stdout, sys.stderr, sys.stdin, sys.argv = saved
+        record = timing.end()
+
+    return code, stdout, stderr, record
+
+
+def _has_leftover_threads():
+    return any(t.name.startswith(LEFTOVER_THREAD_PREFIX) and t.is_alive() for t in threading.enumerate())
+
+
+def main():
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.insert(0, SCRIPTS_DIR)
+
+    result_cache.enable_background_refresh()
+
+    channel = _open_protocol_channel()
+    # Aviso de arranque: Node espera esta línea antes de enviar trabajo
+    channel.write(json.dumps({'ready': True, 'pid': os.getpid()}) + '\n')
+
+    served = 0
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+        on_line = None
+        if request.get('stream'):
+            def on_line(text, request_id=request.get('id')):
+                channel.write(json.dumps({'id': request_id, 'line': text}, ensure_ascii=False) + '\n')
+
+        code, stdout, stderr, record = run_script(request.get('script', ''), request.get('args') or [], on_line)
+        response = {'id': request.get('id'), 'code': code, 'stdout': stdout, 'stderr': stderr}
+        if record is not None:
+            response['timing'] = record
+
+        served += 1
+        recycle = (MAX_REQUESTS and served >= MAX_REQUESTS) or _has_leftover_threads()
+        if recycle:
+            # Node no le manda más trabajo y levanta otro si hace falta
+            response['recycle'] = True
+        channel.write(json.dumps(response, ensure_ascii=False) + '\n')
+        if recycle:
+            break
+
+
+if __name__ == '__main__':
+    main()
@@ -160,6 +160,7 @@ const commandMap = {
     
     // Servicios públicos
     'metro': () => services.metro.getMetroStatus(),
+    'alertas': (_, msg) => services.metro.getMetroAlerts(msg.body.replace(/^([!/])alertas\s*/i, '')),
     'valores': () => services.economy.getEconomicIndicators(),
     'horoscopo': (client, msg) => handleHoroscopeCommand(client, msg, services.horoscope.getHoroscope.bind(services.horoscope)),
     'chino': (client, msg) => handleHoroscopeCommand(client, msg, services.horoscope.getChineseHoroscope.bind(services.horoscope)),
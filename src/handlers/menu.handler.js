@@ -19,6 +19,7 @@ function getMainMenu() {
 🎉 \`!feriados\` → Próximos feriados en Chile
 💊 \`!far [comuna]\` → Farmacias de turno
 🚇 \`!metro\` → Estado del Metro de Santiago
+📢 \`!alertas [n|texto]\` → Últimas alertas del Metro o buscar en ellas
 🌋 \`!sismos\` → Últimos sismos reportados
 🚌 \`!bus [paradero]\` → Llegada de micros RED
 ⚡ \`!sec\` / \`!secrm\` → Cortes de luz (nacional/RM)
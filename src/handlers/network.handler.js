@@ -7,13 +7,21 @@ const networkService = require('../services/network.service');
 
 const lookup = util.promisify(whois.lookup);
 
+// Las secciones que terminan con menos de esta diferencia salen en un mismo mensaje
+const STREAM_BATCH_MS = 1500;
+
 /**
- * Ejecuta el script de Python net_analyzer.py y devuelve el resultado.
+ * Ejecuta el script de Python net_analyzer.py y responde a medida que llegan
+ * las secciones: las rápidas (DNS, geolocalización...) salen de inmediato y
+ * las lentas (puertos, crt.sh) cuando terminan.
  * @param {import('whatsapp-web.js').Message} message - El objeto del mensaje original.
  */
 async function handleNetworkQuery(message) {
     // Limpieza robusta del comando usando Regex (igual que en otros handlers)
-    const query = message.body.replace(/^([!/])\w+\s*/i, '').trim();
+    // `--fresh` al final vuelve a consultar todo en vez de usar lo guardado en caché
+    const tokens = message.body.replace(/^([!/])\w+\s*/i, '').trim().split(/\s+/);
+    const fresh = tokens.length > 1 && tokens[tokens.length - 1] === '--fresh';
+    const query = (fresh ? tokens.slice(0, -1) : tokens).join(' ');
 
     if (!query) {
         return message.reply("Debes ingresar un dominio o IP. Ejemplo: `!whois google.cl`");
@@ -29,11 +37,48 @@ async function handleNetworkQuery(message) {
     // Enviamos un mensaje de espera para notificar al usuario.
     await message.reply(`Consultando información de red para *${query}*. Esto puede tardar un momento... ⌛`);
 
+    let header = '';
+    let pending = [];
+    let timer = null;
+    let sending = Promise.resolve();
+    let sentAny = false;
+
+    // Manda juntas las secciones acumuladas, en orden, sin pisar un envío en curso
+    const flush = () => {
+        clearTimeout(timer);
+        timer = null;
+        if (!pending.length) return sending;
+        const text = (header + pending.join('\n')).trim();
+        header = '';
+        pending = [];
+        sentAny = true;
+        sending = sending
+            .then(() => message.reply(text))
+            .catch(err => console.error(`Error enviando sección de red: ${err.message}`));
+        return sending;
+    };
+
     try {
         // Delegamos la lógica al servicio
-        const result = await networkService.analyzeDomain(query);
-        await message.reply(result);
+        const { finished, error } = await networkService.analyzeDomainStream(query, { fresh }, (record) => {
+            if (record.type === 'start') {
+                header = record.text;
+            } else if (record.type === 'section') {
+                pending.push(record.text);
+                if (!timer) timer = setTimeout(flush, STREAM_BATCH_MS);
+            }
+        });
+        await flush();
+
+        if (error) {
+            await message.reply(`❌ ${error}`);
+        } else if (!finished) {
+            await message.reply(sentAny
+                ? `⚠️ El análisis de "${query}" se cortó antes de terminar.`
+                : `❌ Hubo un error al analizar "${query}".`);
+        }
     } catch (error) {
+        clearTimeout(timer);
         console.error(`Error en handleNetworkQuery: ${error.message}`);
         await message.reply(`❌ Hubo un error al analizar "${query}".`);
     }
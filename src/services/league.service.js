@@ -52,7 +52,7 @@ async function getLeagueUpcomingMatches() {
 
     try {
         console.log(`(Servicio Liga) -> Ejecutando proxpar.py...`);
-        // Aumentamos el timeout a 60s porque Selenium puede ser lento
+        // Aumentamos el timeout a 60s porque carga dos páginas con el navegador headless
         const result = await pythonService.executeScript('proxpar.py', [], { timeout: 60000 });
         if (result.code !== 0) {
             throw new Error(result.stderr || 'Error al ejecutar proxpar.py');
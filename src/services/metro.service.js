@@ -1,81 +1,65 @@
 /**
- * Servicio mejorado de Metro con análisis inteligente
- * Usa IA para sugerir rutas alternativas cuando hay problemas
+ * Servicio mejorado de Metro
+ * Las rutas alternativas cuando hay problemas las calcula metro.py en local
+ * (metro_routes.py) y vienen incluidas en el texto
  */
 "use strict";
 
 const pythonService = require('./python.service');
-const { GoogleGenerativeAI } = require('@google/generative-ai');
-const rateLimiter = require('./rate-limiter.service');
 
 const METRO_SCRIPT_NAME = 'metro.py';
-// Inicializamos solo si hay key, para evitar errores si no está configurada
-const genAI = process.env.GEMINI_API_KEY ? new GoogleGenerativeAI(process.env.GEMINI_API_KEY) : null;
-
-// Variables para caché (evita ejecutar Python/IA innecesariamente)
+const METRO_SCHEMA_VERSION = 1; // versión de `data` de metro.py --json que entiende este servicio
+const ALERTS_SCRIPT_NAME = 'telegram_alerts.py';
+const ALERTS_SCHEMA_VERSION = 1;
+// Variables para caché (evita ejecutar Python innecesariamente)
 let metroCache = null;
 let lastUpdate = 0;
 const CACHE_TTL = 60 * 1000; // 1 minuto de caché
 
-let monitoringInterval = null;
+// Monitoreo: un metro.py --watch residente que avisa solo cuando cambia algo
+const WATCH_RESTART_MS = 60 * 1000; // espera antes de relanzarlo si se cae
+let watcher = null;
+let watchRestartTimer = null;
+let watchTarget = null; // { client, chatId } mientras el monitoreo está activo
+let alertQueue = Promise.resolve(); // los avisos salen en orden, uno a la vez
 let lastAlertState = false; // false = normal, true = en alerta (para no repetir mensajes)
 
 /**
- * Obtiene el estado bruto del metro desde el script Python
+ * Obtiene el estado del metro desde el script Python en modo --json.
+ * Devuelve { data, text } (datos estructurados y texto para WhatsApp) o null.
  */
 async function getMetroStatusRaw() {
     try {
         console.log(`(Servicio Metro) -> Ejecutando ${METRO_SCRIPT_NAME}...`);
-        const result = await pythonService.executeScript(METRO_SCRIPT_NAME);
+        const envelope = await pythonService.executeJson(METRO_SCRIPT_NAME, [], { maxVersion: METRO_SCHEMA_VERSION });
         
-        if (result.code !== 0) {
-            console.error(`Error al ejecutar metro.py: ${result.stderr}`);
+        if (!envelope.ok) {
+            console.error(`Error al ejecutar metro.py: ${envelope.error}`);
             return null;
         }
         
-        return result.stdout;
+        return { data: envelope.data, text: envelope.text };
     } catch (error) {
         console.error("Error en el servicio de Metro:", error.message);
         return null;
     }
 }
 
+const CLOSURE_PATTERN = /cerrad|cierre|suspendid|suspensi/i;
+
 /**
- * Genera recomendaciones inteligentes basadas en el estado del metro
+ * ¿Hay cierres o suspensiones (no solo retrasos)? Como antes, también cuenta
+ * un cierre anunciado solo en la última alerta de Telegram (salvo que sea una
+ * alerta guardada porque el canal no respondió: stale).
  */
-async function generateMetroAdvice(metroStatus) {
-    if (!genAI) {
-        return null;
-    }
-
-    try {
-        const model = genAI.getGenerativeModel({ model: "gemini-2.5-flash" });
-
-        const prompt = `
-Eres "Botillero", un asistente inteligente de Metro. Analiza el siguiente estado del Metro de Santiago y da CONSEJO CORTO y PRÁCTICO.
-
-Estado actual del Metro:
-${metroStatus}
-
-Tu tarea:
-1. Si TODO está normal: Responde "✅ Metro operando normal, compa."
-2. Si hay PROBLEMAS: Identifica qué líneas están fallando
-3. Da UNA alternativa de ruta rápida (máximo 1-2 líneas de recomendación)
-4. Usa lenguaje coloquial chileno
-5. Responde SOLO el consejo, sin explicaciones adicionales
-6. Máximo 2 líneas
-
-Ejemplo de respuesta:
-"⚠️ Línea 1 con delays. Usa L4 hacia Mapocho, luego L2 a Puente Cal y Canto."
-        `;
-
-        const result = await model.generateContent(prompt);
-        const response = await result.response;
-        return response.text();
-    } catch (error) {
-        console.error('Error al generar consejo del metro:', error.message);
-        return null;
-    }
+function hasClosures(data) {
+    const metroClosed = (data.metro.lines || []).some(line =>
+        line.has_problems && (CLOSURE_PATTERN.test(line.status) || line.problems.some(p => CLOSURE_PATTERN.test(p)))
+    );
+    const metrotrenClosed = (data.metrotren.problems || []).some(p => CLOSURE_PATTERN.test(p.status));
+    const telegram = data.telegram || {};
+    const telegramClosed = !!telegram.text && !telegram.stale && CLOSURE_PATTERN.test(telegram.text);
+    return metroClosed || metrotrenClosed || telegramClosed;
 }
 
 /**
@@ -95,27 +79,8 @@ async function getMetroStatus() {
             return "⚠️ No pude obtener el estado del metro en este momento.";
         }
 
-        let response = metroStatus;
-
-        // Si hay problemas detectados y no estamos en cooldown, agregar análisis con IA
-        const lowerStatus = metroStatus.toLowerCase();
-        const errorKeywords = ['problema', 'delay', 'suspendido', 'cierre', 'retraso', 'falla', 'interrupción', 'cerrada', 'parcial'];
-        
-        if (errorKeywords.some(keyword => lowerStatus.includes(keyword))) {
-            
-            const limit = rateLimiter.tryAcquire();
-            if (limit.success && genAI) {
-                try {
-                    const advice = await generateMetroAdvice(metroStatus);
-                    if (advice) {
-                        response += `\n\n💡 *Consejo:* ${advice}`;
-                    }
-                } catch (error) {
-                    console.error('Error al generar consejo (no crítico):', error.message);
-                    // Continuar sin consejo, no es crítico
-                }
-            }
-        }
+        // Si hay problemas, el texto ya trae las rutas alternativas (data.advice)
+        const response = metroStatus.text;
 
         // Guardamos en caché antes de retornar
         metroCache = response;
@@ -129,65 +94,122 @@ async function getMetroStatus() {
 }
 
 /**
- * Inicia el monitoreo automático del Metro en segundo plano.
+ * Alertas del canal de Telegram de Metro desde el registro local de
+ * telegram_alerts.py (solo baja los mensajes nuevos).
+ * @param {string} query - vacío: las últimas; un número: esa cantidad; otro texto: búsqueda
+ */
+async function getMetroAlerts(query = '') {
+    const text = query.trim();
+    let args = ['ultimas'];
+    if (/^\d+$/.test(text)) args = ['ultimas', text];
+    else if (text) args = ['buscar', ...text.split(/\s+/)];
+
+    try {
+        const envelope = await pythonService.executeJson(ALERTS_SCRIPT_NAME, args, { maxVersion: ALERTS_SCHEMA_VERSION });
+        if (!envelope.ok) {
+            console.error(`Error al ejecutar ${ALERTS_SCRIPT_NAME}: ${envelope.error}`);
+            return "⚠️ No pude obtener las alertas del Metro en este momento.";
+        }
+        return envelope.text;
+    } catch (error) {
+        console.error("Error en getMetroAlerts:", error.message);
+        return "⚠️ No pude obtener las alertas del Metro en este momento.";
+    }
+}
+
+async function sendAlert(client, chatId, messageToSend) {
+    if (chatId) {
+        await client.sendMessage(chatId, messageToSend);
+        return;
+    }
+    // Enviar a todos los grupos donde está el bot
+    try {
+        const chats = await client.getChats();
+        const groups = chats.filter(c => c.isGroup);
+        for (const group of groups) {
+            await client.sendMessage(group.id._serialized, messageToSend);
+        }
+        console.log(`(Metro) -> Alerta enviada a ${groups.length} grupos.`);
+    } catch (e) {
+        console.error('(Metro) -> Error enviando alertas:', e);
+    }
+}
+
+/**
+ * Registro de metro.py --watch: 'snapshot' al partir y 'change' cada vez que
+ * cambia el estado de una línea, una estación de Metrotren o una fuente.
+ */
+async function handleWatchRecord(record) {
+    if (record.type !== 'snapshot' && record.type !== 'change') return;
+    if (!watchTarget) return;
+    const { client, chatId } = watchTarget;
+
+    // El texto en caché de getMetroStatus ya no corresponde
+    if (record.type === 'change') metroCache = null;
+
+    const status = record.text;
+    // Detectar cierres o suspensiones en los datos estructurados
+    const isClosed = hasClosures(record.data);
+
+    let messageToSend = null;
+
+    if (isClosed && !lastAlertState) {
+        // ESTADO: CRÍTICO (Nuevo) -> Enviamos alerta
+        lastAlertState = true;
+        // El texto incluye las rutas alternativas calculadas por metro.py
+        messageToSend = `🚨 *ALERTA DE METRO* 🚨\n\nSe ha detectado un cierre o suspensión en la red:\n\n${status}`;
+
+    } else if (!isClosed && lastAlertState) {
+        // ESTADO: NORMAL (Recuperado) -> Avisamos que pasó el peligro
+        lastAlertState = false;
+        messageToSend = `✅ *ALERTA FINALIZADA*\n\nEl estado del Metro parece haberse normalizado (ya no se detectan cierres).`;
+    }
+
+    if (messageToSend) await sendAlert(client, chatId, messageToSend);
+}
+
+function launchWatcher() {
+    watchRestartTimer = null;
+    const proc = pythonService.spawnNdjson(METRO_SCRIPT_NAME, ['--watch'], (record) => {
+        alertQueue = alertQueue
+            .then(() => handleWatchRecord(record))
+            .catch(e => console.error('(Metro) -> Error procesando el monitoreo:', e.message));
+    }, (code, signal, stderr) => {
+        if (watcher !== proc) return; // detenido con stopMetroMonitoring
+        watcher = null;
+        console.error(`(Metro) -> metro.py --watch terminó (code ${code}, señal ${signal}); se relanza en ${WATCH_RESTART_MS / 1000}s. ${stderr.slice(-300)}`);
+        watchRestartTimer = setTimeout(launchWatcher, WATCH_RESTART_MS);
+    });
+    watcher = proc;
+}
+
+/**
+ * Inicia el monitoreo automático del Metro en segundo plano: metro.py --watch
+ * queda corriendo, consulta cada fuente con su propio intervalo y solo avisa
+ * cuando cambia el estado.
  * @param {import('whatsapp-web.js').Client} client - Cliente de WhatsApp
  * @param {string} [chatId] - (Opcional) ID específico. Si se omite, envía a todos los grupos.
  */
 function startMetroMonitoring(client, chatId = null) {
-    if (monitoringInterval) clearInterval(monitoringInterval);
-    
+    stopMetroMonitoring();
+
     console.log(`(Metro) -> Iniciando monitoreo automático...`);
-    
-    // Revisar cada 5 minutos (300000 ms)
-    monitoringInterval = setInterval(async () => {
-        const status = await getMetroStatusRaw();
-        if (!status) return;
-        
-        const lowerStatus = status.toLowerCase();
-        // Detectar palabras clave de cierre crítico
-        const isClosed = lowerStatus.includes('cerrada') || lowerStatus.includes('cierre total') || lowerStatus.includes('suspendido');
-        
-        let messageToSend = null;
-
-        if (isClosed && !lastAlertState) {
-            // ESTADO: CRÍTICO (Nuevo) -> Enviamos alerta
-            lastAlertState = true;
-            messageToSend = `🚨 *ALERTA DE METRO* 🚨\n\nSe ha detectado un cierre o suspensión en la red:\n\n${status}`;
-            
-            // Intentar agregar consejo IA para rutas alternativas
-            if (genAI) {
-                try {
-                    const advice = await generateMetroAdvice(status);
-                    if (advice) messageToSend += `\n\n💡 *Consejo:* ${advice}`;
-                } catch (e) {}
-            }
-
-        } else if (!isClosed && lastAlertState) {
-            // ESTADO: NORMAL (Recuperado) -> Avisamos que pasó el peligro
-            lastAlertState = false;
-            messageToSend = `✅ *ALERTA FINALIZADA*\n\nEl estado del Metro parece haberse normalizado (ya no se detectan cierres).`;
-        }
-        
-        // Enviar el mensaje si corresponde
-        if (messageToSend) {
-            if (chatId) {
-                await client.sendMessage(chatId, messageToSend);
-            } else {
-                // Enviar a todos los grupos donde está el bot
-                try {
-                    const chats = await client.getChats();
-                    const groups = chats.filter(c => c.isGroup);
-                    for (const group of groups) {
-                        await client.sendMessage(group.id._serialized, messageToSend);
-                    }
-                    console.log(`(Metro) -> Alerta enviada a ${groups.length} grupos.`);
-                } catch (e) {
-                    console.error('(Metro) -> Error enviando alertas:', e);
-                }
-            }
-        }
+    watchTarget = { client, chatId };
+    launchWatcher();
+}
 
-    }, 5 * 60 * 1000); 
+/**
+ * Detiene el monitoreo iniciado con startMetroMonitoring.
+ */
+function stopMetroMonitoring() {
+    watchTarget = null;
+    if (watchRestartTimer) clearTimeout(watchRestartTimer);
+    watchRestartTimer = null;
+    if (watcher) {
+        const proc = watcher;
+        watcher = null;
+        proc.kill();
+    }
 }
 
-module.exports = { getMetroStatus, startMetroMonitoring };
\ No newline at end of file
+module.exports = { getMetroStatus, getMetroAlerts, startMetroMonitoring, stopMetroMonitoring };
\ No newline at end of file
@@ -17,6 +17,32 @@ async function analyzeDomain(domain) {
     }
 }
 
+/**
+ * Análisis en modo --stream: `onRecord` recibe cada registro de net_analyzer.py
+ * apenas sale ({type: 'start'|'section'|'end'|'error', text, ...}).
+ * @param {{fresh?: boolean}} options - fresh: ignorar las cachés de net_analyzer (--fresh)
+ * @returns {Promise<{finished: boolean, error: string|null}>} finished = llegó el registro 'end'
+ */
+async function analyzeDomainStream(domain, options, onRecord) {
+    let finished = false;
+    let error = null;
+
+    const args = [domain, '--stream'];
+    if (options.fresh) args.push('--fresh');
+
+    const result = await pythonService.executeNdjson('net_analyzer.py', args, (record) => {
+        if (record.type === 'end') finished = true;
+        if (record.type === 'error') error = record.error;
+        onRecord(record);
+    });
+
+    if (!finished && !error && result.code !== 0) {
+        console.error("Error en analyzeDomainStream:", result.stderr);
+    }
+    return { finished, error };
+}
+
 module.exports = {
-    analyzeDomain
-};
\ No newline at end of file
+    analyzeDomain,
+    analyzeDomainStream
+};
@@ -1,33 +1,196 @@
 "use strict";
 
 const { spawn } = require('child_process');
+const fs = require('fs');
 const path = require('path');
 
 // Detectar el comando Python correcto automáticamente
 const PYTHON_COMMAND = process.env.PYTHON || (process.platform === 'win32' ? 'python' : 'python3');
 
+const SCRIPTS_DIR = path.join(__dirname, '..', '..', 'scripts', 'python');
+const WORKER_SCRIPT = path.join(SCRIPTS_DIR, 'worker.py');
+
+// Cantidad de workers Python persistentes (0 = volver a un proceso por comando)
+const POOL_SIZE = Math.max(0, parseInt(process.env.PYTHON_WORKERS || '2', 10) || 0);
+const DEFAULT_TIMEOUT = 30000; // 30 segundos por defecto
+// Workers que mueren antes de arrancar, seguidos, antes de pasar a un proceso por comando
+const MAX_START_FAILURES = 3;
+const POOL_RETRY_MS = 60 * 1000; // después de eso se vuelve a probar el pool
+
+// Tiempos por etapa (scripts/python/timing.py): PYTHON_TIMING=0 los desactiva
+const TIMING_ENABLED = process.env.PYTHON_TIMING !== '0';
+const TIMING_MARKER = '@@timing ';
+const TIMING_HISTORY = 50; // corridas guardadas por script
+const SLOW_MS = parseInt(process.env.PYTHON_SLOW_MS || '8000', 10) || 0;
+const TIMING_LOG = process.env.PYTHON_TIMING_LOG || ''; // archivo NDJSON opcional
+
+// Últimas corridas por script: { scriptName: [timing, ...] }
+const timingHistory = new Map();
+
 /**
- * Ejecuta un script Python y devuelve una Promise con { stdout, stderr, code, json }.
- * @param {string} scriptName - Nombre del archivo .py (se busca en scripts/python/)
- * @param {Array} args - Argumentos para pasar al script
- * @param {Object} opts - Opciones: {pythonExec, timeout}
- * @returns {Promise<{code, stdout, stderr, json}>}
+ * Separa la línea '@@timing {...}' que escribe timing.py del resto de stderr.
  */
-function executeScript(scriptName, args = [], opts = {}) {
+function extractTiming(stderr) {
+    if (!stderr.includes(TIMING_MARKER)) return { stderr, timing: null };
+
+    let timing = null;
+    const rest = [];
+    for (const line of stderr.split('\n')) {
+        if (line.startsWith(TIMING_MARKER)) {
+            try {
+                timing = JSON.parse(line.slice(TIMING_MARKER.length));
+            } catch (e) {
+                /* Línea cortada (proceso matado): se ignora */
+            }
+        } else {
+            rest.push(line);
+        }
+    }
+    return { stderr: rest.join('\n'), timing };
+}
+
+/**
+ * Guarda la corrida en el historial, la escribe en PYTHON_TIMING_LOG y avisa si fue lenta.
+ */
+function recordTiming(scriptName, timing) {
+    const runs = timingHistory.get(scriptName) || [];
+    runs.push(timing);
+    if (runs.length > TIMING_HISTORY) runs.shift();
+    timingHistory.set(scriptName, runs);
+
+    if (TIMING_LOG) {
+        fs.appendFile(TIMING_LOG, JSON.stringify({ script: scriptName, at: new Date().toISOString(), ...timing }) + '\n', (err) => {
+            if (err) console.error(`No se pudo escribir ${TIMING_LOG}: ${err.message}`);
+        });
+    }
+
+    if (SLOW_MS && timing.wall_ms >= SLOW_MS) {
+        const spans = (timing.spans || [])
+            .filter(s => !s.depth)
+            .map(s => `${s.name}=${Math.round(s.ms)}ms`)
+            .join(' ');
+        const startup = timing.startup_ms !== undefined ? ` arranque=${Math.round(timing.startup_ms)}ms` : '';
+        const queue = timing.queue_ms ? ` cola=${Math.round(timing.queue_ms)}ms` : '';
+        console.warn(`[python] ${scriptName} lento: ${Math.round(timing.wall_ms)}ms${queue}${startup} ${spans}`.trim());
+    }
+}
+
+function percentile(sorted, p) {
+    if (!sorted.length) return null;
+    return sorted[Math.min(sorted.length - 1, Math.floor(p * sorted.length))];
+}
+
+/**
+ * Resumen de las últimas corridas por script: p50/p95 de reloj y promedio por etapa.
+ * @returns {Object} { scriptName: { runs, p50_ms, p95_ms, spans: { nombre: { count, avg_ms, max_ms } } } }
+ */
+function getTimingStats() {
+    const stats = {};
+    for (const [scriptName, runs] of timingHistory) {
+        const walls = runs.map(r => r.wall_ms).sort((a, b) => a - b);
+        const spans = {};
+        for (const run of runs) {
+            for (const span of run.spans || []) {
+                const entry = spans[span.name] || (spans[span.name] = { count: 0, total: 0, max_ms: 0 });
+                entry.count += 1;
+                entry.total += span.ms;
+                entry.max_ms = Math.max(entry.max_ms, span.ms);
+            }
+        }
+        for (const entry of Object.values(spans)) {
+            entry.avg_ms = Math.round(entry.total / entry.count);
+            delete entry.total;
+        }
+        stats[scriptName] = { runs: runs.length, p50_ms: percentile(walls, 0.5), p95_ms: percentile(walls, 0.95), spans };
+    }
+    return stats;
+}
+
+/**
+ * Arma el resultado común { code, stdout, stderr, json, timing } y deja el log de error.
+ * `timing` viene en la respuesta del worker o en la línea '@@timing' de stderr;
+ * se le agregan los tiempos medidos desde Node (wall_ms, queue_ms).
+ */
+function buildResult(scriptName, code, signal, stdout, stderr, timing = null, measured = {}) {
+    const extracted = extractTiming(stderr);
+    stderr = extracted.stderr;
+    timing = timing || extracted.timing;
+
+    if (measured.wall_ms !== undefined) {
+        timing = { ...(timing || { script: scriptName, spans: [] }), ...measured };
+        recordTiming(scriptName, timing);
+    }
+
+    if (code !== 0 && stderr) {
+        console.error(`Error en script Python (${scriptName}) [Code: ${code}, Signal: ${signal}]: ${stderr}`);
+    }
+
+    // Intentar parsear JSON si el script devuelve JSON
+    let parsed = null;
+    try {
+        parsed = JSON.parse(stdout);
+    } catch (e) {
+        /* No es JSON, es normal */
+    }
+
+    return {
+        code,
+        stdout: stdout.trim(),
+        stderr: stderr.trim(),
+        json: parsed,
+        timing
+    };
+}
+
+/**
+ * Entrega a `onLine` cada línea completa de `text` y devuelve lo que sobra
+ * después del último salto de línea. Un error en `onLine` no corta el script.
+ */
+function emitLines(text, onLine) {
+    const lines = text.split('\n');
+    const rest = lines.pop();
+    for (const line of lines) deliverLine(onLine, line);
+    return rest;
+}
+
+function deliverLine(onLine, line) {
+    try {
+        onLine(line);
+    } catch (err) {
+        console.error(`Error procesando una línea de salida de Python: ${err.message}`);
+    }
+}
+
+/**
+ * Ejecuta el script en un proceso nuevo (modo clásico, sin pool).
+ */
+function spawnScript(scriptName, args, opts) {
     return new Promise((resolve, reject) => {
         const pythonExec = opts.pythonExec || PYTHON_COMMAND;
-        const scriptPath = path.join(__dirname, '..', '..', 'scripts', 'python', scriptName);
-        
+        const scriptPath = path.join(SCRIPTS_DIR, scriptName);
+
         // Agregamos '-u' para forzar salida sin buffer (importante para logs en tiempo real y evitar cortes)
-        const proc = spawn(pythonExec, ['-u', scriptPath, ...args], { 
+        const startedAt = Date.now();
+        const env = TIMING_ENABLED
+            ? { ...process.env, SCRIPT_TIMING: '1', SCRIPT_TIMING_T0: String(startedAt) }
+            : process.env;
+        const proc = spawn(pythonExec, ['-u', scriptPath, ...args], {
             windowsHide: true,
-            timeout: opts.timeout || 30000 // 30 segundos por defecto
+            timeout: opts.timeout || DEFAULT_TIMEOUT,
+            env
         });
 
         let stdout = '';
         let stderr = '';
+        let pendingLine = '';
 
-        proc.stdout.on('data', (chunk) => { stdout += chunk.toString(); });
+        // Con onLine las líneas se entregan por partes: decodificar UTF-8 sin cortar caracteres
+        if (opts.onLine) proc.stdout.setEncoding('utf8');
+        proc.stdout.on('data', (chunk) => {
+            const text = chunk.toString();
+            stdout += text;
+            if (opts.onLine) pendingLine = emitLines(pendingLine + text, opts.onLine);
+        });
         proc.stderr.on('data', (chunk) => { stderr += chunk.toString(); });
 
         proc.on('error', (err) => {
@@ -38,27 +201,332 @@ function executeScript(scriptName, args = [], opts = {}) {
         proc.on('close', (code, signal) => {
             // Si code es null, fue matado por señal (ej: timeout)
             const finalCode = code !== null ? code : (signal ? 1 : 0);
+            if (opts.onLine && pendingLine) deliverLine(opts.onLine, pendingLine);
+            resolve(buildResult(scriptName, finalCode, signal, stdout, stderr, null, { wall_ms: Date.now() - startedAt }));
+        });
+    });
+}
 
-            if (finalCode !== 0 && stderr) {
-                console.error(`Error en script Python (${scriptName}) [Code: ${finalCode}, Signal: ${signal}]: ${stderr}`);
-            }
+/**
+ * Proceso worker.py persistente: atiende una petición a la vez.
+ * Si una petición excede su timeout o el proceso muere, se descarta y el pool levanta otro.
+ */
+class PythonWorker {
+    constructor(onIdle, onExit) {
+        this.onIdle = onIdle;
+        this.onExit = onExit;
+        this.ready = false;
+        this.job = null;
+        this.buffer = '';
+        this.dead = false;
+        this.retiring = false; // avisó que termina después de su última respuesta
+
+        this.proc = spawn(PYTHON_COMMAND, ['-u', WORKER_SCRIPT], {
+            windowsHide: true,
+            stdio: ['pipe', 'pipe', 'pipe'],
+            env: TIMING_ENABLED ? { ...process.env, SCRIPT_TIMING: '1' } : process.env
+        });
 
-            // Intentar parsear JSON si el script devuelve JSON
-            let parsed = null;
-            try { 
-                parsed = JSON.parse(stdout); 
-            } catch (e) { 
-                /* No es JSON, es normal */ 
+        this.proc.stdout.on('data', (chunk) => this._onData(chunk));
+        this.proc.stderr.on('data', (chunk) => {
+            const text = chunk.toString();
+            // Salida suelta fuera de una petición (p. ej. chromedriver)
+            if (this.job) this.job.stray += text;
+            else console.error(`(Python Worker ${this.proc.pid}) ${text.trim()}`);
+        });
+        this.proc.on('error', (err) => {
+            console.error('Error al iniciar el worker de Python:', err.message);
+            this._die(null, null, err);
+        });
+        // 'close' y no 'exit': llega después de leer todo stdout, así la última
+        // respuesta del worker (p. ej. la de reciclaje) se entrega antes de _die
+        this.proc.on('close', (code, signal) => this._die(code, signal));
+    }
+
+    get idle() {
+        return this.ready && !this.job && !this.dead && !this.retiring;
+    }
+
+    run(job) {
+        this.job = job;
+        job.startedAt = Date.now();
+        job.timer = setTimeout(() => {
+            job.timedOut = true;
+            this.proc.kill('SIGKILL');
+        }, job.timeout);
+        const request = { id: job.id, script: job.scriptName, args: job.args };
+        if (job.onLine) request.stream = true;
+        this.proc.stdin.write(JSON.stringify(request) + '\n');
+    }
+
+    kill() {
+        this.proc.kill();
+    }
+
+    _onData(chunk) {
+        this.buffer += chunk.toString();
+        let newline;
+        while ((newline = this.buffer.indexOf('\n')) !== -1) {
+            const line = this.buffer.slice(0, newline);
+            this.buffer = this.buffer.slice(newline + 1);
+            if (line.trim()) this._onMessage(line);
+        }
+    }
+
+    _onMessage(line) {
+        let msg;
+        try {
+            msg = JSON.parse(line);
+        } catch (e) {
+            console.error(`(Python Worker ${this.proc.pid}) Mensaje inválido: ${line.slice(0, 200)}`);
+            return;
+        }
+
+        if (msg.ready) {
+            this.ready = true;
+            this.onIdle(this);
+            return;
+        }
+
+        const job = this.job;
+        if (!job || msg.id !== job.id) return;
+
+        // Línea adelantada de una petición con stream: la respuesta final llega después
+        if (msg.line !== undefined) {
+            job.streamed += msg.line + '\n';
+            deliverLine(job.onLine, msg.line);
+            return;
+        }
+
+        clearTimeout(job.timer);
+        this.job = null;
+        // Se recicla (MAX_REQUESTS o etapas que siguen corriendo): no recibe más trabajo
+        if (msg.recycle) this.retiring = true;
+        job.resolve(buildResult(job.scriptName, msg.code, null, job.streamed + (msg.stdout || ''), (msg.stderr || '') + job.stray,
+            msg.timing || null, { wall_ms: Date.now() - job.startedAt, queue_ms: job.startedAt - job.enqueuedAt }));
+        this.onIdle(this);
+    }
+
+    _die(code, signal, err) {
+        if (this.dead) return;
+        this.dead = true;
+
+        const job = this.job;
+        this.job = null;
+        if (job) {
+            clearTimeout(job.timer);
+            const reason = job.timedOut
+                ? `Timeout: ${job.scriptName} superó ${job.timeout} ms`
+                : `El worker de Python terminó inesperadamente (code: ${code}, signal: ${signal})`;
+            if (err && !job.timedOut) {
+                job.reject(new Error(`Python spawn error: ${err.message}`));
+            } else {
+                const measured = job.startedAt ? { wall_ms: Date.now() - job.startedAt, timed_out: !!job.timedOut } : {};
+                job.resolve(buildResult(job.scriptName, 1, signal, job.streamed, `${job.stray}${reason}`.trim(), null, measured));
             }
+        }
+        this.onExit(this);
+    }
+}
 
-            resolve({
-                code: finalCode,
-                stdout: stdout.trim(),
-                stderr: stderr.trim(),
-                json: parsed
+/**
+ * Pool de workers persistentes con cola FIFO.
+ */
+class PythonWorkerPool {
+    constructor(size) {
+        this.size = size;
+        this.workers = [];
+        this.queue = [];
+        this.nextId = 1;
+        this.startFailures = 0; // workers seguidos que murieron sin llegar a arrancar
+        this.brokenUntil = 0;   // hasta cuándo se usa un proceso por comando
+    }
+
+    execute(scriptName, args, timeout, onLine = null) {
+        if (Date.now() < this.brokenUntil) {
+            return spawnScript(scriptName, args, { timeout, onLine });
+        }
+        return new Promise((resolve, reject) => {
+            this.queue.push({
+                id: this.nextId++, scriptName, args, timeout, onLine, resolve, reject,
+                stray: '', streamed: '', enqueuedAt: Date.now()
             });
+            this._ensureWorkers();
+            this._dispatch();
         });
+    }
+
+    shutdown() {
+        for (const worker of this.workers) worker.kill();
+        this.workers = [];
+    }
+
+    _ensureWorkers() {
+        while (this.workers.length < this.size) {
+            this.workers.push(new PythonWorker(
+                (worker) => {
+                    if (worker.ready) this.startFailures = 0;
+                    this._dispatch();
+                },
+                (worker) => this._onWorkerExit(worker)
+            ));
+        }
+    }
+
+    _dispatch() {
+        for (const worker of this.workers) {
+            if (!this.queue.length) return;
+            if (worker.idle) worker.run(this.queue.shift());
+        }
+    }
+
+    _onWorkerExit(worker) {
+        this.workers = this.workers.filter(w => w !== worker);
+
+        // Un worker que murió sin arrancar no tenía trabajo asignado (solo se
+        // despacha a workers listos): la cola queda para los demás
+        if (!worker.ready) {
+            this.startFailures++;
+            if (this.workers.length) return;
+            if (this.startFailures < MAX_START_FAILURES) {
+                if (this.queue.length) this._ensureWorkers();
+                return;
+            }
+            // El pool no logra arrancar: lo pendiente corre como proceso suelto
+            console.error(`(Python) -> ${this.startFailures} workers no pudieron iniciar; un proceso por comando durante ${POOL_RETRY_MS / 1000}s.`);
+            this.startFailures = 0;
+            this.brokenUntil = Date.now() + POOL_RETRY_MS;
+            for (const job of this.queue.splice(0)) {
+                spawnScript(job.scriptName, job.args, { timeout: job.timeout, onLine: job.onLine })
+                    .then(job.resolve, job.reject);
+            }
+            return;
+        }
+
+        // Solo reponer workers si hay trabajo pendiente; si no, se levantan en la próxima petición
+        if (this.queue.length) {
+            this._ensureWorkers();
+        }
+    }
+}
+
+const pool = POOL_SIZE > 0 ? new PythonWorkerPool(POOL_SIZE) : null;
+if (pool) {
+    process.on('exit', () => pool.shutdown());
+}
+
+/**
+ * Ejecuta un script Python y devuelve una Promise con { stdout, stderr, code, json, timing }.
+ * `timing` trae las etapas medidas por scripts/python/timing.py más wall_ms (y queue_ms en el pool).
+ * Por defecto usa el pool de workers persistentes; con opts.pythonExec o PYTHON_WORKERS=0
+ * se lanza un proceso nuevo como antes.
+ * Con opts.onLine(line) cada línea de stdout se entrega apenas el script la
+ * escribe (el resultado final igual trae el stdout completo).
+ * @param {string} scriptName - Nombre del archivo .py (se busca en scripts/python/)
+ * @param {Array} args - Argumentos para pasar al script
+ * @param {Object} opts - Opciones: {pythonExec, timeout, onLine}
+ * @returns {Promise<{code, stdout, stderr, json, timing}>}
+ */
+function executeScript(scriptName, args = [], opts = {}) {
+    if (!pool || opts.pythonExec) {
+        return spawnScript(scriptName, args, opts);
+    }
+    return pool.execute(scriptName, args.map(String), opts.timeout || DEFAULT_TIMEOUT, opts.onLine || null);
+}
+
+/**
+ * Ejecuta un script que escribe un registro JSON por línea (NDJSON) y llama a
+ * `onRecord(record)` con cada uno a medida que llegan. Las líneas que no son
+ * JSON se ignoran.
+ * @param {string} scriptName - Nombre del archivo .py
+ * @param {Array} args - Argumentos (el flag de streaming del script va aquí)
+ * @param {Function} onRecord - Recibe cada registro parseado
+ * @param {Object} opts - Opciones de executeScript
+ * @returns {Promise<{code, stdout, stderr, json, timing}>}
+ */
+function executeNdjson(scriptName, args, onRecord, opts = {}) {
+    return executeScript(scriptName, args, { ...opts, onLine: ndjsonLineHandler(onRecord) });
+}
+
+function ndjsonLineHandler(onRecord) {
+    return (line) => {
+        if (!line.trim()) return;
+        let record;
+        try {
+            record = JSON.parse(line);
+        } catch (e) {
+            return;
+        }
+        onRecord(record);
+    };
+}
+
+// Últimos bytes de stderr que se guardan de un proceso residente
+const RESIDENT_STDERR_TAIL = 2000;
+
+/**
+ * Lanza un script residente que escribe NDJSON (ej: metro.py --watch) en su
+ * propio proceso, fuera del pool y sin timeout. No acumula stdout: cada
+ * registro se entrega a `onRecord` y se descarta.
+ * @param {string} scriptName - Nombre del archivo .py
+ * @param {Array} args - Argumentos
+ * @param {Function} onRecord - Recibe cada registro parseado
+ * @param {Function} onExit - Se llama con (code, signal, stderrTail) cuando el proceso termina
+ * @returns {import('child_process').ChildProcess} para detenerlo con kill()
+ */
+function spawnNdjson(scriptName, args, onRecord, onExit) {
+    const onLine = ndjsonLineHandler(onRecord);
+    const proc = spawn(PYTHON_COMMAND, ['-u', path.join(SCRIPTS_DIR, scriptName), ...args.map(String)], {
+        windowsHide: true
     });
+
+    let pendingLine = '';
+    let stderrTail = '';
+
+    proc.stdout.setEncoding('utf8');
+    proc.stdout.on('data', (text) => { pendingLine = emitLines(pendingLine + text, onLine); });
+    proc.stderr.on('data', (chunk) => {
+        stderrTail = (stderrTail + chunk.toString()).slice(-RESIDENT_STDERR_TAIL);
+    });
+
+    let exited = false;
+    const finish = (code, signal) => {
+        if (exited) return;
+        exited = true;
+        if (pendingLine) deliverLine(onLine, pendingLine);
+        onExit(code, signal, stderrTail);
+    };
+    proc.on('error', (err) => {
+        console.error(`Error al ejecutar script Python (${scriptName}):`, err.message);
+        finish(null, null);
+    });
+    proc.on('close', finish);
+    return proc;
+}
+
+/**
+ * Ejecuta un script en modo --json y devuelve el sobre versionado que arma
+ * scripts/python/script_output.py: { schema, version, ok, generated_at, data, text, error }.
+ * Lanza un Error si la salida no es un sobre del script o si su versión es más
+ * nueva que la que entiende quien llama (opts.maxVersion).
+ * @param {string} scriptName - Nombre del archivo .py
+ * @param {Array} args - Argumentos (se agrega '--json')
+ * @param {Object} opts - Opciones de executeScript más {maxVersion}
+ * @returns {Promise<{schema, version, ok, generated_at, data, text, error}>}
+ */
+async function executeJson(scriptName, args = [], opts = {}) {
+    const result = await executeScript(scriptName, [...args, '--json'], opts);
+    const envelope = result.json;
+    const schema = path.basename(scriptName, '.py');
+
+    if (!envelope || envelope.schema !== schema || typeof envelope.version !== 'number') {
+        const detail = (result.stderr || result.stdout || '').slice(0, 200);
+        throw new Error(`Salida JSON inválida de ${scriptName} (code ${result.code}): ${detail}`);
+    }
+    if (opts.maxVersion && envelope.version > opts.maxVersion) {
+        throw new Error(`${scriptName} entregó el esquema v${envelope.version}; se soporta hasta v${opts.maxVersion}`);
+    }
+    return envelope;
 }
 
-module.exports = { executeScript };
\ No newline at end of file
+module.exports = { executeScript, executeJson, executeNdjson, spawnNdjson, getTimingStats };
@@ -4,6 +4,7 @@
 const pythonService = require('./python.service');
 
 const TRANSBANK_SCRIPT = 'transbank.py';
+const TRANSBANK_SCHEMA_VERSION = 1; // versión de `data` de transbank.py --json
 
 // Variables para caché
 let transbankCache = null;
@@ -59,14 +60,13 @@ function startTransbankMonitoring(client) {
 
     monitoringInterval = setInterval(async () => {
         try {
-            // Pedimos JSON puro para analizar
-            const result = await pythonService.executeScript(TRANSBANK_SCRIPT, ['--json']);
+            // Pedimos los datos estructurados para analizar
+            const envelope = await pythonService.executeJson(TRANSBANK_SCRIPT, [], { maxVersion: TRANSBANK_SCHEMA_VERSION });
             
-            if (result.code === 0 && result.json) {
-                const data = result.json;
+            if (envelope.ok) {
                 const criticalServices = [];
 
-                for (const [service, status] of Object.entries(data)) {
+                for (const [service, status] of Object.entries(envelope.data.services)) {
                     if (status === 'Major Outage') {
                         criticalServices.push(service);
                     }